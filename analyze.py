@@ -1,12 +1,11 @@
 import json
 import re
-import numpy as np
+import sys
+import importlib.util
 from pathlib import Path
 from collections import defaultdict
-from matplotlib import pyplot as plt
-from sklearn.neighbors import KernelDensity
 
-from game_constants import DIRS_PREFIX, PLAYER_NAMES_FILE, LLM_LOG_FILE_FORMAT, METRICS_TO_SCORE, \
+from game_constants import DIRS_PREFIX, PLAYER_NAMES_FILE, METRICS_TO_SCORE, \
     MESSAGE_PARSING_PATTERN, GAME_MANAGER_NAME, LLM_IDENTIFICATION, PERSONAL_SURVEY_FILE_FORMAT, \
     SURVEY_COMMENTS_TITLE, METRIC_NAME_AND_SCORE_DELIMITER, MAFIA_WINS_MESSAGE, WHO_WINS_FILE, \
     GAME_CONFIG_FILE, PLAYERS_KEY_IN_CONFIG, CUTTING_TO_VOTE_MESSAGE, VOTING_MESSAGE_FORMAT, \
@@ -15,7 +14,28 @@ from game_constants import DIRS_PREFIX, PLAYER_NAMES_FILE, LLM_LOG_FILE_FORMAT,
     PUBLIC_NIGHTTIME_CHAT_FILE, MAFIA_NAMES_FILE, DAYTIME_MINUTES_KEY, NIGHTTIME_MINUTES_KEY, \
     MAFIA_ROLE, BYSTANDER_ROLE, REAL_NAMES_FILE, REAL_NAME_CODENAME_DELIMITER, strip_special_chars
 from game_status_checks import is_voted_out, all_players_joined
+from game_events import has_event_log, read_events
 from llm_players.llm_constants import LLM_CONFIG_KEY
+from llm_players.logger import get_llm_log_file
+
+
+def lazy_import(name):
+    """
+    Returns the module, which is only loaded on its first use (numpy is slow to import). Only for
+    top-level modules, finding a submodule would import its parent package right away.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+np = lazy_import("numpy")
+# matplotlib.pyplot is slow to import too, so the plotting functions import it themselves
 
 
 LAST_GAME_FROM_PILOT = 37
@@ -132,7 +152,7 @@ class Phase:
 def get_llm_player_name(all_players, game_dir):
     llm_player_name = None
     for player_name in all_players:
-        if (game_dir / LLM_LOG_FILE_FORMAT.format(player_name)).exists():
+        if get_llm_log_file(game_dir, player_name) is not None:
             if llm_player_name is None:
                 llm_player_name = player_name
             else:
@@ -224,6 +244,10 @@ def decide_message_order(message: ParsedMessage):
 
 
 def parse_messages(game_dir, all_players, mafia_players, llm_player_name):
+    if has_event_log(game_dir):  # already in the order they were published, no sorting needed
+        lines = [event["line"].rstrip("\n") for event in read_events(game_dir) if "line" in event]
+        parsed_messages = [ParsedMessage(line, llm_player_name) for line in lines]
+        return parse_messages_by_phase(parsed_messages, all_players, mafia_players)
     manager_messages = (game_dir / PUBLIC_MANAGER_CHAT_FILE).read_text().splitlines()
     daytime_messages = (game_dir / PUBLIC_DAYTIME_CHAT_FILE).read_text().splitlines()
     nighttime_messages = (game_dir / PUBLIC_NIGHTTIME_CHAT_FILE).read_text().splitlines()
@@ -269,6 +293,7 @@ def get_single_game_results(game_id):
 
 
 def plot_game_flow(game_id, all_players, parsed_messages_by_phase: list[Phase], llm_player_name):
+    import matplotlib.pyplot as plt
     player_message_lengths = {player: [] for player in all_players}
     player_voted_out = {player: None for player in all_players}
     player_color = {player: f"C{i}" for i, player in enumerate(all_players)}
@@ -324,6 +349,7 @@ def plot_messages_histogram_in_phase(all_players, phases: list[Phase], game_id=N
                                      human_messages=True, llm_messages=True, llm_player_name=None,
                                      daytime_phases=True, nighttime_phases=False,
                                      plot_for_each_player=True, plot_general_histogram=True):
+    import matplotlib.pyplot as plt
     assert daytime_phases or nighttime_phases
     if daytime_phases and nighttime_phases:
         raise UserWarning("Best to use only for daytime phases or only for nighttime phases")
@@ -379,6 +405,7 @@ def plot_messages_histogram_in_phase(all_players, phases: list[Phase], game_id=N
 
 def plot_messages_histogram_in_all_games(reset_message_lengths_across_all_games, player_name=None,
                                          phase_name=None):
+    import matplotlib.pyplot as plt
     color = "C0"
     plt.bar(*zip(*reset_message_lengths_across_all_games), width=7, color=color, alpha=0.3)
     player_title = "" if player_name is None else f"of {player_name} "
@@ -404,6 +431,7 @@ def get_phase_name(daytime_phases, nighttime_phases):
 
 
 def plot_single_pie_chart(title, result_on_all_games, true_label, false_label):
+    import matplotlib.pyplot as plt
     plt.title(title)
     num_true = sum(result_on_all_games)
     num_false = len(result_on_all_games) - num_true
@@ -436,6 +464,7 @@ def plot_all_pie_charts(did_mafia_win_all_games, did_llm_win_all_games,
 
 
 def plot_scores_for_single_metric(metric, scores_by_game):
+    import matplotlib.pyplot as plt
     title = f"{metric.capitalize()} scores across all games"
     plt.title(title + f"\n(with {MEAN_MARKER_STYLE['marker']}-markers "
                       f"for means and error bars for +-STD)")
@@ -459,6 +488,7 @@ def plot_scores_for_single_metric(metric, scores_by_game):
 
 
 def plot_metric_scores(metrics_results_all_games):
+    import matplotlib.pyplot as plt
     metrics = list(metrics_results_all_games.keys())  # to ensure order
     means_by_metrics = []
     stds_by_metrics = []
@@ -782,6 +812,7 @@ def get_message_timings_statistics():
 
 
 def plot_timing_histogram(messages, title):
+    import matplotlib.pyplot as plt
     plt.title(title)
     for player_type, is_llm, density_color, mean_color, std_color in [
         ("LLM", True, "red", "darkred", "indianred"),
@@ -818,6 +849,7 @@ def plot_timing_diffs_histogram(human_timing_diffs, llm_timing_diffs, title,
         #          label=fr"{player_type} $(\mu = {np.mean(timing_diffs):.2f}, "
         #                fr"\sigma = {np.std(timing_diffs):.2f})$")
         timing_diffs_squeezed = np.array(timing_diffs)[:, np.newaxis]
+        from sklearn.neighbors import KernelDensity  # slow to import, and only needed here
         kde_timing_diffs = KernelDensity(
             kernel="gaussian",bandwidth=kde_bandwidth).fit(timing_diffs_squeezed)
         x_range = np.linspace(0, max_x + 5, 1000)
@@ -934,6 +966,7 @@ def get_embeddings(messages: list[ParsedMessage], model_name=SENTENCE_EMBEDDING_
 
 def plot_percentage_bars_chart(did_llm_win, is_llm_mafia,
                                did_human_win_as_mafia, did_human_win_as_bystander):
+    import matplotlib.pyplot as plt
     did_llm_win_as_mafia = []
     did_llm_win_as_bystander = []
     for i, llm_win in enumerate(did_llm_win):
@@ -1038,6 +1071,7 @@ def plot_merged_timing_diff_hists(mean_per_game_of_timing_diff_of_messages_sent_
                                   mean_per_game_of_timing_diff_of_messages_sent_by_llm,
                                   mean_per_game_of_timing_diff_of_self_messages_by_humans,
                                   mean_per_game_of_timing_diff_of_self_messages_by_llm):
+    import matplotlib.pyplot as plt
     fig, axs = plt.subplots(nrows=1, ncols=2, figsize=(11, 5))
     plot_timing_diffs_histogram(mean_per_game_of_timing_diff_of_messages_sent_by_humans,
                                 mean_per_game_of_timing_diff_of_messages_sent_by_llm,
@@ -1159,6 +1193,7 @@ def add_human_winning_statistics(human_players, mafia_players, did_mafia_win,
 
 
 def check_variance_of_num_messages_through_time(parsed_messages_by_phase_all_games: list[list[Phase]]):
+    import matplotlib.pyplot as plt
     MAX_DAYTIME_NUM = 6
     num_seconds_window = 90
     num_messages_per_time_window = defaultdict(list)
@@ -1205,6 +1240,7 @@ def check_variance_of_num_messages_through_time(parsed_messages_by_phase_all_gam
 
 
 def check_variance_of_num_messages_throughout_phases(parsed_messages_by_phase_all_games: list[list[Phase]]):
+    import matplotlib.pyplot as plt
     MAX_DAYTIME_NUM = 6
     num_messages_per_phase = {i + 1: [] for i in range(MAX_DAYTIME_NUM)}  # by phase index
     num_players_per_phase = {i + 1: [] for i in range(MAX_DAYTIME_NUM)}  # by phase index
@@ -1239,6 +1275,7 @@ def check_variance_of_num_messages_throughout_phases(parsed_messages_by_phase_al
 
 
 def plot_voting_out_by_speaking_rank_histogram(parsed_messages_by_phase_all_games: list[list[Phase]]):
+    import matplotlib.pyplot as plt
     voted_out_ranks = []
     for game in parsed_messages_by_phase_all_games:
         for phase in game:
@@ -0,0 +1,235 @@
+"""
+Headless, cross-platform runner for batches of all-LLM games (a replacement for running
+`multiGameTester.py` through `open_mafia.py`, which needs Windows and PowerShell).
+
+Runs N games on a bounded process pool, where each game is either played by the in-process
+engine (`mafia_engine.py`) or by the usual `mafia_main.py` + one `llm_interface.py` subprocess
+per LLM player. Every started/finished game is streamed as a JSON line to the events file, and
+the manifest with all games' results is rewritten after each game finishes.
+
+usage: python batch_runner.py -c configurations/openai_5_5.json -n 80 -g 10
+"""
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from termcolor import colored
+from game_constants import DIRS_PREFIX, GAME_CONFIG_FILE, PLAYERS_KEY_IN_CONFIG, WHO_WINS_FILE, \
+    LLM_CALL_LOG, GAME_ID_NUM_DIGITS, PLAYER_NAMES_FILE, get_latest_game_id
+from llm_players.logger import iter_llm_log
+
+ENGINE_MODE = "engine"
+SUBPROCESS_MODE = "subprocess"
+RUN_MODES = [ENGINE_MODE, SUBPROCESS_MODE]
+DEFAULT_CONFIG_PATH = "configurations/openai_5_5.json"
+BATCH_OUTPUT_FILE_FORMAT = "batch_{}_output.txt"  # stdout of the game's processes, in its game dir
+MANIFEST_FILE_FORMAT = "batch_{}_{}_manifest.json"  # first and last game IDs
+EVENTS_FILE_FORMAT = "batch_{}_{}_events.jsonl"
+PROCESSES_GRACE_SECONDS = 30  # for LLM processes to notice the game is over
+STARTED_EVENT = "started"
+FINISHED_EVENT = "finished"
+FAILED_EVENT = "failed"
+BATCH_COLOR = "cyan"
+
+
+def count_llm_calls(game_dir):
+    num_calls = 0
+    player_names = (game_dir / PLAYER_NAMES_FILE).read_text().splitlines()
+    for name in player_names:
+        num_calls += sum(record["operation"] == LLM_CALL_LOG
+                         for record in iter_llm_log(game_dir, name, decode=False))
+    return num_calls
+
+
+def run_game_with_subprocesses(game_dir, timeout_seconds, command_prefix=()):
+    # command_prefix: arguments for the interpreter before the script, like a wrapper script
+    with open(game_dir / GAME_CONFIG_FILE, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    num_llm_players = sum(player["is_llm"] for player in config[PLAYERS_KEY_IN_CONFIG])
+    game_id = game_dir.name
+    output_files = []
+    processes = []
+
+    def start(script, name, stdin_text=None):
+        output_file = open(game_dir / BATCH_OUTPUT_FILE_FORMAT.format(name), "w",
+                           encoding="utf-8")
+        output_files.append(output_file)
+        process = subprocess.Popen([sys.executable, *command_prefix, script, "-i", game_id],
+                                   stdin=subprocess.PIPE, stdout=output_file,
+                                   stderr=subprocess.STDOUT, text=True)
+        if stdin_text is not None:  # same as `echo i | python llm_interface.py`
+            process.stdin.write(stdin_text)
+        process.stdin.close()
+        processes.append(process)
+        return process
+
+    try:
+        manager = start("mafia_main.py", "manager")
+        for i in range(1, num_llm_players + 1):
+            start("llm_interface.py", f"llm_{i}", f"{i}\n")
+        manager.wait(timeout=timeout_seconds)
+        for process in processes[1:]:
+            process.wait(timeout=PROCESSES_GRACE_SECONDS)
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        for output_file in output_files:
+            output_file.close()
+    if manager.returncode != 0:
+        raise RuntimeError(f"mafia_main.py exited with code {manager.returncode}")
+
+
+def run_game_in_process(game_dir, timeout_seconds):
+    import asyncio
+    import mafia_engine  # imported here so only workers pay for the LLM SDKs imports
+    with open(game_dir / GAME_CONFIG_FILE, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    output_path = game_dir / BATCH_OUTPUT_FILE_FORMAT.format("engine")
+    stdout = sys.stdout
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        sys.stdout = output_file
+        try:
+            asyncio.run(asyncio.wait_for(mafia_engine.InProcessGame(game_dir, config).run(),
+                                         timeout_seconds))
+        finally:
+            sys.stdout = stdout
+
+
+def run_single_game(game_id, config_path, mode, timeout_seconds, events_file):
+    """
+    Prepares and plays a single game to its end, in the current (worker) process.
+
+    Args:
+        game_id (str): The new game's ID, must not exist yet.
+        config_path (str): Path of the configuration file to prepare the game with.
+        mode (str): ENGINE_MODE or SUBPROCESS_MODE.
+        timeout_seconds (float | None): Maximal duration for the game itself.
+        events_file (Path): The batch's events file, to report that the game has started.
+
+    Returns:
+        dict: The game's manifest record.
+    """
+    from prepare_game import init_game
+    game_dir = Path(DIRS_PREFIX) / game_id
+    start_time = time.time()
+    record = {"game_id": game_id, "config": str(config_path), "mode": mode,
+              "start_time": start_time}
+    emit_event(events_file, {"event": STARTED_EVENT, "game_id": game_id, "time": start_time})
+    is_prepared = False
+    try:
+        init_game(game_id, str(config_path))
+        is_prepared = True
+        if mode == ENGINE_MODE:
+            run_game_in_process(game_dir, timeout_seconds)
+        else:
+            run_game_with_subprocesses(game_dir, timeout_seconds)
+        record["status"] = FINISHED_EVENT
+    except Exception as e:  # a batch should survive one broken game
+        record["status"] = FAILED_EVENT
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["duration_seconds"] = round(time.time() - start_time, 2)
+    record["winner"] = (game_dir / WHO_WINS_FILE).read_text().strip() if is_prepared else ""
+    record["num_llm_calls"] = count_llm_calls(game_dir) if is_prepared else 0
+    return record
+
+
+def emit_event(events_file, event):
+    with open(events_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(event) + "\n")
+    status = event["event"]
+    details = f" - {event.get('winner') or event.get('error', '')}" if status != STARTED_EVENT else ""
+    print(colored(f"[{time.strftime('%H:%M:%S')}] game {event['game_id']} {status}{details}",
+                  BATCH_COLOR), flush=True)
+
+
+def write_manifest(manifest_file, records, batch_info):
+    finished = [record for record in records if record["status"] == FINISHED_EVENT]
+    summary = dict(batch_info)
+    summary["num_finished"] = len(finished)
+    summary["num_failed"] = len(records) - len(finished)
+    summary["winners"] = {winner: sum(record["winner"] == winner for record in finished)
+                          for winner in sorted({record["winner"] for record in finished})}
+    summary["games"] = sorted(records, key=lambda record: record["game_id"])
+    manifest_file.write_text(json.dumps(summary, indent=4), encoding="utf-8")
+
+
+def run_batch(config_path, num_games, concurrent_games, initial_game_id=None, mode=ENGINE_MODE,
+              timeout_minutes=None):
+    """
+    Runs a batch of games with at most `concurrent_games` of them at the same time.
+
+    Args:
+        config_path (str | Path): Configuration used for all games of the batch.
+        num_games (int): Number of games to run.
+        concurrent_games (int): Size of the process pool.
+        initial_game_id (str | None): First game ID, by default the one after the latest game.
+        mode (str): ENGINE_MODE (one process per game) or SUBPROCESS_MODE (one per player).
+        timeout_minutes (float | None): Maximal duration of a single game.
+
+    Returns:
+        list[dict]: The manifest records of all games.
+    """
+    config_path = Path(str(config_path).replace("\\", "/"))  # also accepts Windows-style paths
+    if not config_path.exists():
+        raise ValueError(f"Can't use this config because its path doesn't exist: {config_path}")
+    if mode not in RUN_MODES:
+        raise ValueError(f"Unknown run mode {mode}, should be one of: {RUN_MODES}")
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not all(player["is_llm"] for player in config[PLAYERS_KEY_IN_CONFIG]):
+        raise ValueError("Headless batches can only run configurations where all players are LLMs")
+    Path(DIRS_PREFIX).mkdir(exist_ok=True)
+    if initial_game_id is None:
+        initial_game_id = int(get_latest_game_id()) + 1
+    game_ids = [f"{game_id}".zfill(GAME_ID_NUM_DIGITS)
+                for game_id in range(int(initial_game_id), int(initial_game_id) + num_games)]
+    manifest_file = Path(DIRS_PREFIX) / MANIFEST_FILE_FORMAT.format(game_ids[0], game_ids[-1])
+    events_file = Path(DIRS_PREFIX) / EVENTS_FILE_FORMAT.format(game_ids[0], game_ids[-1])
+    batch_info = {"config": str(config_path), "mode": mode, "num_games": num_games,
+                  "concurrent_games": concurrent_games, "start_time": time.time()}
+    timeout_seconds = timeout_minutes * 60 if timeout_minutes else None
+    print(colored(f"Running games {game_ids[0]}-{game_ids[-1]} with {config_path}, "
+                  f"{concurrent_games} at a time ({mode} mode)", BATCH_COLOR), flush=True)
+    records = []
+    with ProcessPoolExecutor(max_workers=concurrent_games) as executor:
+        futures = [executor.submit(run_single_game, game_id, config_path, mode, timeout_seconds,
+                                   events_file)
+                   for game_id in game_ids]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            emit_event(events_file, dict(event=record["status"], time=time.time(), **record))
+            write_manifest(manifest_file, records, batch_info)
+    print(colored(f"Batch is done, manifest saved to: {manifest_file}", BATCH_COLOR), flush=True)
+    return records
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless parallel runner for batches of games")
+    parser.add_argument("-c", "--config", default=DEFAULT_CONFIG_PATH,
+                        help="path/to/configuration/file.json, only LLM players are supported")
+    parser.add_argument("-n", "--num_games", type=int, default=10, help="number of games to run")
+    parser.add_argument("-g", "--concurrent_games", type=int, default=1,
+                        help="number of games to run concurrently")
+    parser.add_argument("-i", "--initial_game_id", default=None,
+                        help="first game ID, must not already exist (default: after the latest)")
+    parser.add_argument("-m", "--mode", default=ENGINE_MODE, choices=RUN_MODES,
+                        help="run each game in a single process, or in a process per player")
+    parser.add_argument("-t", "--timeout_minutes", type=float, default=None,
+                        help="maximal duration of a single game")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    run_batch(args.config, args.num_games, args.concurrent_games, args.initial_game_id, args.mode,
+              args.timeout_minutes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Throughput benchmark of the game machinery itself: plays full games of mock LLMs (see `MockLLM`
+in llm/llm.py) with the usual processes - `mafia_main.py` and one `llm_interface.py` per player -
+and measures what the game's file-based plumbing costs, without any API noise:
+- games per hour (with N games running concurrently);
+- host CPU seconds per game, of all the game's processes;
+- latency from a message written to a personal chat file until it appears in the public chat;
+- latency from a vote written to a personal vote file until it is announced, and the duration of
+  the whole voting sub-phase (which includes the players' deliberate `VOTING_WAITING_TIME`);
+- file I/O bytes per game (Linux only, see benchmarks/io_counter.py).
+Latencies are measured by a monitor thread that is woken by the file watcher, so they are the
+times at which the monitor noticed the changes.
+
+usage (from the repo root):
+    python benchmarks/engine_throughput.py -s 5:1 10:2 16:3 -n 4 -g 2
+"""
+import re
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # the repo's root
+from termcolor import colored
+from game_constants import DIRS_PREFIX, GAME_ID_NUM_DIGITS, PLAYERS_KEY_IN_CONFIG, \
+    DAYTIME_MINUTES_KEY, NIGHTTIME_MINUTES_KEY, OPTIONAL_CODE_NAMES, PHASE_STATUS_FILE, \
+    PERSONAL_CHAT_FILE_FORMAT, PERSONAL_VOTE_FILE_FORMAT, PUBLIC_DAYTIME_CHAT_FILE, \
+    PUBLIC_NIGHTTIME_CHAT_FILE, GAME_MANAGER_NAME, VOTING_MESSAGE_FORMAT, VOTING_TIME, \
+    WHO_WINS_FILE, get_latest_game_id
+from llm_players.llm_constants import MOCK_LLM_CONFIG, MOCK_LATENCY_MEAN_KEY, \
+    MOCK_LATENCY_STD_KEY, MOCK_SEED_KEY
+from prepare_config import PlayerConfig
+from prepare_game import init_game
+from batch_runner import run_game_with_subprocesses
+from file_watcher import FileChangeWatcher, AUTO_NOTIFICATION_MODE
+from tail_reader import TailReader
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+IO_COUNTER_SCRIPT = BENCHMARKS_DIR / "io_counter.py"
+DEFAULT_SCENARIOS = ["5:1", "10:2", "16:3"]  # num_players:num_mafia
+DEFAULT_DAYTIME_MINUTES = 0.5
+DEFAULT_NIGHTTIME_MINUTES = 0.25
+DEFAULT_MOCK_LATENCY_SECONDS = 0.2
+MONITOR_POLLING_INTERVAL_SECONDS = 0.005  # only used where inotify isn't available
+MONITOR_WAKE_UP_SECONDS = 0.5  # to notice that the game is over
+VOTING_MESSAGE_PATTERN = re.compile(
+    re.escape(VOTING_MESSAGE_FORMAT).replace(re.escape("{}"), "(.+)"))  # voter, voted for
+RESULTS_FILE_FORMAT = "benchmark_{}.json"
+BENCHMARK_COLOR = "cyan"
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values) + 0.5) - 1))
+    return values[index]  # nearest-rank
+
+
+class GameLatencyMonitor(threading.Thread):
+    """
+    Follows a running game's files and records the latencies of the game manager's file paths.
+    Attributes:
+        message_latencies (list[float]): Seconds from a personal chat line to the public chat.
+        vote_latencies (list[float]): Seconds from a personal vote to its announcement.
+        voting_durations (list[float]): Seconds of every voting sub-phase.
+    Methods:
+        stop():
+            Reads the last changes and stops following the game.
+    """
+
+    def __init__(self, game_dir, player_names):
+        super().__init__(daemon=True)
+        self.game_dir = game_dir
+        self.chat_readers = [TailReader(game_dir / PERSONAL_CHAT_FILE_FORMAT.format(name))
+                             for name in player_names]
+        self.vote_readers = {name: TailReader(game_dir / PERSONAL_VOTE_FILE_FORMAT.format(name))
+                             for name in player_names}
+        self.public_readers = [TailReader(game_dir / PUBLIC_DAYTIME_CHAT_FILE),
+                               TailReader(game_dir / PUBLIC_NIGHTTIME_CHAT_FILE)]
+        watched_files = [reader.path for reader in self.chat_readers + self.public_readers] + \
+            [reader.path for reader in self.vote_readers.values()] + [game_dir / PHASE_STATUS_FILE]
+        self.watcher = FileChangeWatcher(watched_files, AUTO_NOTIFICATION_MODE,
+                                         MONITOR_POLLING_INTERVAL_SECONDS)
+        self.pending_messages = {}  # line -> times it was seen in personal chat files
+        self.pending_votes = {}  # (voter, voted_for) -> times it was seen in personal vote files
+        self.phase_status = ""
+        self.voting_start_time = None
+        self.message_latencies = []
+        self.vote_latencies = []
+        self.voting_durations = []
+        self.is_stopped = threading.Event()
+
+    def check_phase_status(self, now):
+        phase_status = (self.game_dir / PHASE_STATUS_FILE).read_text(encoding="utf-8").strip()
+        if not phase_status or phase_status == self.phase_status:
+            return  # an empty status is a rewrite in progress
+        if VOTING_TIME in phase_status and VOTING_TIME not in self.phase_status:
+            self.voting_start_time = now
+        elif VOTING_TIME in self.phase_status and self.voting_start_time is not None:
+            self.voting_durations.append(now - self.voting_start_time)
+            self.voting_start_time = None
+        self.phase_status = phase_status
+
+    def check_public_line(self, line, now):
+        if line in self.pending_messages:
+            self.message_latencies.append(now - self.pending_messages[line].pop(0))
+            if not self.pending_messages[line]:
+                del self.pending_messages[line]
+            return
+        manager_prefix = f"{GAME_MANAGER_NAME}: "
+        if manager_prefix not in line:
+            return
+        matcher = VOTING_MESSAGE_PATTERN.fullmatch(line.split(manager_prefix, 1)[1].strip())
+        if matcher and matcher.groups() in self.pending_votes:
+            self.vote_latencies.append(now - self.pending_votes[matcher.groups()].pop(0))
+            if not self.pending_votes[matcher.groups()]:
+                del self.pending_votes[matcher.groups()]
+
+    def check_files(self):
+        now = time.monotonic()
+        # personal files first, so lines that were already copied are known when they're found
+        for reader in self.chat_readers:
+            for line in reader.read_new_lines():
+                self.pending_messages.setdefault(line, []).append(now)
+        for name, reader in self.vote_readers.items():
+            for line in reader.read_new_lines():
+                self.pending_votes.setdefault((name, line.strip()), []).append(now)
+        for reader in self.public_readers:
+            for line in reader.read_new_lines():
+                self.check_public_line(line, now)
+        self.check_phase_status(now)
+
+    def run(self):
+        while not self.is_stopped.is_set():
+            self.watcher.wait(timeout=MONITOR_WAKE_UP_SECONDS)
+            self.check_files()
+
+    def stop(self):
+        self.is_stopped.set()
+        self.join()
+        self.check_files()
+        self.watcher.close()
+        for reader in self.chat_readers + self.public_readers + list(self.vote_readers.values()):
+            reader.close()
+
+
+def create_scenario_config(num_players, num_mafia, daytime_minutes, nighttime_minutes,
+                           mock_latency_seconds, seed):
+    rng = random.Random(seed)
+    player_configs = [PlayerConfig(name, is_llm=True, real_name=f"LLM{i}")
+                      for i, name in enumerate(rng.sample(OPTIONAL_CODE_NAMES, num_players))]
+    for player_config in rng.sample(player_configs, num_mafia):
+        player_config.is_mafia = True
+    for player_config in player_configs:
+        player_config.llm_config = dict(MOCK_LLM_CONFIG)
+        player_config.llm_config[MOCK_SEED_KEY] = seed
+        player_config.llm_config[MOCK_LATENCY_MEAN_KEY] = mock_latency_seconds
+        player_config.llm_config[MOCK_LATENCY_STD_KEY] = mock_latency_seconds / 2
+    return {PLAYERS_KEY_IN_CONFIG: [asdict(player_config) for player_config in player_configs],
+            DAYTIME_MINUTES_KEY: daytime_minutes,
+            NIGHTTIME_MINUTES_KEY: nighttime_minutes,
+            "notes": f"benchmark: {num_players} mock LLM players, {num_mafia} mafia"}
+
+
+def run_benchmark_game(game_id, config_path, timeout_seconds):
+    game_dir = Path(DIRS_PREFIX) / game_id
+    init_game(game_id, str(config_path))
+    io_counters_dir = game_dir / "io_counters"
+    io_counters_dir.mkdir()
+    player_names = [player["name"] for player in
+                    json.loads(Path(config_path).read_text(encoding="utf-8"))[PLAYERS_KEY_IN_CONFIG]]
+    monitor = GameLatencyMonitor(game_dir, player_names)
+    monitor.start()
+    try:
+        run_game_with_subprocesses(game_dir, timeout_seconds,
+                                   command_prefix=[str(IO_COUNTER_SCRIPT), str(io_counters_dir)])
+    finally:
+        monitor.stop()
+    io_counters = [json.loads(counters_file.read_text(encoding="utf-8"))
+                   for counters_file in io_counters_dir.glob("*.json")]
+    return {"game_id": game_id,
+            "winner": (game_dir / WHO_WINS_FILE).read_text().strip(),
+            "message_latencies": monitor.message_latencies,
+            "vote_latencies": monitor.vote_latencies,
+            "voting_durations": monitor.voting_durations,
+            "read_bytes": sum(counters.get("rchar", 0) for counters in io_counters),
+            "written_bytes": sum(counters.get("wchar", 0) for counters in io_counters),
+            "has_io_counters": bool(io_counters)}
+
+
+def get_children_cpu_seconds():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_scenario(num_players, num_mafia, game_ids, concurrent_games, args, configs_dir):
+    config = create_scenario_config(num_players, num_mafia, args.daytime_minutes,
+                                    args.nighttime_minutes, args.mock_latency_seconds, args.seed)
+    config_path = configs_dir / f"benchmark_{num_players}_{num_mafia}.json"
+    config_path.write_text(json.dumps(config, indent=4), encoding="utf-8")
+    timeout_seconds = args.timeout_minutes * 60 if args.timeout_minutes else None
+    print(colored(f"Running {len(game_ids)} games of {num_players} players ({num_mafia} mafia), "
+                  f"{concurrent_games} at a time...", BENCHMARK_COLOR), flush=True)
+    start_cpu_seconds = get_children_cpu_seconds()
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrent_games) as executor:
+        games = list(executor.map(lambda game_id: run_benchmark_game(game_id, config_path,
+                                                                     timeout_seconds), game_ids))
+    wall_seconds = time.monotonic() - start_time
+    end_cpu_seconds = get_children_cpu_seconds()
+    if not args.keep_games:
+        for game_id in game_ids:
+            shutil.rmtree(Path(DIRS_PREFIX) / game_id)
+    message_latencies = sum([game["message_latencies"] for game in games], [])
+    vote_latencies = sum([game["vote_latencies"] for game in games], [])
+    voting_durations = sum([game["voting_durations"] for game in games], [])
+    has_io_counters = all(game["has_io_counters"] for game in games)
+
+    def in_ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 2)
+
+    def in_seconds(seconds):
+        return None if seconds is None else round(seconds, 3)
+
+    return {
+        "num_players": num_players,
+        "num_mafia": num_mafia,
+        "num_games": len(games),
+        "concurrent_games": concurrent_games,
+        "wall_seconds": round(wall_seconds, 2),
+        "games_per_hour": round(len(games) / wall_seconds * 3600, 2),
+        "cpu_seconds_per_game": None if start_cpu_seconds is None else
+        round((end_cpu_seconds - start_cpu_seconds) / len(games), 3),
+        "num_messages": len(message_latencies),
+        "message_latency_p50_ms": in_ms(percentile(message_latencies, 50)),
+        "message_latency_p99_ms": in_ms(percentile(message_latencies, 99)),
+        "num_votes": len(vote_latencies),
+        "vote_latency_p50_ms": in_ms(percentile(vote_latencies, 50)),
+        "vote_latency_p99_ms": in_ms(percentile(vote_latencies, 99)),
+        "voting_duration_p50_seconds": in_seconds(percentile(voting_durations, 50)),
+        "voting_duration_p99_seconds": in_seconds(percentile(voting_durations, 99)),
+        "read_bytes_per_game": sum(game["read_bytes"] for game in games) // len(games)
+        if has_io_counters else None,
+        "written_bytes_per_game": sum(game["written_bytes"] for game in games) // len(games)
+        if has_io_counters else None,
+        "winners": [game["winner"] for game in games],
+    }
+
+
+def print_results(results):
+    for result in results:
+        print(colored(f"\n{result['num_players']} players, {result['num_mafia']} mafia "
+                      f"({result['num_games']} games, {result['concurrent_games']} concurrent):",
+                      BENCHMARK_COLOR))
+        for key, value in result.items():
+            if key not in ["num_players", "num_mafia", "num_games", "concurrent_games"]:
+                print(f"  {key}: {value}")
+    print(flush=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Throughput benchmark of the game engine, "
+                                                 "with mock LLM players")
+    parser.add_argument("-s", "--scenarios", nargs="+", default=DEFAULT_SCENARIOS,
+                        help="num_players:num_mafia of every scenario")
+    parser.add_argument("-n", "--num_games", type=int, default=2,
+                        help="number of games per scenario")
+    parser.add_argument("-g", "--concurrent_games", type=int, default=1,
+                        help="number of games to run concurrently")
+    parser.add_argument("-dt", "--daytime_minutes", type=float, default=DEFAULT_DAYTIME_MINUTES)
+    parser.add_argument("-nt", "--nighttime_minutes", type=float,
+                        default=DEFAULT_NIGHTTIME_MINUTES)
+    parser.add_argument("-l", "--mock_latency_seconds", type=float,
+                        default=DEFAULT_MOCK_LATENCY_SECONDS,
+                        help="mean latency of the mock LLM responses")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the roles and the mock LLMs")
+    parser.add_argument("-t", "--timeout_minutes", type=float, default=None,
+                        help="maximal duration of a single game")
+    parser.add_argument("-k", "--keep_games", action="store_true",
+                        help="don't delete the benchmark's game dirs")
+    parser.add_argument("-o", "--output", default=None,
+                        help="path of the results JSON file (default: in the games dir)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    Path(DIRS_PREFIX).mkdir(exist_ok=True)
+    next_game_id = int(get_latest_game_id()) + 1
+    results = []
+    with tempfile.TemporaryDirectory() as configs_dir:
+        for scenario in args.scenarios:
+            num_players, num_mafia = [int(number) for number in scenario.split(":")]
+            game_ids = [f"{game_id}".zfill(GAME_ID_NUM_DIGITS)
+                        for game_id in range(next_game_id, next_game_id + args.num_games)]
+            next_game_id += args.num_games
+            results.append(run_scenario(num_players, num_mafia, game_ids, args.concurrent_games,
+                                        args, Path(configs_dir)))
+    print_results(results)
+    output_file = Path(args.output) if args.output else \
+        Path(DIRS_PREFIX) / RESULTS_FILE_FORMAT.format(time.strftime("%Y%m%d_%H%M%S"))
+    output_file.write_text(json.dumps(results, indent=4), encoding="utf-8")
+    print(colored(f"Results saved to: {output_file}", BENCHMARK_COLOR), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Runs a game script (like `mafia_main.py` or `llm_interface.py`) and saves the file I/O it did
+to `<counters_dir>/<pid>.json` when it exits, based on the kernel's counters in `/proc/self/io`
+(Linux only, elsewhere nothing is saved). The counters are taken relative to the moment the
+wrapper started, so they include the script's imports but not the interpreter's startup.
+
+usage: python benchmarks/io_counter.py <counters_dir> <script.py> [script arguments...]
+"""
+import os
+import sys
+import json
+import atexit
+import runpy
+from pathlib import Path
+
+PROC_IO_FILE = "/proc/self/io"
+# rchar/wchar are the bytes passed to read/write calls, the *_bytes ones are what reached storage
+IO_COUNTERS = ["rchar", "wchar", "syscr", "syscw", "read_bytes", "write_bytes"]
+
+
+def read_io_counters():
+    try:
+        lines = Path(PROC_IO_FILE).read_text().splitlines()
+    except OSError:
+        return {}
+    counters = {}
+    for line in lines:
+        key, _, value = line.partition(":")
+        if key in IO_COUNTERS:
+            counters[key] = int(value)
+    return counters
+
+
+def save_io_counters(counters_dir, initial_counters):
+    counters = read_io_counters()
+    if not counters:
+        return
+    delta = {key: counters[key] - initial_counters.get(key, 0) for key in counters}
+    (Path(counters_dir) / f"{os.getpid()}.json").write_text(json.dumps(delta), encoding="utf-8")
+
+
+def main():
+    counters_dir, script = sys.argv[1], sys.argv[2]
+    initial_counters = read_io_counters()
+    atexit.register(save_io_counters, counters_dir, initial_counters)
+    sys.argv = sys.argv[2:]
+    sys.path[0] = str(Path(script).resolve().parent)  # as if the script was run directly
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Startup-time benchmark of the repo's entry points: how long a fresh interpreter takes to import
+each of them, which every one of a game's player processes pays before it can join.
+
+Every entry point is imported `-n` times, each in a new `python -X importtime` process, and
+reported with:
+- the median wall time of the process, and the same minus an empty interpreter's startup (the
+  import cost itself);
+- the modules that took the most of the import time (by their own import time, not counting the
+  modules they imported), from the last run.
+The `player:<provider>` entry points also load the provider's SDK, the way the first LLM of a
+player process does (see `get_sdk` in llm/llm.py).
+
+usage (from the repo root):
+    python benchmarks/startup_time.py -n 5
+    python benchmarks/startup_time.py -e llm_interface player:openai analyze
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+from termcolor import colored
+from game_constants import DIRS_PREFIX
+
+BENCHMARK_COLOR = "cyan"
+RESULTS_FILE_FORMAT = "startup_benchmark_{}.json"
+PLAYER_ENTRY_POINT_PREFIX = "player:"
+DEFAULT_ENTRY_POINTS = ["llm_interface", "player:openai", "player:together", "mafia_main",
+                        "mafia_engine", "batch_runner", "llm_metrics_report", "analyze"]
+NUM_SLOWEST_MODULES = 5
+
+
+def get_import_code(entry_point):
+    if entry_point.startswith(PLAYER_ENTRY_POINT_PREFIX):
+        provider = entry_point[len(PLAYER_ENTRY_POINT_PREFIX):]
+        return f"import llm_interface; from llm.llm import get_sdk; get_sdk({provider!r})"
+    return f"import {entry_point}"
+
+
+def parse_import_times(stderr):
+    # lines of: "import time: <self us> | <cumulative us> | <indented module name>"
+    self_times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, module = line[len("import time:"):].split("|")
+        self_times[module.strip()] = int(self_time)
+    return self_times
+
+
+def run_once(code):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT,
+                             capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "failed"
+        raise RuntimeError(error)
+    return wall_seconds, parse_import_times(process.stderr)
+
+
+def measure(entry_point, num_runs, baseline_seconds):
+    code = get_import_code(entry_point)
+    try:
+        runs = [run_once(code) for _ in range(num_runs)]
+    except RuntimeError as e:
+        return {"entry_point": entry_point, "error": str(e)}
+    wall_seconds = statistics.median(wall for wall, _ in runs)
+    self_times = runs[-1][1]
+    slowest = sorted(self_times.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "entry_point": entry_point,
+        "wall_seconds": round(wall_seconds, 3),
+        "import_seconds": round(max(0.0, wall_seconds - baseline_seconds), 3),
+        "num_modules": len(self_times),
+        "slowest_modules": {module: round(microseconds / 1e6, 3)
+                            for module, microseconds in slowest[:NUM_SLOWEST_MODULES]},
+    }
+
+
+def print_results(baseline_seconds, results):
+    print(colored(f"Empty interpreter startup: {baseline_seconds:.3f}s", BENCHMARK_COLOR))
+    for result in results:
+        if "error" in result:
+            print(colored(f"\n{result['entry_point']}: ", BENCHMARK_COLOR) + result["error"])
+            continue
+        print(colored(f"\n{result['entry_point']}: {result['import_seconds']:.3f}s of imports "
+                      f"({result['wall_seconds']:.3f}s in total, {result['num_modules']} "
+                      f"modules)", BENCHMARK_COLOR))
+        for module, seconds in result["slowest_modules"].items():
+            print(f"  {module}: {seconds:.3f}s")
+    print(flush=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import time of the repo's entry points")
+    parser.add_argument("-e", "--entry_points", nargs="+", default=DEFAULT_ENTRY_POINTS,
+                        help="modules to import, or player:<provider> for a player process "
+                             "with its provider's SDK")
+    parser.add_argument("-n", "--num_runs", type=int, default=3,
+                        help="fresh processes per entry point, the median is reported")
+    parser.add_argument("-o", "--output", default=None,
+                        help=f"results JSON file (default: {DIRS_PREFIX}/"
+                             f"{RESULTS_FILE_FORMAT.format('<timestamp>')})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    baseline_seconds = statistics.median(run_once("pass")[0] for _ in range(args.num_runs))
+    results = [measure(entry_point, args.num_runs, baseline_seconds)
+               for entry_point in args.entry_points]
+    print_results(baseline_seconds, results)
+    output_file = Path(args.output) if args.output else \
+        REPO_ROOT / DIRS_PREFIX / RESULTS_FILE_FORMAT.format(time.strftime("%Y%m%d_%H%M%S"))
+    output_file.parent.mkdir(exist_ok=True)
+    output_file.write_text(json.dumps({"baseline_seconds": round(baseline_seconds, 3),
+                                       "results": results}, indent=4), encoding="utf-8")
+    print(colored(f"Results saved to: {output_file}", BENCHMARK_COLOR), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -575,16 +575,16 @@ def removeAnalysis():
         flush=True,
     )
     
-    file_to_remove = ['Adrian_chat.txt', 'Adrian_log.txt', 'Adrian_status.txt', 'Adrian_vote.txt', \
-                      'Alex_chat.txt', 'Alex_log.txt', 'Alex_status.txt', 'Alex_vote.txt', \
-                      'Brook_chat.txt', 'Brook_log.txt', 'Brook_status.txt', 'Brook_vote.txt', \
-                      'Elliot_chat.txt', 'Elliot_log.txt', 'Elliot_status.txt', 'Elliot_vote.txt', \
-                      'Noah_chat.txt', 'Noah_log.txt', 'Noah_status.txt', 'Noah_vote.txt', \
-                      'River_chat.txt', 'River_log.txt', 'River_status.txt', 'River_vote.txt', \
-                      'Ronny_chat.txt', 'Ronny_log.txt', 'Ronny_status.txt', 'Ronny_vote.txt', \
-                      'Stevie_chat.txt', 'Stevie_log.txt', 'Stevie_status.txt', 'Stevie_vote.txt', \
-                      'Tyler_chat.txt', 'Tyler_log.txt', 'Tyler_status.txt', 'Tyler_vote.txt', \
-                      'Whitney_chat.txt', 'Whitney_log.txt', 'Whitney_status.txt', 'Whitney_vote.txt', \
+    file_to_remove = ['Adrian_chat.txt', 'Adrian_log.txt', 'Adrian_log.jsonl', 'Adrian_status.txt', 'Adrian_vote.txt', \
+                      'Alex_chat.txt', 'Alex_log.txt', 'Alex_log.jsonl', 'Alex_status.txt', 'Alex_vote.txt', \
+                      'Brook_chat.txt', 'Brook_log.txt', 'Brook_log.jsonl', 'Brook_status.txt', 'Brook_vote.txt', \
+                      'Elliot_chat.txt', 'Elliot_log.txt', 'Elliot_log.jsonl', 'Elliot_status.txt', 'Elliot_vote.txt', \
+                      'Noah_chat.txt', 'Noah_log.txt', 'Noah_log.jsonl', 'Noah_status.txt', 'Noah_vote.txt', \
+                      'River_chat.txt', 'River_log.txt', 'River_log.jsonl', 'River_status.txt', 'River_vote.txt', \
+                      'Ronny_chat.txt', 'Ronny_log.txt', 'Ronny_log.jsonl', 'Ronny_status.txt', 'Ronny_vote.txt', \
+                      'Stevie_chat.txt', 'Stevie_log.txt', 'Stevie_log.jsonl', 'Stevie_status.txt', 'Stevie_vote.txt', \
+                      'Tyler_chat.txt', 'Tyler_log.txt', 'Tyler_log.jsonl', 'Tyler_status.txt', 'Tyler_vote.txt', \
+                      'Whitney_chat.txt', 'Whitney_log.txt', 'Whitney_log.jsonl', 'Whitney_status.txt', 'Whitney_vote.txt', \
                       'remaining_players.txt', 'real_names.txt', 'notes.txt', 'phase_status.txt' ]
     
     for game_id in range(int(starting_id), int(ending_id) + 1):
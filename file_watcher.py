@@ -0,0 +1,174 @@
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+from game_constants import NOTIFICATION_MODE_KEY, POLLING_INTERVAL_SECONDS_KEY, \
+    INOTIFY_NOTIFICATION_MODE, POLLING_NOTIFICATION_MODE, AUTO_NOTIFICATION_MODE, \
+    DEFAULT_NOTIFICATION_MODE, DEFAULT_POLLING_INTERVAL_SECONDS
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCHED_EVENTS_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len (followed by the name)
+INOTIFY_READ_SIZE = 64 * 1024
+
+
+def _load_inotify_libc():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        libc.inotify_init1  # raises AttributeError if the symbol is missing
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileChangeWatcher:
+    """
+    Blocks the caller until one of a fixed set of files (in a single game dir) changes.
+
+    With inotify the process sleeps in the kernel until a watched file is written, and events
+    are queued from construction, so changes made while the caller was busy are never lost.
+    When inotify is unavailable (or polling mode is configured) the files' (mtime, size) are
+    compared to a snapshot every `polling_interval` seconds instead.
+    Methods:
+        wait(timeout=None):
+            Returns True once a watched file changed, or False if `timeout` seconds passed first.
+        close():
+            Releases the inotify file descriptor, if one is used.
+    """
+
+    def __init__(self, paths, mode=DEFAULT_NOTIFICATION_MODE,
+                 polling_interval=DEFAULT_POLLING_INTERVAL_SECONDS):
+        self.paths = [Path(path) for path in paths]
+        self.watched_names = {path.name for path in self.paths}
+        self.polling_interval = polling_interval
+        self.inotify_fd = None
+        if mode not in (INOTIFY_NOTIFICATION_MODE, POLLING_NOTIFICATION_MODE,
+                        AUTO_NOTIFICATION_MODE):
+            raise ValueError(f"Unknown file notification mode: {mode}")
+        if mode != POLLING_NOTIFICATION_MODE:
+            self.inotify_fd = self._init_inotify()
+            if self.inotify_fd is None and mode == INOTIFY_NOTIFICATION_MODE:
+                raise OSError("inotify notification mode was requested but isn't available")
+        self.mode = INOTIFY_NOTIFICATION_MODE if self.inotify_fd is not None \
+            else POLLING_NOTIFICATION_MODE
+        self.snapshot = self._take_snapshot()
+
+    def _init_inotify(self):
+        libc = _load_inotify_libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        # watching the parent dirs (and not the files) also catches files that are recreated
+        for directory in {path.parent for path in self.paths}:
+            if libc.inotify_add_watch(fd, str(directory).encode(), WATCHED_EVENTS_MASK) < 0:
+                os.close(fd)
+                return None
+        return fd
+
+    def _take_snapshot(self):
+        snapshot = {}
+        for path in self.paths:
+            try:
+                stat = path.stat()
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                snapshot[path] = None
+        return snapshot
+
+    def _read_inotify_events(self):
+        try:
+            buffer = os.read(self.inotify_fd, INOTIFY_READ_SIZE)
+        except BlockingIOError:
+            return False
+        offset = 0
+        has_relevant_change = False
+        while offset + INOTIFY_EVENT_HEADER.size <= len(buffer):
+            _, _, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = buffer[offset:offset + name_length].rstrip(b"\0").decode(errors="replace")
+            offset += name_length
+            if name in self.watched_names:
+                has_relevant_change = True
+        return has_relevant_change
+
+    def _wait_with_inotify(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.inotify_fd], [], [], remaining)
+            # drain everything that is queued, so a burst of writes causes a single wake-up
+            if readable and self._read_inotify_events():
+                while self._read_inotify_events():
+                    pass
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def _wait_with_polling(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current_snapshot = self._take_snapshot()
+            if current_snapshot != self.snapshot:
+                self.snapshot = current_snapshot  # taken before the caller reads the new content
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(self.polling_interval, remaining))
+            else:
+                time.sleep(self.polling_interval)
+
+    def wait(self, timeout=None):
+        if timeout is not None and timeout < 0:
+            timeout = 0
+        if self.inotify_fd is not None:
+            return self._wait_with_inotify(timeout)
+        return self._wait_with_polling(timeout)
+
+    def close(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def create_file_watcher(paths, config):
+    """
+    Creates a FileChangeWatcher for the given paths using the game config's notification settings.
+
+    Args:
+        paths (list[Path]): The files that should wake up the caller when written to.
+        config (dict): The game configuration, optionally with NOTIFICATION_MODE_KEY and
+            POLLING_INTERVAL_SECONDS_KEY entries.
+
+    Returns:
+        FileChangeWatcher: A watcher using inotify when possible and polling otherwise.
+    """
+    return FileChangeWatcher(
+        paths,
+        mode=config.get(NOTIFICATION_MODE_KEY, DEFAULT_NOTIFICATION_MODE),
+        polling_interval=config.get(POLLING_INTERVAL_SECONDS_KEY, DEFAULT_POLLING_INTERVAL_SECONDS))
@@ -0,0 +1,70 @@
+"""
+The clock that the game reads the time from, for phase timers and message timestamps.
+
+By default it is the wall clock. All-LLM games run by `mafia_engine.py` can use a simulated clock
+instead, which only advances when the game says so (e.g. by the time it would take to type a
+message), so a phase doesn't have to last its full duration in real time once all models stopped
+talking, while the transcripts still get plausible timestamps.
+"""
+import time
+import threading
+
+
+class WallClock:
+
+    def time(self):
+        return time.time()
+
+    def strftime(self, time_format):
+        return time.strftime(time_format)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """
+    A clock that starts at `start_time` and only moves forward when advanced explicitly.
+    Methods:
+        advance(seconds):
+            Moves the clock forward, returns the new time.
+        advance_to(timestamp):
+            Moves the clock forward to the given time, if it is later than the current time.
+        sleep(seconds):
+            Same as advance, without blocking the caller.
+    """
+
+    def __init__(self, start_time=None):
+        self.now = time.time() if start_time is None else start_time
+        self.lock = threading.Lock()  # LLM players may read and advance it from worker threads
+
+    def time(self):
+        return self.now
+
+    def strftime(self, time_format):
+        return time.strftime(time_format, time.localtime(self.now))
+
+    def advance(self, seconds):
+        with self.lock:
+            self.now += max(0, seconds)
+            return self.now
+
+    def advance_to(self, timestamp):
+        with self.lock:
+            self.now = max(self.now, timestamp)
+            return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+_clock = WallClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
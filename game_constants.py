@@ -4,6 +4,7 @@ import random
 import time
 from pathlib import Path
 from termcolor import colored
+from game_clock import get_clock
 
 
 # new game preparation constants
@@ -25,13 +26,26 @@ GAME_START_TIME_FILE = "game_start_time.txt"
 PUBLIC_MANAGER_CHAT_FILE = "public_manager_chat.txt"
 PUBLIC_DAYTIME_CHAT_FILE = "public_daytime_chat.txt"
 PUBLIC_NIGHTTIME_CHAT_FILE = "public_nighttime_chat.txt"
+# everything the host publishes, as JSON lines; the public chat files are projections of it
+GAME_EVENTS_FILE = "events.jsonl"
 # file that is initial used for players to write "joined", and then for host to write "eliminated"
 PERSONAL_STATUS_FILE_FORMAT = "{}_status.txt"
 # files that hosts read from and players write to
 PERSONAL_CHAT_FILE_FORMAT = "{}_chat.txt"
 PERSONAL_VOTE_FILE_FORMAT = "{}_vote.txt"
 PERSONAL_SURVEY_FILE_FORMAT = "{}_survey.txt"
-LLM_LOG_FILE_FORMAT = "{}_log.txt"
+LLM_LOG_FILE_FORMAT = "{}_log.jsonl"  # a record per logged operation, see llm_players/logger.py
+LLM_TEXT_LOG_FILE_FORMAT = "{}_log.txt"  # the markdown logs of games from before the JSONL logs
+LLM_METRICS_FILE = "llm_metrics.jsonl"  # telemetry of all the LLM calls, see llm/telemetry.py
+
+# game event types (see game_events.py)
+PHASE_START_EVENT = "phase_start"
+VOTING_START_EVENT = "voting_start"
+ANNOUNCEMENT_EVENT = "announcement"
+MESSAGE_EVENT = "message"
+VOTE_EVENT = "vote"
+ELIMINATION_EVENT = "elimination"
+GAME_OVER_EVENT = "game_over"
 
 # constant strings for info files
 NIGHTTIME = "Nighttime"
@@ -100,6 +114,23 @@ DEFAULT_DAYTIME_MINUTES = 2  # 2.5  # 3  # it was 2:30 in Ibraheem et al. 2022
 DAYTIME_MINUTES_KEY = "daytime_minutes"
 NIGHTTIME_MINUTES_KEY = "nighttime_minutes"
 
+# file change notification constants (how the host waits for players' files to be written)
+NOTIFICATION_MODE_KEY = "notification_mode"
+POLLING_INTERVAL_SECONDS_KEY = "polling_interval_seconds"
+INOTIFY_NOTIFICATION_MODE = "inotify"
+POLLING_NOTIFICATION_MODE = "polling"
+AUTO_NOTIFICATION_MODE = "auto"  # inotify when available, polling otherwise
+DEFAULT_NOTIFICATION_MODE = AUTO_NOTIFICATION_MODE
+DEFAULT_POLLING_INTERVAL_SECONDS = 0.1
+
+# clock constants (a simulated clock is only supported by the single-process mafia_engine.py)
+CLOCK_MODE_KEY = "clock_mode"
+WALL_CLOCK_MODE = "wall"
+SIMULATED_CLOCK_MODE = "simulated"
+DEFAULT_CLOCK_MODE = WALL_CLOCK_MODE
+MAX_MESSAGES_PER_PHASE_KEY = "max_messages_per_phase"  # optional, ends simulated phases early
+SIMULATED_REACTION_SECONDS = 2  # added to the typing time of every message with a simulated clock
+
 # human player interface constants
 MANAGER_COLOR = "green"
 DAYTIME_COLOR = "light_blue"
@@ -170,6 +201,10 @@ MODEL_CHOSE_TO_PASS_TURN_LOG = "The LLM player has chosen to pass its turn " \
                                "without generating a message!"
 MODEL_VOTED_INVALIDLY_LOG = "The LLM player has generated a message with no valid vote..."
 MODEL_RANDOMLY_VOTED_LOG = "random vote selected for the LLM player"
+VOTE_DECISION_LOG = "vote decision"
+LLM_CALL_LOG = "LLM call"  # once per LLM request, with its output, latency and outcome
+USE_TURN_DECISION = "use_turn"
+PASS_TURN_DECISION = "pass_turn"
 
 
 def minutes_to_seconds(num_minutes):
@@ -177,7 +212,7 @@ def minutes_to_seconds(num_minutes):
 
 
 def get_current_timestamp():
-    return time.strftime(TIME_FORMAT_FOR_TIMESTAMP)
+    return get_clock().strftime(TIME_FORMAT_FOR_TIMESTAMP)
 
 
 def format_message(name, message):
@@ -0,0 +1,132 @@
+"""
+The game's append-only event log: every line the host publishes is first appended to
+`events.jsonl` in the game dir as a typed, sequence-numbered event, and only then written to its
+legacy public chat file, which is a projection of the log.
+
+An event is a JSON object with:
+- "seq": its index in the log, starting at 0;
+- "type": one of the `*_EVENT` constants in game_constants.py;
+- "time": the clock's time when it was appended;
+- "chat_room" and "line": the public chat file name and the line that was projected into it
+  (with "name" and "text" parsed from the line), if the event has a line;
+- any typed data of the event, e.g. "voter" and "voted_for" of a vote.
+"""
+import re
+import json
+from pathlib import Path
+from game_clock import get_clock
+from game_constants import GAME_EVENTS_FILE, MESSAGE_PARSING_PATTERN, PUBLIC_MANAGER_CHAT_FILE, \
+    PUBLIC_DAYTIME_CHAT_FILE, PUBLIC_NIGHTTIME_CHAT_FILE
+from tail_reader import TailReader
+
+PUBLIC_CHAT_FILES = [PUBLIC_MANAGER_CHAT_FILE, PUBLIC_DAYTIME_CHAT_FILE, PUBLIC_NIGHTTIME_CHAT_FILE]
+
+
+class GameEventLog:
+    """
+    The host's writer of a game's event log. There must be only one writer per game.
+    Attributes:
+        game_dir (Path): The game dir.
+        next_seq (int): The sequence number of the next appended event.
+    Methods:
+        append(event_type, chat_room=None, lines=(), **data):
+            Appends an event per line (or a single one without lines) and projects the lines.
+    """
+
+    def __init__(self, game_dir):
+        self.game_dir = Path(game_dir)
+        self.events_file = self.game_dir / GAME_EVENTS_FILE
+        self.next_seq = 0
+        if self.events_file.exists():  # continues a log, e.g. of a restarted host
+            with open(self.events_file, "rb") as f:
+                self.next_seq = sum(1 for _ in f)
+
+    def create_event(self, event_type, data, chat_room=None, line=None):
+        event = {"seq": self.next_seq, "type": event_type, "time": get_clock().time()}
+        self.next_seq += 1
+        if line is not None:
+            event["chat_room"] = Path(chat_room).name
+            event["line"] = line
+            matcher = re.match(MESSAGE_PARSING_PATTERN, line)
+            if matcher:
+                event["name"], event["text"] = matcher.group(4), matcher.group(5)  # depends on pattern
+        event.update(data)
+        return event
+
+    def append(self, event_type, chat_room=None, lines=(), **data):
+        """
+        Appends the events to the log, then writes their lines to the chat room's file.
+
+        Args:
+            event_type (str): One of the `*_EVENT` constants.
+            chat_room (Path | None): The public chat file the lines are published to.
+            lines (list[str]): Lines to publish, each one already ends with "\\n".
+            **data: The event's typed data (shared by all the lines' events).
+
+        Returns:
+            list[dict]: The appended events.
+        """
+        if lines:
+            events = [self.create_event(event_type, data, chat_room, line) for line in lines]
+        else:
+            events = [self.create_event(event_type, data)]
+        with open(self.events_file, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(event) + "\n" for event in events))
+        if lines:
+            with open(chat_room, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        return events
+
+
+class GameEventReader:
+    """
+    Incrementally reads a game's event log, like `TailReader` does for text files.
+    Attributes:
+        offset (int): Number of bytes of the log consumed so far, to continue reading from later.
+    Methods:
+        read_new_events():
+            Returns the events appended since the previous call, in order.
+    """
+
+    def __init__(self, game_dir, offset=0):
+        self.reader = TailReader(Path(game_dir) / GAME_EVENTS_FILE)
+        self.reader.offset = offset
+
+    @property
+    def offset(self):
+        return self.reader.lines_offset
+
+    def read_new_events(self):
+        return [json.loads(line) for line in self.reader.read_new_lines()]
+
+    def close(self):
+        self.reader.close()
+
+
+def has_event_log(game_dir):
+    events_file = Path(game_dir) / GAME_EVENTS_FILE
+    return events_file.exists() and events_file.stat().st_size > 0  # older games don't have one
+
+
+def read_events(game_dir):
+    with open(Path(game_dir) / GAME_EVENTS_FILE, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def project_chat_rooms(events):
+    """
+    Returns the lines of every public chat file as they are projected from the events.
+    """
+    chat_rooms = {chat_room: [] for chat_room in PUBLIC_CHAT_FILES}
+    for event in events:
+        if "line" in event:
+            chat_rooms.setdefault(event["chat_room"], []).append(event["line"])
+    return chat_rooms
+
+
+def rebuild_chat_rooms(game_dir):
+    """
+    Regenerates the game's public chat files from its event log.
+    """
+    for chat_room, lines in project_chat_rooms(read_events(game_dir)).items():
+        (Path(game_dir) / chat_room).write_text("".join(lines), encoding="utf-8")
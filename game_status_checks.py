@@ -1,5 +1,10 @@
+import os
+import json
+import time
 from game_constants import NIGHTTIME, PHASE_STATUS_FILE, WHO_WINS_FILE, VOTED_OUT, \
-    PERSONAL_STATUS_FILE_FORMAT, VOTING_TIME, GAME_START_TIME_FILE, MAFIA_NAMES_FILE
+    PERSONAL_STATUS_FILE_FORMAT, VOTING_TIME, GAME_START_TIME_FILE, MAFIA_NAMES_FILE, \
+    GAME_CONFIG_FILE
+from file_watcher import create_file_watcher
 
 
 def is_nighttime(game_dir):
@@ -26,3 +31,100 @@ def all_players_joined(game_dir):
 def get_is_mafia(name, game_dir):
     mafia_names = (game_dir / MAFIA_NAMES_FILE).read_text().splitlines()  # removes the "\n"
     return name in mafia_names
+
+
+class GameStatusView:
+    """
+    A single client's cached view of the game's status files (phase, winner, start time and
+    optionally its own player status), for loops that check the status all the time.
+
+    Every check only stats the file and re-reads it when its (mtime, size) changed - the phase
+    statuses all have different lengths, so a phase change always changes the size. The blocking
+    `wait_*` calls sleep on a file watcher until the status files (or `extra_paths`) change.
+    Methods:
+        is_nighttime(), is_time_to_vote(), is_game_over(), is_voted_out(), all_players_joined():
+            Same as the module's functions of the same names, for this view's game and player.
+        wait_for_change(timeout=None):
+            Sleeps until a watched file changes, returns False if `timeout` seconds passed first.
+        wait_for_phase_change(phase=None, timeout=None):
+            Sleeps until the phase status isn't `phase` (by default, the current one) or the game
+            is over, returns the new phase.
+        wait_for_voting(timeout=None):
+            Sleeps until it's time to vote or the game is over, returns whether it's time to vote.
+        wait_for_all_players_joined():
+            Sleeps until the game manager has started the game.
+        close():
+            Releases the file watcher.
+    """
+
+    def __init__(self, game_dir, name=None, extra_paths=()):
+        self.game_dir = game_dir
+        self.phase_status_file = game_dir / PHASE_STATUS_FILE
+        self.who_wins_file = game_dir / WHO_WINS_FILE
+        self.game_start_time_file = game_dir / GAME_START_TIME_FILE
+        self.personal_status_file = None if name is None \
+            else game_dir / PERSONAL_STATUS_FILE_FORMAT.format(name)
+        self._cache = {}  # path -> ((mtime, size), content)
+        watched_paths = [self.phase_status_file, self.who_wins_file, self.game_start_time_file]
+        if self.personal_status_file is not None:
+            watched_paths.append(self.personal_status_file)
+        with open(game_dir / GAME_CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)  # may configure the notification mode
+        self.watcher = create_file_watcher(watched_paths + list(extra_paths), config)
+
+    def _read(self, path):
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._cache.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, path.read_text())
+            self._cache[path] = cached
+        return cached[1]
+
+    def get_phase(self):
+        return self._read(self.phase_status_file)
+
+    def is_nighttime(self):
+        return NIGHTTIME in self.get_phase()
+
+    def is_time_to_vote(self):
+        return VOTING_TIME in self.get_phase()
+
+    def is_game_over(self):
+        return bool(self._read(self.who_wins_file))
+
+    def is_voted_out(self):
+        return VOTED_OUT in self._read(self.personal_status_file)
+
+    def all_players_joined(self):
+        return bool(self._read(self.game_start_time_file))
+
+    def wait_for_change(self, timeout=None):
+        return self.watcher.wait(timeout)
+
+    def _wait_until(self, condition, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # the watcher queues changes from its creation, so a change after a check isn't missed
+        while not condition() and not self.is_game_over():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            self.watcher.wait(remaining)
+
+    def wait_for_phase_change(self, phase=None, timeout=None):
+        if phase is None:
+            phase = self.get_phase()
+        # an empty status is only seen while the manager rewrites the file
+        self._wait_until(lambda: self.get_phase() not in (phase, ""), timeout)
+        return self.get_phase()
+
+    def wait_for_voting(self, timeout=None):
+        self._wait_until(self.is_time_to_vote, timeout)
+        return self.is_time_to_vote()
+
+    def wait_for_all_players_joined(self):
+        while not self.all_players_joined():
+            self.watcher.wait()
+
+    def close(self):
+        self.watcher.close()
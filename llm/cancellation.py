@@ -0,0 +1,75 @@
+"""
+Cancellation of in-flight LLM generations, e.g. when the phase they were generated for ends and
+their result would be thrown away.
+
+A player's LLM gets a `CancellationToken` before generating, and whoever tracks the game's phase
+cancels it on the next phase transition. Generations check the token before calling the API, and
+API backends stream their responses and close the stream when the token is cancelled, so the
+request stops right away instead of running to its end.
+"""
+import threading
+
+
+class GenerationCancelled(Exception):
+    """Raised by a generation whose cancellation token was cancelled."""
+
+
+class CancellationToken:
+    """
+    A thread-safe, one-way cancellation flag. A token with a parent is also cancelled with it.
+    Attributes:
+        reason (str): Why it was cancelled.
+    Methods:
+        cancel(reason=""):
+            Cancels the token and runs its callbacks (once).
+        is_cancelled():
+            Returns whether the token was cancelled.
+        raise_if_cancelled():
+            Raises `GenerationCancelled` if the token was cancelled.
+        add_callback(callback) / remove_callback(callback):
+            Registers a function to call on cancellation (immediately if already cancelled).
+    """
+
+    def __init__(self, parent=None):
+        self.event = threading.Event()
+        self.reason = ""
+        self.callbacks = []
+        self.lock = threading.Lock()
+        if parent is not None:
+            parent.add_callback(lambda: self.cancel(parent.reason))
+
+    def cancel(self, reason=""):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.reason = reason
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            run_callback(callback)
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise GenerationCancelled(self.reason)
+
+    def add_callback(self, callback):
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        run_callback(callback)
+
+    def remove_callback(self, callback):
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+
+def run_callback(callback):
+    try:
+        callback()
+    except Exception:  # e.g. closing a stream that is being read by another thread
+        pass
@@ -1,8 +1,15 @@
 import abc
 import os
+import math
 import time
+import random
+import json
+import threading
 from pathlib import Path
+from types import SimpleNamespace
+from contextlib import contextmanager
 from functools import cache
+from collections import namedtuple
 
 # import torch
 """ from transformers import (
@@ -12,9 +19,15 @@ from functools import cache
     AutoConfig,
     pipeline as hf_pipeline,
 ) """
-import openai
-from together import Together
-from together.error import TogetherException
+from llm.response_cache import get_response_cache
+from llm.retry_policy import (RetryPolicy, RetryBudgetExceeded, RequestFailed, EmptyResponseError,
+                              get_circuit_breaker)
+from llm.rate_limiter import get_rate_limiter, estimate_num_tokens
+from llm.cancellation import GenerationCancelled, run_callback
+from llm import telemetry
+from llm.local_server import LocalServerError, ensure_local_server, send_request
+from game_constants import LLM_METRICS_FILE, LLM_CALL_LOG
+from llm_players.logger import get_prompt_hash
 
 # Constants (import or define as needed)
 from llm_players.llm_constants import (
@@ -25,7 +38,41 @@ from llm_players.llm_constants import (
     DEFAULT_PIPELINE_PROMPT_PATTERN,
     DEFAULT_PROMPT_PATTERN,
     GENERAL_SYSTEM_INFO,
-    SLEEPING_TIME_FOR_API_GENERATION_ERROR,
+    RETRY_MAX_ATTEMPTS_KEY,
+    RETRY_BASE_DELAY_KEY,
+    RETRY_MAX_DELAY_KEY,
+    CIRCUIT_BREAKER_FAILURES_KEY,
+    CIRCUIT_BREAKER_COOLDOWN_KEY,
+    DEFAULT_RETRY_MAX_ATTEMPTS,
+    DEFAULT_RETRY_BASE_DELAY,
+    DEFAULT_RETRY_MAX_DELAY,
+    DEFAULT_CIRCUIT_BREAKER_FAILURES,
+    DEFAULT_CIRCUIT_BREAKER_COOLDOWN,
+    RATE_LIMIT_REQUESTS_PER_MINUTE_KEY,
+    RATE_LIMIT_TOKENS_PER_MINUTE_KEY,
+    RATE_LIMIT_DB_KEY,
+    DEFAULT_RATE_LIMIT_REQUESTS_PER_MINUTE,
+    DEFAULT_RATE_LIMIT_TOKENS_PER_MINUTE,
+    DEFAULT_RATE_LIMIT_DB,
+    OPENAI_PROVIDER,
+    TOGETHER_PROVIDER,
+    LOCAL_PROVIDER,
+    LOCAL_SERVER_ADDRESS_KEY,
+    LOCAL_SERVER_AUTOSTART_KEY,
+    DEFAULT_LOCAL_SERVER_ADDRESS,
+    DEFAULT_LOCAL_SERVER_AUTOSTART,
+    MAX_IN_FLIGHT_REQUESTS_KEY,
+    DEFAULT_MAX_IN_FLIGHT_REQUESTS,
+    IN_FLIGHT_WAIT_POLL_SECONDS,
+    RESPONSE_CACHE_MODE_KEY,
+    RESPONSE_CACHE_DIR_KEY,
+    RESPONSE_CACHE_MAX_MB_KEY,
+    RESPONSE_CACHE_MODES,
+    NO_RESPONSE_CACHE,
+    RECORD_RESPONSE_CACHE,
+    DEFAULT_RESPONSE_CACHE_MODE,
+    DEFAULT_RESPONSE_CACHE_DIR,
+    DEFAULT_RESPONSE_CACHE_MAX_MB,
     MAX_NEW_TOKENS_KEY,
     MAX_TOKENS_KEY,
     NUM_BEAMS_KEY,
@@ -35,10 +82,48 @@ from llm_players.llm_constants import (
     SECRETS_DICT_FILE_PATH,
     USE_TOGETHER_KEY,
     USE_OPENAI_KEY,
+    USE_MOCK_KEY,
     USE_PIPELINE_KEY,
     PIPELINE_TASK_KEY,
     TOGETHER_API_KEY_KEYWORD,
     OPENAI_API_KEY_KEYWORD,
+    PASS_TURN_TOKEN_KEY,
+    USE_TURN_TOKEN_KEY,
+    DEFAULT_PASS_TURN_TOKEN,
+    DEFAULT_USE_TURN_TOKEN,
+    VOTE_PROMPT_MARKER,
+    MOCK_MODEL_NAME,
+    MOCK_SEED_KEY,
+    MOCK_LATENCY_DISTRIBUTION_KEY,
+    MOCK_LATENCY_MEAN_KEY,
+    MOCK_LATENCY_STD_KEY,
+    MOCK_SPEAK_PROBABILITY_KEY,
+    MOCK_VOTE_POLICY_KEY,
+    MOCK_MAX_MESSAGE_WORDS_KEY,
+    MOCK_LATENCY_DISTRIBUTIONS,
+    MOCK_VOTE_POLICIES,
+    CONSTANT_LATENCY,
+    UNIFORM_LATENCY,
+    NORMAL_LATENCY,
+    LOGNORMAL_LATENCY,
+    FIRST_CANDIDATE_VOTE_POLICY,
+    INVALID_VOTE_POLICY,
+    DEFAULT_MOCK_SEED,
+    DEFAULT_MOCK_LATENCY_DISTRIBUTION,
+    DEFAULT_MOCK_LATENCY_MEAN,
+    DEFAULT_MOCK_LATENCY_STD,
+    DEFAULT_MOCK_SPEAK_PROBABILITY,
+    DEFAULT_MOCK_VOTE_POLICY,
+    DEFAULT_MOCK_MAX_MESSAGE_WORDS,
+    MOCK_MESSAGE_WORDS,
+    STRUCTURED_SPEAK_KEY,
+    STRUCTURED_MESSAGE_KEY,
+    WARM_UP_CALL,
+    WARM_UP_KEY,
+    WARM_UP_MODES,
+    NO_WARM_UP,
+    ONCE_PER_PROCESS_WARM_UP,
+    BLOCKING_WARM_UP,
 )
 
 
@@ -59,18 +144,198 @@ def get_api_key(env_key: str, dict_key: str):
     return _load_secrets().get(dict_key)
 
 
+# API clients are shared by all the LLMs of a process, so all the players of an in-process game
+# reuse the same keep-alive connections instead of opening a connection pool each.
+_clients_lock = threading.Lock()
+_clients = {}
+_in_flight_semaphores = {}
+
+
+# The providers' SDKs take a while to import, so each is imported by the first LLM of its provider,
+# and a player process only pays for its own provider's SDK.
+ProviderSDK = namedtuple("ProviderSDK", ["client_class", "api_error_class", "api_key_keyword"])
+
+
+def _load_together_sdk():
+    from together import Together
+    from together.error import TogetherException
+    return ProviderSDK(Together, TogetherException, TOGETHER_API_KEY_KEYWORD)
+
+
+def _load_openai_sdk():
+    import openai
+    return ProviderSDK(openai.OpenAI, openai.OpenAIError, OPENAI_API_KEY_KEYWORD)
+
+
+_SDK_LOADERS = {TOGETHER_PROVIDER: _load_together_sdk, OPENAI_PROVIDER: _load_openai_sdk}
+
+
+@cache
+def get_sdk(provider):
+    return _SDK_LOADERS[provider]()
+
+
+def get_api_errors(provider):
+    """The provider's SDK errors that are retried (see RetryPolicy)"""
+    return (get_sdk(provider).api_error_class,)
+
+
+def _create_client(provider):
+    sdk = get_sdk(provider)
+    api_key = get_api_key(sdk.api_key_keyword, sdk.api_key_keyword)
+    return sdk.client_class(api_key=api_key, max_retries=0)  # retries are done by our RetryPolicy
+
+
+def get_chat_output(resp):
+    output = resp.choices[0].message.content
+    if not output:
+        raise EmptyResponseError()
+    return output
+
+
+def read_stream(stream, cancellation_token, on_chunk):
+    """
+    Reads a streamed response until its end, or until the token is cancelled, which also closes
+    the stream so a blocked read returns right away. Raises `GenerationCancelled` if cancelled.
+    """
+    cancellation_token.add_callback(stream.close)
+    try:
+        for chunk in stream:
+            if cancellation_token.is_cancelled():
+                break
+            on_chunk(chunk)
+    except Exception:
+        if not cancellation_token.is_cancelled():
+            raise
+    finally:
+        cancellation_token.remove_callback(stream.close)
+        run_callback(stream.close)
+    cancellation_token.raise_if_cancelled()
+
+
+def get_chat_stream_output(stream, cancellation_token, on_usage=None):
+    parts = []
+
+    def on_chunk(chunk):
+        if chunk.choices and chunk.choices[0].delta.content:
+            if not parts:
+                telemetry.record_first_token()
+            parts.append(chunk.choices[0].delta.content)
+        if on_usage and getattr(chunk, "usage", None):  # in the last chunk
+            on_usage(chunk.usage)
+    read_stream(stream, cancellation_token, on_chunk)
+    output = "".join(parts)
+    if not output:
+        raise EmptyResponseError()
+    return output
+
+
+def get_usage_tokens(usage):
+    """
+    Returns the prompt, cached prompt, completion and reasoning tokens of a response's usage, of
+    either the chat completions or the responses API, or None if the response didn't report it.
+    """
+    if usage is None:
+        return None
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None)
+    if prompt_tokens is None:
+        return None
+    prompt_details = getattr(usage, "prompt_tokens_details", None) \
+        or getattr(usage, "input_tokens_details", None)
+    completion_details = getattr(usage, "completion_tokens_details", None) \
+        or getattr(usage, "output_tokens_details", None)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": getattr(prompt_details, "cached_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None)
+                             or getattr(usage, "output_tokens", None) or 0,
+        "reasoning_tokens": getattr(completion_details, "reasoning_tokens", None) or 0,
+    }
+
+
+def get_client(provider):
+    """
+    Returns the process' shared blocking client of the provider, creating it on the first call.
+    """
+    with _clients_lock:
+        if provider not in _clients:
+            _clients[provider] = _create_client(provider)
+        return _clients[provider]
+
+
+def get_in_flight_semaphore(provider, max_in_flight):
+    """
+    Returns the semaphore that limits the number of concurrent blocking requests to the provider
+    in this process, or None if they aren't limited. The first LLM of a provider sets its limit.
+    """
+    with _clients_lock:
+        if provider not in _in_flight_semaphores:
+            _in_flight_semaphores[provider] = \
+                threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+        return _in_flight_semaphores[provider]
+
+
+# (LLM class, model name) pairs that were warmed up in this process, see `LLM.start_warm_up`
+_warmed_up_models = set()
+_warmed_up_models_lock = threading.Lock()
+
+
 class LLM(abc.ABC):
+
+    DEFAULT_WARM_UP = NO_WARM_UP  # the warm-up mode when the config doesn't set one
+
     def __init__(self, logger, **llm_config):
         self.logger = logger
         self.model_name = llm_config.get("model_name")
         self.llm_config = llm_config
+        self.max_in_flight = llm_config.get(MAX_IN_FLIGHT_REQUESTS_KEY, DEFAULT_MAX_IN_FLIGHT_REQUESTS)
+        self.retry_policy = RetryPolicy(llm_config.get(RETRY_BASE_DELAY_KEY, DEFAULT_RETRY_BASE_DELAY),
+                                        llm_config.get(RETRY_MAX_DELAY_KEY, DEFAULT_RETRY_MAX_DELAY),
+                                        llm_config.get(RETRY_MAX_ATTEMPTS_KEY, DEFAULT_RETRY_MAX_ATTEMPTS))
+        self.retry_deadline = None  # the end of the current phase, if it's time limited
+        self._cancellation_token = None  # set while generating for a phase that may end meanwhile
+        self._thread_local = threading.local()  # for per-thread token overrides
+        self.num_prompt_tokens = 0  # as reported by the API, to track the provider's prompt caching
+        self.num_cached_prompt_tokens = 0
+        self._usage_lock = threading.Lock()
+        self.metrics_writer = telemetry.get_metrics_writer(logger.game_dir / LLM_METRICS_FILE)
         self.prompt_template = self._get_prompt_template()
         # self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self._setup_generation_parameters()
         self._initialize()
-        # Warm-up
+        self._setup_response_cache()
+        self.start_warm_up()
+
+    def start_warm_up(self):
+        """
+        Runs a first generation by the configured `warm_up` mode (one of `WARM_UP_MODES`): not at
+        all, in a background thread (so it doesn't delay joining the game), only once per model
+        in the process, or before returning.
+        """
+        warm_up = self.llm_config.get(WARM_UP_KEY, self.DEFAULT_WARM_UP)
+        if warm_up not in WARM_UP_MODES:
+            raise ValueError(f"Unknown warm-up mode {warm_up}, should be one of: {WARM_UP_MODES}")
+        if warm_up == NO_WARM_UP:
+            return
+        if warm_up == BLOCKING_WARM_UP:
+            self._warm_up()
+            return
+        if warm_up == ONCE_PER_PROCESS_WARM_UP:
+            with _warmed_up_models_lock:
+                if (type(self), self.model_name) in _warmed_up_models:
+                    return
+                _warmed_up_models.add((type(self), self.model_name))
+        threading.Thread(target=self._warm_up, name=f"WarmUp-{self.logger.name}",
+                         daemon=True).start()
+
+    def _warm_up(self):
         print("warm-up", flush=True)
-        self.generate(INITIAL_GENERATION_PROMPT, system_info=GENERAL_SYSTEM_INFO)
+        try:
+            with self.call_purpose(WARM_UP_CALL):
+                self.generate(INITIAL_GENERATION_PROMPT, system_info=GENERAL_SYSTEM_INFO)
+        except Exception as e:  # a failed warm-up doesn't stop the player, its calls may still work
+            self.logger.log("Warm-up failed", repr(e))
+            return
         print("warm-up done", flush=True)
 
     def _get_prompt_template(self):
@@ -79,7 +344,7 @@ class LLM(abc.ABC):
             return INSTRUCTION_INPUT_RESPONSE_PATTERN
         if "llama-3" in name:
             return LLAMA3_PATTERN
-        if self.llm_config.get(USE_OPENAI_KEY):
+        if self.llm_config.get(USE_OPENAI_KEY) or self.llm_config.get(USE_MOCK_KEY):
             return DEFAULT_PIPELINE_PROMPT_PATTERN
         return DEFAULT_PROMPT_PATTERN
 
@@ -87,6 +352,218 @@ class LLM(abc.ABC):
         # Abstract: set self.generation_parameters from llm_config
         self.generation_parameters = {}
 
+    def _setup_response_cache(self):
+        self.response_cache_mode = self.llm_config.get(RESPONSE_CACHE_MODE_KEY, DEFAULT_RESPONSE_CACHE_MODE)
+        if self.response_cache_mode not in RESPONSE_CACHE_MODES:
+            raise ValueError(f"Unknown response cache mode {self.response_cache_mode}, "
+                             f"should be one of: {RESPONSE_CACHE_MODES}")
+        self.response_cache = None
+        self.cache_hits, self.cache_misses = 0, 0
+        if self.response_cache_mode != NO_RESPONSE_CACHE:
+            max_mb = self.llm_config.get(RESPONSE_CACHE_MAX_MB_KEY, DEFAULT_RESPONSE_CACHE_MAX_MB)
+            self.response_cache = get_response_cache(
+                self.llm_config.get(RESPONSE_CACHE_DIR_KEY, DEFAULT_RESPONSE_CACHE_DIR),
+                int(max_mb * 1024 * 1024))
+
+    def _get_circuit_breaker(self, provider):
+        return get_circuit_breaker(
+            provider,
+            self.llm_config.get(CIRCUIT_BREAKER_FAILURES_KEY, DEFAULT_CIRCUIT_BREAKER_FAILURES),
+            self.llm_config.get(CIRCUIT_BREAKER_COOLDOWN_KEY, DEFAULT_CIRCUIT_BREAKER_COOLDOWN))
+
+    def _get_rate_limiter(self, provider):
+        return get_rate_limiter(
+            self.llm_config.get(RATE_LIMIT_DB_KEY, DEFAULT_RATE_LIMIT_DB), provider, self.model_name,
+            self.llm_config.get(RATE_LIMIT_REQUESTS_PER_MINUTE_KEY, DEFAULT_RATE_LIMIT_REQUESTS_PER_MINUTE),
+            self.llm_config.get(RATE_LIMIT_TOKENS_PER_MINUTE_KEY, DEFAULT_RATE_LIMIT_TOKENS_PER_MINUTE))
+
+    def estimate_num_tokens(self, messages):
+        max_output_tokens = self.generation_parameters.get(
+            MAX_TOKENS_KEY, self.generation_parameters.get(MAX_NEW_TOKENS_KEY))
+        return estimate_num_tokens(messages, max_output_tokens)
+
+    def set_retry_deadline(self, deadline):
+        """
+        Sets the (wall clock) time after which failed calls are no longer retried, or None.
+        """
+        self.retry_deadline = deadline
+
+    def set_cancellation_token(self, cancellation_token):
+        """
+        Sets the token that cancels the following generations (and streams them), or None.
+        """
+        self._cancellation_token = cancellation_token
+
+    @property
+    def cancellation_token(self):
+        override = getattr(self._thread_local, "cancellation_token", None)
+        return override if override is not None else self._cancellation_token
+
+    @property
+    def json_output(self):
+        return getattr(self._thread_local, "json_output", False)
+
+    def generate_json(self, input_text: str, system_info: str = "") -> str:
+        """
+        Same as `generate`, asking the provider for a JSON object (JSON mode) where supported.
+        The prompt should describe the wanted object, the output still has to be parsed.
+        """
+        self._thread_local.json_output = True
+        try:
+            return self.generate(input_text, system_info)
+        finally:
+            self._thread_local.json_output = False
+
+    def _get_response_format_parameters(self):
+        # the chat completions JSON mode, shared by OpenAI and Together
+        return {"response_format": {"type": "json_object"}} if self.json_output else {}
+
+    def _get_stream_parameters(self):
+        # OpenAI's chat completions streams only report their usage when asked to
+        if self.cancellation_token is None:
+            return {"stream": False}
+        return {"stream": True, "stream_options": {"include_usage": True}}
+
+    @contextmanager
+    def call_purpose(self, purpose):
+        """
+        Tags the current thread's calls with what they are for (e.g. `VOTE_CALL`), in telemetry.
+        """
+        self._thread_local.purpose = purpose
+        try:
+            yield
+        finally:
+            self._thread_local.purpose = None
+
+    @contextmanager
+    def using_cancellation_token(self, cancellation_token):
+        """
+        Makes the current thread's generations use this token instead, e.g. for a speculative
+        generation running alongside another call of the same LLM.
+        """
+        self._thread_local.cancellation_token = cancellation_token
+        try:
+            yield
+        finally:
+            self._thread_local.cancellation_token = None
+
+    @contextmanager
+    def _in_flight_slot(self):
+        """
+        Holds one of the provider's in-flight requests, waiting for it without missing a
+        cancellation of the call meanwhile (which raises `GenerationCancelled`).
+        """
+        if self.in_flight is None:
+            yield
+            return
+        while not self.in_flight.acquire(timeout=IN_FLIGHT_WAIT_POLL_SECONDS):
+            if self.cancellation_token:
+                self.cancellation_token.raise_if_cancelled()
+        try:
+            yield
+        finally:
+            self.in_flight.release()
+
+    def _log_api_error(self, error):
+        print(error, flush=True)
+        self.logger.log("API error", error)
+
+    def _call_with_retries(self, request, retryable_errors, messages):
+        num_tokens = self.estimate_num_tokens(messages)
+
+        def rate_limited_request():  # every attempt counts against the quota
+            if self.cancellation_token:
+                self.cancellation_token.raise_if_cancelled()
+            if self.rate_limiter and not self.rate_limiter.acquire(num_tokens, self.retry_deadline):
+                raise RetryBudgetExceeded("the rate limit doesn't allow a call before the deadline")
+            telemetry.record_attempt()
+            return request()
+        return self.retry_policy.call(rate_limited_request, retryable_errors, self.circuit_breaker,
+                                      self.retry_deadline, self._log_api_error,
+                                      self.cancellation_token)
+
+    def _log_usage(self, usage):
+        """
+        Records the call's tokens, and logs how much of the prompt the provider served from its
+        prompt cache.
+        """
+        usage_tokens = get_usage_tokens(usage)
+        if usage_tokens is None:
+            return
+        telemetry.record_usage(usage_tokens)
+        num_prompt_tokens, num_cached_tokens = usage_tokens["prompt_tokens"], usage_tokens["cached_tokens"]
+        with self._usage_lock:
+            self.num_prompt_tokens += num_prompt_tokens
+            self.num_cached_prompt_tokens += num_cached_tokens
+            total_prompt_tokens, total_cached_tokens = \
+                self.num_prompt_tokens, self.num_cached_prompt_tokens
+        self.logger.log("Prompt tokens usage",
+                        f"{num_cached_tokens} of {num_prompt_tokens} prompt tokens were cached "
+                        f"(so far: {total_cached_tokens} of {total_prompt_tokens})")
+
+    def give_up_response(self):
+        """The response of a call that gave up retrying, players treat it as passing or an invalid vote"""
+        return ""
+
+    def _get_cached_response(self, messages):
+        """
+        Returns the request's cache key (None without a cache) and its cached response, if any.
+        """
+        if not self.response_cache:
+            return None, None
+        parameters = dict(self.generation_parameters, json_output=True) if self.json_output \
+            else self.generation_parameters
+        key = self.response_cache.make_key(self.model_name, messages, parameters)
+        response = self.response_cache.get(key)
+        if response is None:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+            telemetry.record_response_cache_hit()
+        self.logger.log(f"Response cache {'miss' if response is None else 'hit'}",
+                        f"key: {key}, hits: {self.cache_hits}, misses: {self.cache_misses}")
+        return key, response
+
+    def _cache_response(self, key, response):
+        if key and response and self.response_cache_mode == RECORD_RESPONSE_CACHE:
+            self.response_cache.put(key, response)
+
+    def _recording_call(self):
+        return telemetry.recording_call(self.metrics_writer, player=self.logger.name,
+                                        model=self.model_name,
+                                        purpose=getattr(self._thread_local, "purpose", None))
+
+    def _cached_call_llm(self, messages):
+        with self._recording_call() as record:
+            key, response = self._get_cached_response(messages)
+            if response is None:
+                try:
+                    response = self._call_llm(messages)
+                except (RetryBudgetExceeded, RequestFailed, GenerationCancelled) as e:
+                    response = self._give_up(e, record)
+                else:
+                    self._cache_response(key, response)
+        self._log_call(messages, response, record)
+        return response
+
+    def _give_up(self, error, record):
+        if isinstance(error, GenerationCancelled):
+            self.logger.log("LLM call cancelled", error)
+            record["outcome"] = telemetry.CALL_CANCELLED
+        elif isinstance(error, RequestFailed):
+            self._log_api_error(error.__cause__)  # not logged by the retry policy
+            record["outcome"] = telemetry.CALL_FAILED
+        else:
+            self.logger.log("Gave up on LLM call", error)
+            record["outcome"] = telemetry.CALL_GAVE_UP
+        return self.give_up_response()
+
+    def _log_call(self, messages, response, record):
+        output = response["output"] if isinstance(response, dict) else response  # see OpenAI_o4_mini
+        self.logger.log(LLM_CALL_LOG, prompt_hash=get_prompt_hash(messages), output=output,
+                        latency_seconds=record["latency_seconds"], purpose=record["purpose"],
+                        outcome=record["outcome"])
+
     @abc.abstractmethod
     def _initialize(self):
         """Instantiate client, model, tokenizer or pipeline"""
@@ -100,8 +577,8 @@ class LLM(abc.ABC):
     def generate(self, input_text: str, system_info: str = "") -> str:
         # if hasattr(self, 'pipeline') and self.pipeline:
         messages = self.pipeline_preprocessing(input_text, system_info)
-        self.logger.log("Pipeline messages", messages)
-        raw = self._call_llm(messages)
+        self.logger.log("Pipeline messages", messages, prompt_hash=get_prompt_hash(messages))
+        raw = self._cached_call_llm(messages)
         return raw
         # return self.postprocess_pipeline(raw)
         # else:
@@ -149,7 +626,10 @@ class LLM(abc.ABC):
         
 class TogetherLLM(LLM):
     def _initialize(self):
-        self.client = Together(api_key=get_api_key(TOGETHER_API_KEY_KEYWORD, TOGETHER_API_KEY_KEYWORD))
+        self.client = get_client(TOGETHER_PROVIDER)
+        self.in_flight = get_in_flight_semaphore(TOGETHER_PROVIDER, self.max_in_flight)
+        self.circuit_breaker = self._get_circuit_breaker(TOGETHER_PROVIDER)
+        self.rate_limiter = self._get_rate_limiter(TOGETHER_PROVIDER)
         self.pipeline = True
 
     def _setup_generation_parameters(self):
@@ -161,23 +641,27 @@ class TogetherLLM(LLM):
         self.generation_parameters[MAX_NEW_TOKENS_KEY] = self.llm_config.get(MAX_NEW_TOKENS_KEY, 25)
 
     def _call_llm(self, messages):
-        output = None
-        while not output:
-            try:
+        def request():
+            with self._in_flight_slot():
                 resp = self.client.chat.completions.create(
                     model=self.model_name,
                     messages=messages,
+                    stream=self.cancellation_token is not None,
+                    **self._get_response_format_parameters(),
                     **self.generation_parameters,
                 )
-                output = resp.choices[0].message.content
-            except TogetherException as e:
-                time.sleep(SLEEPING_TIME_FOR_API_GENERATION_ERROR)
-        return output
+                if self.cancellation_token:
+                    return get_chat_stream_output(resp, self.cancellation_token, self._log_usage)
+            self._log_usage(getattr(resp, "usage", None))
+            return get_chat_output(resp)
+        return self._call_with_retries(request, get_api_errors(TOGETHER_PROVIDER), messages)
 
 class OpenAILLM(LLM):
     def _initialize(self):
-        openai.api_key = get_api_key(OPENAI_API_KEY_KEYWORD, OPENAI_API_KEY_KEYWORD)
-        self.client = openai
+        self.client = get_client(OPENAI_PROVIDER)
+        self.in_flight = get_in_flight_semaphore(OPENAI_PROVIDER, self.max_in_flight)
+        self.circuit_breaker = self._get_circuit_breaker(OPENAI_PROVIDER)
+        self.rate_limiter = self._get_rate_limiter(OPENAI_PROVIDER)
         self.pipeline = True
 
     def _setup_generation_parameters(self):
@@ -189,19 +673,20 @@ class OpenAILLM(LLM):
         self.generation_parameters[MAX_TOKENS_KEY] = self.llm_config.get(MAX_TOKENS_KEY, 25)
    
     def _call_llm(self, messages):
-        output = None
-        while not output:
-            try:
+        def request():
+            with self._in_flight_slot():
                 resp = self.client.chat.completions.create(
                     model=self.model_name,
                     messages=messages,
+                    **self._get_stream_parameters(),
+                    **self._get_response_format_parameters(),
                     # **self.generation_parameters, # commented out for now because different for generation parameters for different models
                 )
-                output = resp.choices[0].message.content
-            except openai.OpenAIError as e:
-                print(e, flush=True)
-                time.sleep(SLEEPING_TIME_FOR_API_GENERATION_ERROR)
-        return output
+                if self.cancellation_token:
+                    return get_chat_stream_output(resp, self.cancellation_token, self._log_usage)
+            self._log_usage(getattr(resp, "usage", None))
+            return get_chat_output(resp)
+        return self._call_with_retries(request, get_api_errors(OPENAI_PROVIDER), messages)
 
     """    
     This is not tested!
@@ -224,48 +709,58 @@ class OpenAILLM(LLM):
     """
 
 
+class LocalLLM(LLM):
+    """
+    An open-weight HuggingFace model, generated by the host's local inference server (see
+    llm/local_server.py), which batches the requests of all the local-model players together.
+    The server applies the model's own chat template, so the prompt is sent as chat messages.
     """
-    This is not tested!
-    
-    class LocalLLM():
-        @cache
-        def _load_model(self):
-            if os.path.isdir(self.model_name):
-                cfg = AutoConfig.from_pretrained(self.model_name)
-                return AutoModelForSeq2SeqLM.from_pretrained(self.model_name, config=cfg)
-            return AutoModelForCausalLM.from_pretrained(self.model_name)
-
-        @cache
-        def _load_tokenizer(self):
-            return AutoTokenizer.from_pretrained(self.model_name)
 
-        def _initialize(self):
-            self.model = self._load_model()
-            self.model.to(self.device)
-            self.model.eval()
-            self.tokenizer = self._load_tokenizer()
-            self.pipeline = None
+    DEFAULT_WARM_UP = ONCE_PER_PROCESS_WARM_UP  # the server's first batch is slower
 
-        def _setup_generation_parameters(self):
-            self.generation_parameters = {
-                k: self.llm_config[k]
-                for k in GENERATION_PARAMETERS
-                if k in self.llm_config
-            }
-            self.generation_parameters[MAX_NEW_TOKENS_KEY] = self.llm_config.get(MAX_NEW_TOKENS_KEY, 25)
-            if NUM_BEAMS_KEY in self.generation_parameters and self.generation_parameters[NUM_BEAMS_KEY] < 2:
-                del self.generation_parameters[NUM_BEAMS_KEY]
+    def _get_prompt_template(self):
+        return DEFAULT_PIPELINE_PROMPT_PATTERN
+
+    def _initialize(self):
+        self.server_address = self.llm_config.get(LOCAL_SERVER_ADDRESS_KEY,
+                                                  DEFAULT_LOCAL_SERVER_ADDRESS)
+        ensure_local_server(self.model_name, self.server_address,
+                            self.llm_config.get(LOCAL_SERVER_AUTOSTART_KEY,
+                                                DEFAULT_LOCAL_SERVER_AUTOSTART))
+        self.circuit_breaker = self._get_circuit_breaker(LOCAL_PROVIDER)
+        self.rate_limiter = None
+        self.pipeline = True
+
+    def _setup_generation_parameters(self):
+        self.generation_parameters = {
+            k: self.llm_config[k]
+            for k in HUGGINGFACE_GENERATION_PARAMETERS
+            if k in self.llm_config
+        }
+        self.generation_parameters[MAX_NEW_TOKENS_KEY] = self.llm_config.get(MAX_NEW_TOKENS_KEY, 25)
+        if NUM_BEAMS_KEY in self.generation_parameters and self.generation_parameters[NUM_BEAMS_KEY] < 2:
+            del self.generation_parameters[NUM_BEAMS_KEY]
+
+    def _call_llm(self, messages):
+        def request():
+            response = send_request(self.server_address,
+                                    {"model_name": self.model_name, "messages": messages,
+                                     "generation_parameters": self.generation_parameters},
+                                    self.cancellation_token)
+            self._log_usage(SimpleNamespace(prompt_tokens=response["prompt_tokens"],
+                                            completion_tokens=response["completion_tokens"]))
+            if not response["output"]:
+                raise EmptyResponseError()
+            return response["output"]
+        return self._call_with_retries(request, (LocalServerError,), messages)
 
-        def _call_llm(self, prompt):
-            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
-            outputs = self.model.generate(**inputs, **self.generation_parameters)
-            return self.tokenizer.decode(outputs[0], skip_special_tokens=False) 
-    """
 
 class OpenAI_4o(LLM):
     def _initialize(self):
-        openai.api_key = get_api_key(OPENAI_API_KEY_KEYWORD, OPENAI_API_KEY_KEYWORD)
-        self.client = openai
+        self.client = get_client(OPENAI_PROVIDER)
+        self.in_flight = get_in_flight_semaphore(OPENAI_PROVIDER, self.max_in_flight)
+        self.circuit_breaker = self._get_circuit_breaker(OPENAI_PROVIDER)
+        self.rate_limiter = self._get_rate_limiter(OPENAI_PROVIDER)
         self.pipeline = True
 
     def _setup_generation_parameters(self):
@@ -277,19 +772,20 @@ class OpenAI_4o(LLM):
         # self.generation_parameters[MAX_TOKENS_KEY] = self.llm_config.get(MAX_TOKENS_KEY, 25)
    
     def _call_llm(self, messages):
-        output = None
-        while not output:
-            try:
+        def request():
+            with self._in_flight_slot():
                 resp = self.client.chat.completions.create(
                     model=self.model_name,
                     messages=messages,
+                    **self._get_stream_parameters(),
+                    **self._get_response_format_parameters(),
                     # **self.generation_parameters, # commented out for now because different for generation parameters for different models
                 )
-                output = resp.choices[0].message.content
-            except openai.OpenAIError as e:
-                print(e, flush=True)
-                time.sleep(SLEEPING_TIME_FOR_API_GENERATION_ERROR)
-        return output
+                if self.cancellation_token:
+                    return get_chat_stream_output(resp, self.cancellation_token, self._log_usage)
+            self._log_usage(getattr(resp, "usage", None))
+            return get_chat_output(resp)
+        return self._call_with_retries(request, get_api_errors(OPENAI_PROVIDER), messages)
 
 
 class OpenAI_o4_mini(LLM):
@@ -302,8 +798,10 @@ class OpenAI_o4_mini(LLM):
     " will be part of your output response. \n" \
 
     def _initialize(self):
-        openai.api_key = get_api_key(OPENAI_API_KEY_KEYWORD, OPENAI_API_KEY_KEYWORD)
-        self.client = openai
+        self.client = get_client(OPENAI_PROVIDER)
+        self.in_flight = get_in_flight_semaphore(OPENAI_PROVIDER, self.max_in_flight)
+        self.circuit_breaker = self._get_circuit_breaker(OPENAI_PROVIDER)
+        self.rate_limiter = self._get_rate_limiter(OPENAI_PROVIDER)
         self.pipeline = True
 
     def _setup_generation_parameters(self):
@@ -338,6 +836,7 @@ class OpenAI_o4_mini(LLM):
             reasoning_output = ""
             for r in reasoning:
                 reasoning_output += r.text.strip() + "\n"
+            reasoning = reasoning_output
             
         if content == []:
             content = "No output provided."
@@ -375,38 +874,162 @@ class OpenAI_o4_mini(LLM):
             "output": output,
             } """
 
-    def _call_llm(self, messages) -> str:
-        output = None
-        while not output:
-            try:
+    def _call_llm(self, messages) -> dict:
+        def request():
+            with self._in_flight_slot():
                 resp = self.client.responses.create(
                     model=self.model_name,
                     input=messages["input"],
                     reasoning=messages["reasoning"],
+                    stream=self.cancellation_token is not None,
+                    **self._get_response_format_parameters(),
                     # **self.generation_parameters, # commented out for now because different for generation parameters for different models
                 )
-                output = resp.model_dump_json(indent=2)
-                self.logger.log("Raw LLM Output", output)
-            except openai.OpenAIError as e:
-                print(e, flush=True)
-                time.sleep(SLEEPING_TIME_FOR_API_GENERATION_ERROR)
-        return resp
-    
+                if self.cancellation_token:
+                    resp = self._read_response_stream(resp)
+            self.logger.log("Raw LLM Output", resp.model_dump_json(indent=2))
+            self._log_usage(getattr(resp, "usage", None))
+            return resp
+        resp = self._call_with_retries(request, get_api_errors(OPENAI_PROVIDER), messages)
+        return self.postprocess_pipeline(resp)  # the processed output can be cached
+
+    def _get_response_format_parameters(self):
+        return {"text": {"format": {"type": "json_object"}}} if self.json_output else {}
+
+    def _read_response_stream(self, stream):
+        completed = []
+
+        def on_event(event):
+            if event.type == "response.output_text.delta":
+                telemetry.record_first_token()
+            elif event.type == "response.completed":
+                completed.append(event.response)
+        read_stream(stream, self.cancellation_token, on_event)
+        if not completed:
+            raise EmptyResponseError()
+        return completed[0]
+
+    def give_up_response(self):
+        return {"reasoning": "No reasoning provided.", "output": ""}
+
+    def _log_output(self, processed_output):
+        self.logger.log("Reasoning behind Output", processed_output["reasoning"])
+        self.logger.log("Output to User", processed_output["output"])
+        return processed_output["output"]
+
     def generate(self, input_text: str, system_info: str = "") -> str:
         messages = self.pipeline_preprocessing(input_text, system_info)
         """ self.logger.log("Pipeline messages - System", messages[0]["content"])
         self.logger.log("Pipeline messages - User", messages[1]["content"]) """
-        self.logger.log("Complete Prompt to LLM", messages["input"])
-        raw = self._call_llm(messages)
-        processed_output = self.postprocess_pipeline(raw)
-        self.logger.log("Reasoning behind Output", processed_output["reasoning"])
-        self.logger.log("Output to User", processed_output["output"])
-        
-        return processed_output["output"]
+        self.logger.log("Complete Prompt to LLM", messages["input"],
+                        prompt_hash=get_prompt_hash(messages))
+        return self._log_output(self._cached_call_llm(messages))
+
+class MockLLM(LLM):
+    """
+    An offline stand-in for the API models, for load tests and benchmarks of the game's
+    orchestration. It never reads the game, it only recognizes which kind of request it got:
+    - scheduling (the prompt offers both the pass and the use turn tokens): answers with the use
+      token with probability `mock_speak_probability`, otherwise with the pass token;
+    - voting (the prompt ends with the candidates list): answers by `mock_vote_policy`;
+    - anything else is a message request: answers with a few random words.
+    Every answer takes a latency sampled from `mock_latency_distribution`. The random generator
+    is seeded by `mock_seed` and the player's name, so a game can be reproduced exactly
+    (as long as the players' calls happen in the same order).
+    """
+
+    def __init__(self, logger, **llm_config):
+        llm_config.setdefault("model_name", MOCK_MODEL_NAME)
+        super().__init__(logger, **llm_config)
+
+    def _initialize(self):
+        seed = self.llm_config.get(MOCK_SEED_KEY, DEFAULT_MOCK_SEED)
+        self.rng = random.Random(f"{seed}-{self.logger.name}")
+        self.latency_distribution = self.llm_config.get(MOCK_LATENCY_DISTRIBUTION_KEY,
+                                                        DEFAULT_MOCK_LATENCY_DISTRIBUTION)
+        if self.latency_distribution not in MOCK_LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown mock latency distribution {self.latency_distribution}, "
+                             f"should be one of: {MOCK_LATENCY_DISTRIBUTIONS}")
+        self.latency_mean = self.llm_config.get(MOCK_LATENCY_MEAN_KEY, DEFAULT_MOCK_LATENCY_MEAN)
+        self.latency_std = self.llm_config.get(MOCK_LATENCY_STD_KEY, DEFAULT_MOCK_LATENCY_STD)
+        self.speak_probability = self.llm_config.get(MOCK_SPEAK_PROBABILITY_KEY,
+                                                     DEFAULT_MOCK_SPEAK_PROBABILITY)
+        self.vote_policy = self.llm_config.get(MOCK_VOTE_POLICY_KEY, DEFAULT_MOCK_VOTE_POLICY)
+        if self.vote_policy not in MOCK_VOTE_POLICIES:
+            raise ValueError(f"Unknown mock vote policy {self.vote_policy}, "
+                             f"should be one of: {MOCK_VOTE_POLICIES}")
+        self.max_message_words = self.llm_config.get(MOCK_MAX_MESSAGE_WORDS_KEY,
+                                                     DEFAULT_MOCK_MAX_MESSAGE_WORDS)
+        self.pass_turn_token = self.llm_config.get(PASS_TURN_TOKEN_KEY, DEFAULT_PASS_TURN_TOKEN)
+        self.use_turn_token = self.llm_config.get(USE_TURN_TOKEN_KEY, DEFAULT_USE_TURN_TOKEN)
+        self.pipeline = True
+
+    def sample_latency(self):
+        mean, std = self.latency_mean, self.latency_std
+        if mean <= 0:
+            return 0
+        if self.latency_distribution == CONSTANT_LATENCY or std <= 0:
+            return mean
+        if self.latency_distribution == UNIFORM_LATENCY:
+            half_width = std * math.sqrt(3)  # a uniform distribution with the same std
+            return max(0, self.rng.uniform(mean - half_width, mean + half_width))
+        if self.latency_distribution == NORMAL_LATENCY:
+            return max(0, self.rng.gauss(mean, std))
+        if self.latency_distribution == LOGNORMAL_LATENCY:
+            # parameters of the underlying normal distribution, to get the wanted mean and std
+            sigma = math.sqrt(math.log(1 + (std / mean) ** 2))
+            return self.rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        return self.rng.expovariate(1 / mean)  # EXPONENTIAL_LATENCY, its std is its mean
+
+    def answer_scheduling(self):
+        if self.rng.random() < self.speak_probability:
+            return self.use_turn_token
+        return self.pass_turn_token
+
+    def answer_vote(self, prompt):
+        candidates_line = prompt.split(VOTE_PROMPT_MARKER)[-1].split("\n")[0]
+        candidates = [name.strip() for name in candidates_line.split(",") if name.strip()]
+        if self.vote_policy == INVALID_VOTE_POLICY or not candidates:
+            return "I'd rather not vote"
+        if self.vote_policy == FIRST_CANDIDATE_VOTE_POLICY:
+            return candidates[0]
+        return self.rng.choice(candidates)  # RANDOM_VOTE_POLICY
+
+    def answer_message(self):
+        num_words = self.rng.randint(1, max(1, self.max_message_words))
+        return " ".join(self.rng.choice(MOCK_MESSAGE_WORDS) for _ in range(num_words))
+
+    def answer_structured(self):
+        speak = self.answer_scheduling() == self.use_turn_token
+        return json.dumps({STRUCTURED_SPEAK_KEY: speak,
+                           STRUCTURED_MESSAGE_KEY: self.answer_message() if speak else ""})
+
+    def answer(self, messages):
+        if self.json_output:
+            return self.answer_structured()
+        prompt = "\n".join(message["content"] for message in messages)
+        if VOTE_PROMPT_MARKER in messages[-1]["content"]:
+            return self.answer_vote(messages[-1]["content"])
+        if self.pass_turn_token in prompt and self.use_turn_token in prompt:
+            return self.answer_scheduling()
+        return self.answer_message()
+
+    def _call_llm(self, messages):
+        output = self.answer(messages)
+        if self.cancellation_token:
+            self.cancellation_token.raise_if_cancelled()
+            self.cancellation_token.event.wait(self.sample_latency())  # like closing a stream
+            self.cancellation_token.raise_if_cancelled()
+        else:
+            time.sleep(self.sample_latency())
+        return output
+
 
 # Factory
 
 def create_llm(logger, **llm_config):
+    if llm_config.get(USE_MOCK_KEY):
+        return MockLLM(logger, **llm_config)
     if llm_config.get(USE_TOGETHER_KEY):
         return TogetherLLM(logger, **llm_config)
     if llm_config.get(USE_OPENAI_KEY):
@@ -419,6 +1042,4 @@ def create_llm(logger, **llm_config):
     if llm_config.get(USE_PIPELINE_KEY):
         # return LLM.PipelineLLM(logger, **llm_config)
         raise NotImplementedError("Pipeline LLM is not implemented yet.")
-    # return LLM.LocalLLM(logger, **llm_config)
-    print(llm_config.get(USE_OPENAI_KEY))
-    raise NotImplementedError("Local LLM is not implemented yet, or the model is not found/implemented.")
+    return LocalLLM(logger, **llm_config)
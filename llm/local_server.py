@@ -0,0 +1,309 @@
+"""
+A local inference server for open-weight (HuggingFace) models, shared by all the players on the
+host, so N local-model players load one copy of the model instead of N, and their concurrent
+requests are generated together instead of one after the other.
+
+The server listens on a local TCP address, and loads the model once (through
+`llm_wrapper.cached_model` and `cached_tokenizer`). Every connection sends a single JSON line
+request, `{"model_name", "messages", "generation_parameters"}`, and gets back a single JSON line,
+`{"output", "prompt_tokens", "completion_tokens"}` or `{"error"}`. Requests that arrive within
+`batch_wait_seconds` of each other (up to `max_batch_size`) and share their generation parameters
+are padded (on the left) into one batch and generated by a single `model.generate` call, on CPU.
+
+The server listens before loading the model: meanwhile, pings are answered with `"loading"` and
+generation requests wait for the model. The first `LocalLLM` of the host (see llm.py) starts the
+server if it isn't running yet, in the background, and every `LocalLLM` waits until it has loaded
+the model; if several start it at once, only the first one binds the address and the rest exit.
+It can also be started by hand:
+
+usage: python -m llm.local_server -m microsoft/Phi-3-mini-4k-instruct -a 127.0.0.1:8765
+"""
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import subprocess
+import socketserver
+from concurrent.futures import Future
+from termcolor import colored
+from llm_players.llm_constants import DEFAULT_LOCAL_SERVER_ADDRESS, \
+    DEFAULT_LOCAL_SERVER_MAX_BATCH_SIZE, DEFAULT_LOCAL_SERVER_BATCH_WAIT_SECONDS, \
+    LOCAL_SERVER_START_TIMEOUT, LOCAL_SERVER_LOG_FILE, LOCAL_SERVER_CONNECT_TIMEOUT
+
+SERVER_COLOR = "cyan"
+PING_REQUEST = "ping"  # answered with the served model's name and whether it's loading
+
+
+class LocalServerError(Exception):
+    """Raised when the local server can't be reached, or failed to generate."""
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def send_request(address, request, cancellation_token=None, timeout=None):
+    """
+    Sends a request to the server and returns its response. Closing the connection on
+    cancellation makes a blocked read return right away (the server drops the output).
+    """
+    try:
+        sock = socket.create_connection(parse_address(address), timeout=timeout)
+    except OSError as e:
+        raise LocalServerError(f"The local server at {address} is unreachable: {e}") from e
+    if cancellation_token:
+        cancellation_token.add_callback(sock.close)
+    try:
+        with sock, sock.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            line = stream.readline()
+    except OSError as e:
+        if cancellation_token and cancellation_token.is_cancelled():
+            line = b""
+        else:
+            raise LocalServerError(f"The local server at {address} failed: {e}") from e
+    finally:
+        if cancellation_token:
+            cancellation_token.remove_callback(sock.close)
+    if cancellation_token:
+        cancellation_token.raise_if_cancelled()
+    if not line:
+        raise LocalServerError(f"The local server at {address} closed the connection")
+    response = json.loads(line)
+    if "error" in response:
+        raise LocalServerError(response["error"])
+    return response
+
+
+def get_server_status(address):
+    """
+    Returns the server's answer to a ping, `{"model_name", "loading"}`, or None if it's down.
+    """
+    try:
+        return send_request(address, {PING_REQUEST: True}, timeout=LOCAL_SERVER_CONNECT_TIMEOUT)
+    except (LocalServerError, OSError, ValueError):
+        return None
+
+
+_start_lock = threading.Lock()
+
+
+def is_starting(status, model_name, autostart):
+    """Whether the server of the model should be up soon: it's being started, or it's loading."""
+    if status is None:
+        return autostart
+    return status.get("loading") and status.get("model_name") == model_name
+
+
+def ensure_local_server(model_name, address, autostart=True):
+    """
+    Makes sure a server of the model is running at the address and has loaded it, starting it in
+    the background if it isn't running and `autostart` is set, and waiting while it loads.
+
+    Raises:
+        LocalServerError: If it doesn't run (or doesn't load in time), or serves another model.
+    """
+    with _start_lock:  # the players of an in-process game start it once
+        status = get_server_status(address)
+        if status is None and autostart:
+            log_file = open(LOCAL_SERVER_LOG_FILE, "a", encoding="utf-8")
+            subprocess.Popen([sys.executable, "-m", "llm.local_server", "-m", model_name,
+                              "-a", address], stdout=log_file, stderr=subprocess.STDOUT,
+                             start_new_session=True)  # outlives the game that started it
+            log_file.close()
+            print(colored(f"Starting the local server of {model_name} at {address} "
+                          f"(its output is in {LOCAL_SERVER_LOG_FILE})...", SERVER_COLOR),
+                  flush=True)
+        deadline = time.monotonic() + LOCAL_SERVER_START_TIMEOUT
+        while is_starting(status, model_name, autostart) and time.monotonic() < deadline:
+            time.sleep(1)
+            status = get_server_status(address)
+    if status is None:
+        raise LocalServerError(f"No local server of {model_name} is running at {address}")
+    if status.get("model_name") != model_name:
+        raise LocalServerError(f"The local server at {address} serves "
+                               f"{status.get('model_name')}, not {model_name}")
+    if status.get("loading"):
+        raise LocalServerError(f"The local server at {address} didn't load {model_name} in time")
+
+
+class PendingRequest:
+
+    def __init__(self, messages, generation_parameters):
+        self.messages = messages
+        self.generation_parameters = generation_parameters
+        self.parameters_key = json.dumps(generation_parameters, sort_keys=True)
+        self.result = Future()
+
+
+class BatchingGenerator:
+    """
+    Generates the pending requests in batches, in a single background thread that owns the model.
+    Attributes:
+        model_name (str): The served model.
+        max_batch_size (int): Maximal number of requests generated together.
+        batch_wait_seconds (float): How long to wait for more requests after the first one.
+        queue (queue.Queue): The `PendingRequest`s.
+    Methods:
+        submit(messages, generation_parameters): Returns a `Future` of the request's response.
+    """
+
+    def __init__(self, model_name, max_batch_size, batch_wait_seconds):
+        # only the server process needs torch and transformers
+        import torch
+        from llm_players.llm_wrapper import cached_model, cached_tokenizer
+        self.torch = torch
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.tokenizer = cached_tokenizer(model_name)
+        self.tokenizer.padding_side = "left"  # so all the prompts end where generation starts
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = cached_model(model_name)
+        self.model.to("cpu")
+        self.model.eval()
+        self.is_encoder_decoder = getattr(self.model.config, "is_encoder_decoder", False)
+        self.queue = queue.Queue()
+        threading.Thread(target=self.run, name="BatchingGenerator", daemon=True).start()
+
+    def submit(self, messages, generation_parameters):
+        request = PendingRequest(messages, generation_parameters)
+        self.queue.put(request)
+        return request.result
+
+    def run(self):
+        while True:
+            batch = self.get_batch()
+            groups = {}  # requests with different generation parameters can't share a batch
+            for request in batch:
+                groups.setdefault(request.parameters_key, []).append(request)
+            for requests in groups.values():
+                try:
+                    self.generate_batch(requests)
+                except Exception as e:
+                    for request in requests:
+                        request.result.set_exception(e)
+
+    def get_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait_seconds
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=timeout) if timeout > 0
+                             else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def to_prompt(self, messages):
+        if getattr(self.tokenizer, "chat_template", None):
+            return self.tokenizer.apply_chat_template(messages, tokenize=False,
+                                                      add_generation_prompt=True)
+        return "\n\n".join(message["content"] for message in messages) + "\n\n"
+
+    def generate_batch(self, requests):
+        prompts = [self.to_prompt(request.messages) for request in requests]
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        with self.torch.inference_mode():
+            outputs = self.model.generate(**inputs, **requests[0].generation_parameters,
+                                          pad_token_id=self.tokenizer.pad_token_id)
+        if not self.is_encoder_decoder:  # decoder-only outputs start with the prompt
+            outputs = outputs[:, inputs["input_ids"].shape[1]:]
+        texts = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        prompts_tokens = inputs["attention_mask"].sum(dim=1).tolist()
+        for request, text, prompt_tokens, output in zip(requests, texts, prompts_tokens, outputs):
+            completion_tokens = int((output != self.tokenizer.pad_token_id).sum())
+            request.result.set_result({"output": text.strip(), "prompt_tokens": prompt_tokens,
+                                       "completion_tokens": completion_tokens})
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        model_name = self.server.model_name
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get(PING_REQUEST):
+                response = {"model_name": model_name, "loading": not self.server.loaded.is_set()}
+            elif request.get("model_name") != model_name:
+                response = {"error": f"This server serves {model_name}, "
+                                     f"not {request.get('model_name')}"}
+            else:
+                self.server.loaded.wait()
+                response = self.server.generator.submit(
+                    request["messages"], request.get("generation_parameters", {})).result()
+        except Exception as e:
+            response = {"error": repr(e)}
+        try:
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+        except OSError:
+            pass  # the client cancelled the request and closed the connection
+
+
+class LocalServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, model_name):
+        self.model_name = model_name
+        self.generator = None  # set once the model is loaded, then `loaded` is set
+        self.loaded = threading.Event()
+        super().__init__(parse_address(address), RequestHandler)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local inference server of a HuggingFace model, "
+                                                 "shared by the LLM players of the host")
+    parser.add_argument("-m", "--model_name", required=True,
+                        help="HuggingFace model name or local path")
+    parser.add_argument("-a", "--address", default=DEFAULT_LOCAL_SERVER_ADDRESS,
+                        help="host:port to listen on")
+    parser.add_argument("-b", "--max_batch_size", type=int,
+                        default=DEFAULT_LOCAL_SERVER_MAX_BATCH_SIZE,
+                        help="maximal number of requests generated together")
+    parser.add_argument("-w", "--batch_wait_seconds", type=float,
+                        default=DEFAULT_LOCAL_SERVER_BATCH_WAIT_SECONDS,
+                        help="how long to wait for more requests to batch with the first one")
+    parser.add_argument("-t", "--num_threads", type=int, default=None,
+                        help="CPU threads for generation (default: torch's default)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if get_server_status(args.address) is not None:
+        print(colored(f"A local server is already running at {args.address}", SERVER_COLOR),
+              flush=True)
+        return
+    try:  # before loading the model, so only one of servers started together loads it
+        server = LocalServer(args.address, args.model_name)
+    except OSError as e:  # another server started meanwhile
+        print(colored(f"Can't listen on {args.address}: {e}", SERVER_COLOR), flush=True)
+        return
+    with server:
+        # serving while loading, so pings see it's loading instead of timing out
+        server_thread = threading.Thread(target=server.serve_forever, name="LocalServer")
+        server_thread.start()
+        print(colored(f"Loading {args.model_name}...", SERVER_COLOR), flush=True)
+        try:
+            server.generator = BatchingGenerator(args.model_name, args.max_batch_size,
+                                                 args.batch_wait_seconds)
+        except BaseException:
+            server.shutdown()  # the waiting requests fail when their connections close
+            raise
+        if args.num_threads:
+            server.generator.torch.set_num_threads(args.num_threads)
+        server.loaded.set()
+        print(colored(f"Serving {args.model_name} at {args.address}", SERVER_COLOR), flush=True)
+        server_thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Client-side rate limiting of API calls to a provider's requests-per-minute and tokens-per-minute
+quotas, shared by all the processes on the machine (e.g. all the players of concurrent games).
+
+Each (provider, model) pair has two token buckets, one of requests and one of tokens, that refill
+continuously at the per-minute rate up to one minute's worth. The buckets' levels are kept in a
+SQLite database, and every acquisition is a single write-locked transaction on it, so processes
+never over-spend the quota together. The number of tokens of a call is only estimated from the
+prompt's size and the maximal output length, since it isn't known before the call.
+"""
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+CHARS_PER_TOKEN = 4  # a common rough estimate for English text
+ESTIMATED_OUTPUT_TOKENS = 256  # when the call doesn't set a maximal output length
+SECONDS_PER_MINUTE = 60
+DB_LOCK_TIMEOUT_SECONDS = 30
+
+
+def estimate_num_tokens(messages, max_output_tokens=None):
+    if isinstance(messages, dict):  # o4-mini's responses API input
+        prompt_chars = len(messages.get("input", ""))
+    else:
+        prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN + (max_output_tokens or ESTIMATED_OUTPUT_TOKENS)
+
+
+class RateLimiter:
+    """
+    The requests and tokens buckets of a provider's model.
+    Attributes:
+        db_path (Path): The SQLite database shared by all processes.
+        key (str): The buckets' key, "<provider>:<model>".
+        requests_per_minute (float): Requests quota, 0 for no limit.
+        tokens_per_minute (float): Tokens quota, 0 for no limit.
+    Methods:
+        try_acquire(num_tokens):
+            Takes a request and the tokens if they are available, returns 0 if it did,
+            or else the seconds until they should be.
+        acquire(num_tokens, deadline=None):
+            Blocks until acquired, returns False without acquiring if it can't be before deadline.
+    """
+
+    def __init__(self, db_path, key, requests_per_minute, tokens_per_minute):
+        self.db_path = Path(db_path)
+        self.key = key
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        connection = self.connect()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS buckets "
+                               "(name TEXT PRIMARY KEY, level REAL, updated REAL)")
+        finally:
+            connection.close()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=DB_LOCK_TIMEOUT_SECONDS, isolation_level=None)
+
+    def get_buckets(self, num_tokens):
+        """Returns (bucket name, per-minute rate, amount to take) of the limited buckets."""
+        buckets = []
+        if self.requests_per_minute > 0:
+            buckets.append((f"{self.key}:requests", self.requests_per_minute, 1))
+        if self.tokens_per_minute > 0:
+            # a call larger than a minute's worth would never fit, so it waits for a full bucket
+            buckets.append((f"{self.key}:tokens", self.tokens_per_minute,
+                            min(num_tokens, self.tokens_per_minute)))
+        return buckets
+
+    def try_acquire(self, num_tokens):
+        buckets = self.get_buckets(num_tokens)
+        if not buckets:
+            return 0
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")  # locks the database for writing
+            now = time.time()
+            levels, wait = {}, 0
+            for name, rate, amount in buckets:
+                row = connection.execute("SELECT level, updated FROM buckets WHERE name = ?",
+                                         (name,)).fetchone()
+                level, updated = row if row else (rate, now)  # a new bucket starts full
+                level = min(rate, level + (now - updated) * rate / SECONDS_PER_MINUTE)
+                levels[name] = level
+                if level < amount:
+                    wait = max(wait, (amount - level) * SECONDS_PER_MINUTE / rate)
+            if wait == 0:
+                for name, rate, amount in buckets:
+                    connection.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                                       (name, levels[name] - amount, now))
+            connection.execute("COMMIT")
+            return wait
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def acquire(self, num_tokens, deadline=None):
+        while wait := self.try_acquire(num_tokens):
+            if deadline is not None and time.time() + wait >= deadline:
+                return False
+            time.sleep(wait)
+        return True
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(db_path, provider, model_name, requests_per_minute, tokens_per_minute):
+    """
+    Returns the process' rate limiter of the provider's model, or None if it isn't limited.
+    """
+    if requests_per_minute <= 0 and tokens_per_minute <= 0:
+        return None
+    key = f"{provider}:{model_name}"
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(db_path, key, requests_per_minute, tokens_per_minute)
+        return _rate_limiters[key]
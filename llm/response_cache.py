@@ -0,0 +1,129 @@
+"""
+An on-disk cache of LLM responses, so re-runs of an experiment (e.g. of the same seeded game after
+a bug fix) replay the requests that didn't change instead of paying for them again.
+
+Entries are content-addressed: the key is a hash of the model name, the messages and the
+generation parameters, so any change in the prompt is a miss. The wall-clock timestamps in the
+messages (the `[hh:mm:ss]` of every history line, the current time, the chat room's opening time)
+are left out of the key, since they differ on every run of the same game. Each entry is a small JSON file
+under `<cache_dir>/<first 2 chars of key>/<key>.json`, written atomically, so several processes
+(like the players of a game, or concurrent games) can share a cache dir. When the cache grows over
+its size limit, the least recently used entries are evicted (a hit touches its entry's mtime).
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+EVICTION_TARGET_RATIO = 0.9  # evicts down to this part of the limit, so it doesn't evict on every put
+TIMESTAMP_PATTERN = re.compile(r"\[\d\d:\d\d:\d\d\]")  # of TIME_FORMAT_FOR_TIMESTAMP, in brackets
+TIMESTAMP_PLACEHOLDER = "[time]"
+
+
+def normalize_timestamps(value):
+    """Returns a copy of the messages (strings, lists or dicts) with their timestamps replaced."""
+    if isinstance(value, str):
+        return TIMESTAMP_PATTERN.sub(TIMESTAMP_PLACEHOLDER, value)
+    if isinstance(value, list):
+        return [normalize_timestamps(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize_timestamps(item) for key, item in value.items()}
+    return value
+
+
+class ResponseCache:
+    """
+    A size-bounded on-disk LRU cache of LLM responses.
+    Attributes:
+        cache_dir (Path): Where the entries are stored.
+        max_bytes (int): The cache's size limit.
+    Methods:
+        make_key(model_name, messages, generation_parameters):
+            Returns the key of a request, regardless of the timestamps in its messages.
+        get(key):
+            Returns the cached response, or None if there is none.
+        put(key, response):
+            Stores a (JSON serializable) response, evicting old entries if needed.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = None  # computed on the first put, then tracked (approximately)
+
+    @staticmethod
+    def make_key(model_name, messages, generation_parameters):
+        request = {"model": model_name, "messages": normalize_timestamps(messages),
+                   "parameters": generation_parameters}
+        serialized = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # marks it as recently used
+        except (OSError, ValueError):  # missing, or partially written by an older version
+            return None
+        return entry.get("response")
+
+    def put(self, key, response):
+        path = self.entry_path(key)
+        path.parent.mkdir(exist_ok=True)
+        content = json.dumps({"key": key, "response": response}, ensure_ascii=False)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.write_text(content, encoding="utf-8")
+        os.replace(temp_path, path)  # readers never see a partial entry
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self.get_size()
+            else:
+                self.total_bytes += len(content.encode("utf-8"))
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def list_entries(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:  # evicted by another process meanwhile
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def get_size(self):
+        return sum(size for _, size, _ in self.list_entries())
+
+    def evict(self):
+        entries = sorted(self.list_entries())  # least recently used first
+        total_bytes = sum(size for _, size, _ in entries)
+        target_bytes = self.max_bytes * EVICTION_TARGET_RATIO
+        for _, size, path in entries:
+            if total_bytes <= target_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+        self.total_bytes = total_bytes
+
+
+_response_caches = {}
+_response_caches_lock = threading.Lock()
+
+
+def get_response_cache(cache_dir, max_bytes):
+    """
+    Returns the process' shared cache of the dir, so all its players track the same size.
+    """
+    cache_dir = Path(cache_dir).resolve()
+    with _response_caches_lock:
+        if cache_dir not in _response_caches:
+            _response_caches[cache_dir] = ResponseCache(cache_dir, max_bytes)
+        return _response_caches[cache_dir]
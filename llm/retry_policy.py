@@ -0,0 +1,202 @@
+"""
+Retries of failed API calls, shared by all the API backends in `llm.py`.
+
+Every retry waits an exponentially growing delay with full jitter (a uniform random delay up to
+the exponential bound), so players that failed together don't all retry together, or the delay
+the provider asked for in a `Retry-After` header. A call gives up after `retry_max_attempts`
+attempts, or once the next attempt can't start before its deadline (the end of the current
+phase, after which its result would be thrown away anyway). A call with a cancellation token
+stops waiting as soon as it is cancelled.
+
+All the LLMs of a provider in a process share a circuit breaker: after
+`circuit_breaker_failures` consecutive failures it opens for `circuit_breaker_cooldown_seconds`,
+during which no player sends requests to that provider, instead of all of them adding to the
+provider's throttling.
+"""
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# client errors that will fail the same way on every retry
+NON_RETRYABLE_STATUS_CODES = {400, 401, 403, 404, 422}
+
+
+class RetryBudgetExceeded(Exception):
+    """Raised when a call ran out of attempts or time, with the last error as its cause."""
+
+
+class RequestFailed(Exception):
+    """Raised when a call failed with an error that retrying won't fix, with it as its cause."""
+
+
+class EmptyResponseError(Exception):
+    """Raised by a request that got an empty output, so it is retried like a failure."""
+
+
+def get_status_code(error):
+    status_code = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    if status_code is None and getattr(error, "response", None) is not None:
+        status_code = getattr(error.response, "status_code", None)
+    return status_code
+
+
+def is_retryable(error):
+    return get_status_code(error) not in NON_RETRYABLE_STATUS_CODES
+
+
+def get_retry_after(error):
+    """
+    Returns the seconds to wait that the error's response asked for, or None if it didn't.
+    """
+    headers = getattr(error, "headers", None)
+    if headers is None and getattr(error, "response", None) is not None:
+        headers = getattr(error.response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:  # an HTTP date
+            return max(0.0, (parsedate_to_datetime(retry_after)
+                             - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a provider for a while after too many consecutive failures.
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        cooldown_seconds (float): How long it stays open.
+    Methods:
+        seconds_until_closed():
+            Returns how long callers should wait before sending a request (0 if they can now).
+        record_success() / record_failure():
+            Updates the breaker with a request's outcome.
+    """
+
+    def __init__(self, failure_threshold, cooldown_seconds):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def seconds_until_closed(self):
+        with self.lock:
+            return max(0.0, self.open_until - time.monotonic())
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                # once the cooldown ends, the next failure re-opens it right away (half-open)
+                self.open_until = time.monotonic() + self.cooldown_seconds
+                return True
+            return False
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider, failure_threshold, cooldown_seconds):
+    """
+    Returns the process' circuit breaker of the provider. The first LLM of a provider sets it up.
+    """
+    with _circuit_breakers_lock:
+        if provider not in _circuit_breakers:
+            _circuit_breakers[provider] = CircuitBreaker(failure_threshold, cooldown_seconds)
+        return _circuit_breakers[provider]
+
+
+class RetryPolicy:
+    """
+    Runs a request until it succeeds, within an attempts and time budget.
+    Attributes:
+        base_delay (float): Bound of the first retry's delay, doubled on every retry.
+        max_delay (float): Maximal bound of a retry's delay.
+        max_attempts (int): Attempts before giving up.
+    Methods:
+        call(request, retryable_errors, circuit_breaker, deadline=None, on_error=None,
+             cancellation_token=None):
+            Returns the request's result, raises `RetryBudgetExceeded` when giving up,
+            `RequestFailed` on an error that retrying won't fix, and `GenerationCancelled` if the
+            token is cancelled while waiting.
+    """
+
+    def __init__(self, base_delay, max_delay, max_attempts):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+    def get_delay(self, attempt, error):
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def get_wait(self, attempt, error, circuit_breaker, deadline):
+        """
+        Returns how long to wait before the next attempt, raises if there shouldn't be one.
+        """
+        if not isinstance(error, EmptyResponseError) and not is_retryable(error):
+            raise RequestFailed(f"non-retryable error (status code {get_status_code(error)})") \
+                from error
+        if attempt + 1 >= self.max_attempts:
+            raise RetryBudgetExceeded(f"gave up after {self.max_attempts} attempts") from error
+        wait = max(self.get_delay(attempt, error), circuit_breaker.seconds_until_closed())
+        if deadline is not None and time.time() + wait >= deadline:
+            raise RetryBudgetExceeded("the next attempt can't be made before the deadline") \
+                from error
+        return wait
+
+    def record(self, error, circuit_breaker, on_error):
+        if isinstance(error, EmptyResponseError) or not is_retryable(error):
+            return  # the provider is up, the request itself didn't work
+        if on_error:
+            on_error(error)
+        if circuit_breaker.record_failure() and on_error:
+            on_error(f"circuit breaker opened for {circuit_breaker.cooldown_seconds} seconds")
+
+    def first_wait(self, circuit_breaker, deadline):
+        wait = circuit_breaker.seconds_until_closed()
+        if wait and deadline is not None and time.time() + wait >= deadline:
+            raise RetryBudgetExceeded("the circuit breaker is open until after the deadline")
+        return wait
+
+    @staticmethod
+    def wait(seconds, cancellation_token):
+        """
+        Sleeps, but raises `GenerationCancelled` as soon as the token is cancelled meanwhile.
+        """
+        if cancellation_token is None:
+            time.sleep(seconds)
+            return
+        cancellation_token.event.wait(seconds)
+        cancellation_token.raise_if_cancelled()
+
+    def call(self, request, retryable_errors, circuit_breaker, deadline=None, on_error=None,
+             cancellation_token=None):
+        self.wait(self.first_wait(circuit_breaker, deadline), cancellation_token)
+        for attempt in range(self.max_attempts):
+            try:
+                result = request()
+            except (EmptyResponseError, *retryable_errors) as e:
+                self.record(e, circuit_breaker, on_error)
+                self.wait(self.get_wait(attempt, e, circuit_breaker, deadline), cancellation_token)
+                continue
+            circuit_breaker.record_success()
+            return result
@@ -0,0 +1,133 @@
+"""
+Per-call telemetry of the LLMs, so the time and money a game took can be broken down later (see
+`llm_metrics_report.py`).
+
+Every call of an LLM, as made by `LLM._cached_call_llm` (including response cache hits, and calls
+that gave up or were cancelled), appends a single JSON line to the game's `llm_metrics.jsonl`:
+- "time": when the call started, "player", "model" and "purpose" (schedule, generate, vote, ...);
+- "latency_seconds": the call's wall time, including rate limiting and retries;
+- "time_to_first_token_seconds": until the first output token arrived, for streamed responses;
+- "attempts": requests sent to the API (0 for a response cache hit);
+- "prompt_tokens", "cached_tokens", "completion_tokens", "reasoning_tokens": as the API reported
+  them for the successful attempt;
+- "estimated_cost_usd": by the model's prices in llm_constants.py, None for unknown models;
+- "response_cache_hit" and "outcome" (one of `CALL_OUTCOMES`).
+
+The record of the current call is kept in a context variable, so the backends add to it from
+deep inside a call (e.g. while reading a stream) without passing it around, in whichever thread
+makes the call.
+"""
+import json
+import time
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from llm_players.llm_constants import MODEL_PRICES_PER_MILLION_TOKENS, DEFAULT_LOG_FSYNC
+from llm_players.logger import get_log_writer
+
+CALL_SUCCEEDED = "ok"
+CALL_GAVE_UP = "gave_up"
+CALL_CANCELLED = "cancelled"
+CALL_FAILED = "error"
+CALL_OUTCOMES = [CALL_SUCCEEDED, CALL_GAVE_UP, CALL_CANCELLED, CALL_FAILED]
+TOKEN_FIELDS = ["prompt_tokens", "cached_tokens", "completion_tokens", "reasoning_tokens"]
+
+_current_record = contextvars.ContextVar("llm_call_record", default=None)
+
+
+def estimate_cost(model_name, prompt_tokens, cached_tokens, completion_tokens):
+    prices = MODEL_PRICES_PER_MILLION_TOKENS.get(model_name)
+    if prices is None or prompt_tokens is None:
+        return None
+    input_price, cached_input_price, output_price = prices
+    cached_tokens = cached_tokens or 0
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_input_price
+            + (completion_tokens or 0) * output_price) / 1_000_000
+
+
+class MetricsWriter:
+    """
+    Appends call records to a metrics file, shared by all the LLMs of a game in a process. The
+    records are written by the players' log writer thread (see llm_players/logger.py), in batches
+    and without blocking the calls, and are complete once `flush_logs` returns.
+    Attributes:
+        log_file (Path): The metrics file.
+    Methods:
+        write(record):
+            Queues the record, to be appended as a JSON line.
+    """
+
+    def __init__(self, path):
+        self.log_file = Path(path)
+        self.fsync = DEFAULT_LOG_FSYNC
+        self.writer = get_log_writer()
+
+    def write(self, record):
+        self.writer.write(self, record)
+
+    def format_record(self, record):
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+_metrics_writers = {}
+_metrics_writers_lock = threading.Lock()
+
+
+def get_metrics_writer(path):
+    path = Path(path).resolve()
+    with _metrics_writers_lock:
+        if path not in _metrics_writers:
+            _metrics_writers[path] = MetricsWriter(path)
+        return _metrics_writers[path]
+
+
+@contextmanager
+def recording_call(metrics_writer, **fields):
+    """
+    Makes the record of a call current while it runs, and writes it when the call ends.
+    Yields the record, so the caller can set its outcome.
+    """
+    record = dict(time=time.time(), **fields, latency_seconds=None,
+                  time_to_first_token_seconds=None, attempts=0,
+                  **{field: None for field in TOKEN_FIELDS},
+                  estimated_cost_usd=None, response_cache_hit=False, outcome=CALL_SUCCEEDED)
+    start = time.perf_counter()
+    context_token = _current_record.set((record, start))
+    try:
+        yield record
+    except BaseException:
+        record["outcome"] = CALL_FAILED
+        raise
+    finally:
+        _current_record.reset(context_token)
+        record["latency_seconds"] = time.perf_counter() - start
+        record["estimated_cost_usd"] = estimate_cost(
+            record.get("model"), record["prompt_tokens"], record["cached_tokens"],
+            record["completion_tokens"])
+        metrics_writer.write(record)
+
+
+def record_attempt():
+    current = _current_record.get()
+    if current is not None:
+        current[0]["attempts"] += 1
+
+
+def record_first_token():
+    current = _current_record.get()
+    if current is not None and current[0]["time_to_first_token_seconds"] is None:
+        record, start = current
+        record["time_to_first_token_seconds"] = time.perf_counter() - start
+
+
+def record_usage(usage_tokens):
+    current = _current_record.get()
+    if current is not None:
+        current[0].update(usage_tokens)
+
+
+def record_response_cache_hit():
+    current = _current_record.get()
+    if current is not None:
+        current[0]["response_cache_hit"] = True
@@ -1,14 +1,11 @@
 import json
-import random
+import threading
 from game_constants import *  # incl. argparse, time, Path (from pathlib), colored (from termcolor)
-from game_status_checks import (
-    is_nighttime,
-    is_game_over,
-    is_voted_out,
-    is_time_to_vote,
-    all_players_joined,
-)
+from game_status_checks import GameStatusView
+from game_events import GameEventReader
+from llm.cancellation import CancellationToken
 from llm_players.factory import llm_player_factory
+from llm_players.logger import flush_logs
 from llm_players.llm_constants import (
     GAME_DIR_KEY,
     VOTING_WAITING_TIME,
@@ -35,8 +32,52 @@ GET_LLM_PLAYER_NAME_MESSAGE = (
 ELIMINATED_MESSAGE = "This LLM player was eliminated from the game..."
 
 
-# global variable
+# global variables
 game_dir = Path()  # will be updated in get_llm_player
+game_status = None  # cached view of the game's status files, created in main()
+phase_canceller = None  # cancels generations of ended phases, created in main()
+
+
+class PhaseChangeCanceller:
+    """
+    Cancels the tokens of generations once the phase they were started in has ended, from a
+    background thread, so the player doesn't wait for (and pay for) messages that would be dropped.
+    Methods:
+        new_token(phase):
+            Returns a token that will be cancelled when the phase ends.
+    """
+
+    def __init__(self, game_dir):
+        self.game_status = GameStatusView(game_dir)  # its own, since views aren't thread-safe
+        self.phase_status_file = game_dir / PHASE_STATUS_FILE
+        self.tokens = []  # (phase, token)
+        self.lock = threading.Lock()
+        self.phase = self.game_status.get_phase()  # the last phase the thread has seen
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def new_token(self, phase):
+        token = CancellationToken()
+        with self.lock:
+            # the thread has moved past the phase, unless it hasn't seen the phase yet
+            if phase != self.phase and phase != self.phase_status_file.read_text():
+                token.cancel(f"the phase has changed to {self.phase}")
+            else:
+                self.tokens.append((phase, token))
+        return token
+
+    def run(self):
+        phase = self.phase
+        while not self.game_status.is_game_over():
+            self.game_status.wait_for_phase_change(phase)
+            phase = self.game_status.get_phase()
+            with self.lock:
+                self.phase = phase
+                ended = [token for token_phase, token in self.tokens if token_phase != phase]
+                self.tokens = [(token_phase, token) for token_phase, token in self.tokens
+                               if token_phase == phase]
+            for token in ended:
+                token.cancel(f"the phase has changed to {phase}")
+        self.game_status.close()
 
 
 def get_llm_player():
@@ -67,17 +108,27 @@ def get_llm_player():
     return llm_player
 
 
-def read_messages_from_file(message_history, file_name, num_read_lines):
-    with open(game_dir / file_name, "r", encoding="utf-8") as f:
-        lines = f.readlines()[num_read_lines:]
-    message_history.extend(lines)
-    return len(lines)
+def read_messages_from_events(message_history, events, is_mafia):
+    visible_events = [event for event in events if "line" in event
+                      # only mafia can see what happens during nighttime
+                      and (is_mafia or event["chat_room"] != PUBLIC_NIGHTTIME_CHAT_FILE)]
+    message_history.add_events(visible_events)
+    return len(visible_events)
+
+
+def update_retry_deadline(player, events):
+    # failed LLM calls are retried only as long as their result can still be used
+    for event in events:
+        if event["type"] == PHASE_START_EVENT:
+            player.llm.set_retry_deadline(event["time"] + minutes_to_seconds(event["minutes"]))
+        elif event["type"] == VOTING_START_EVENT:
+            player.llm.set_retry_deadline(None)  # the manager waits for all the votes
 
 
 def wait_writing_time(player, message):
     if player.num_words_per_second_to_wait > 0:
         num_words = len(message.split())
-        time.sleep(
+        get_clock().sleep(
             min(num_words // player.num_words_per_second_to_wait, MAX_TIME_TO_WAIT)
         )
 
@@ -91,20 +142,15 @@ def get_vote_from_llm(player, message_history):
     candidate_vote_names = (game_dir / REMAINING_PLAYERS_FILE).read_text().splitlines()
     candidate_vote_names.remove(player.name)
     voting_message = player.get_vote(message_history, candidate_vote_names)
-    for name in candidate_vote_names:
-        if name in voting_message:  # update game manger
-            update_vote(name, player)
-            return
-    # if didn't return: no name was in voting_message
-    player.logger.log(MODEL_VOTED_INVALIDLY_LOG, voting_message)
-    print(colored(MODEL_VOTED_INVALIDLY_LOG + ": " + voting_message, OPERATOR_COLOR))
-    vote = random.choice(candidate_vote_names)
-    player.logger.log(MODEL_RANDOMLY_VOTED_LOG, vote)
-    update_vote(vote, player)
+    vote = player.interpret_vote(voting_message, candidate_vote_names)
+    if vote not in voting_message:  # no name was in voting_message, so the vote was random
+        print(colored(MODEL_VOTED_INVALIDLY_LOG + ": " + voting_message, OPERATOR_COLOR),
+              flush=True)
+    update_vote(vote, player)  # update game manger
 
 
 def update_vote(voted_name, player):
-    time.sleep(VOTING_WAITING_TIME)
+    get_clock().sleep(VOTING_WAITING_TIME)
     with open(
         game_dir / PERSONAL_VOTE_FILE_FORMAT.format(player.name), "a", encoding="utf-8"
     ) as f:
@@ -115,18 +161,23 @@ def update_vote(voted_name, player):
 
 
 def add_message_to_game(player, message_history):
-    is_nighttime_at_start = is_nighttime(game_dir)
+    is_nighttime_at_start = game_status.is_nighttime()
     if not player.is_mafia and is_nighttime_at_start:
         return  # only mafia can communicate during nighttime
-    if is_time_to_vote(game_dir):
+    if game_status.is_time_to_vote():
         return  # sometimes the messages is generated when it's already too late, so drop it
-    message = player.generate_message(message_history).strip()
-    if is_time_to_vote(game_dir):
+    # a phase change cancels the generation, instead of generating a message that will be dropped
+    player.llm.set_cancellation_token(phase_canceller.new_token(game_status.get_phase()))
+    try:
+        message = player.generate_message(message_history).strip()
+    finally:
+        player.llm.set_cancellation_token(None)
+    if game_status.is_time_to_vote():
         return  # sometimes the messages is generated when it's already too late, so drop it
     if message:
         # artificially making the model taking time to write the message
         # wait_writing_time(player, message) # Already is slower than a normal player, so no need to wait
-        if is_nighttime(game_dir) != is_nighttime_at_start:
+        if game_status.is_nighttime() != is_nighttime_at_start:
             return  # waited for too long
         with open(
             game_dir / PERSONAL_CHAT_FILE_FORMAT.format(player.name),
@@ -145,53 +196,46 @@ def end_game():
 
 
 def main():
+    global game_status, phase_canceller
     player = get_llm_player()
+    game_status = GameStatusView(game_dir, player.name)
+    phase_canceller = PhaseChangeCanceller(game_dir)
     print(colored(LLM_PLAYER_LOADED_MESSAGE, OPERATOR_COLOR), flush=True)
-    while not all_players_joined(game_dir):
-        continue
+    game_status.wait_for_all_players_joined()
     print(colored(ALL_PLAYERS_JOINED_MESSAGE, OPERATOR_COLOR))
-    message_history = []
-    num_read_lines_manager = num_read_lines_daytime = num_read_lines_nighttime = 0
-    while not is_game_over(game_dir):
-        # only current phase file will have new messages, so no need to run expensive is_nighttime()
-        num_read_lines_daytime += read_messages_from_file(
-            message_history, PUBLIC_DAYTIME_CHAT_FILE, num_read_lines_daytime
-        )
-        num_read_lines_manager += read_messages_from_file(
-            message_history, PUBLIC_MANAGER_CHAT_FILE, num_read_lines_manager
-        )
-        if player.is_mafia:  # only mafia can see what happens during nighttime
-            num_read_lines_nighttime += read_messages_from_file(
-                message_history, PUBLIC_NIGHTTIME_CHAT_FILE, num_read_lines_nighttime
-            )
-        if is_voted_out(player.name, game_dir):
+    message_history = player.create_message_history()
+    event_reader = GameEventReader(game_dir)  # all public chats, in the order they were written
+    while not game_status.is_game_over():
+        events = event_reader.read_new_events()
+        read_messages_from_events(message_history, events, player.is_mafia)
+        update_retry_deadline(player, events)
+        if game_status.is_voted_out():
             eliminate(player)
             break
-        if is_time_to_vote(game_dir):
-            isNighttime = is_nighttime(game_dir)
-            if isNighttime:
-                if player.is_mafia:
-                    player.logger.log(
-                        "Voting Status",
-                        "Nighttime voting started, waiting for the mafia to vote."
-                    )
-                    get_vote_from_llm(player, message_history)
-                    while is_time_to_vote(game_dir) and isNighttime == is_nighttime(game_dir):
-                        continue  # wait for voting time to end when all players have voted
-                else:
-                    continue # non-mafia players don't vote at night
+        phase = game_status.get_phase()
+        if not player.is_mafia and NIGHTTIME in phase:
+            # non-mafia players don't talk or vote at night
+            game_status.wait_for_phase_change(phase)
+            continue
+        if VOTING_TIME in phase:
+            if NIGHTTIME in phase:
+                player.logger.log(
+                    "Voting Status",
+                    "Nighttime voting started, waiting for the mafia to vote."
+                )
             else:
                 player.logger.log(
                     "Voting Status",
                     "Daytime voting started, waiting for the villagers to vote."
                 )
-                get_vote_from_llm(player, message_history)
-                while is_time_to_vote(game_dir) and isNighttime == is_nighttime(
-                    game_dir
-                ):  # Must make sure the phase timing didn't switch on you (race condition)
-                    continue
+            get_vote_from_llm(player, message_history)
+            # wait for voting time to end when all players have voted, comparing to the phase
+            # from before the vote, in case it has already switched (race condition)
+            game_status.wait_for_phase_change(phase)
             continue  # don't immediately generate a message after voting
         add_message_to_game(player, message_history)
+    game_status.close()
+    flush_logs()
     end_game()
 
 
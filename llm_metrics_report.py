@@ -0,0 +1,125 @@
+"""
+Aggregates the LLM calls' telemetry (see llm/telemetry.py) of a range of games, to see where their
+time and money went: calls, latency, time to first token, tokens, prompt cache share, estimated
+cost, retries and response cache hits, per call purpose, model, player or game.
+
+usage: python llm_metrics_report.py -i 0650 -e 0660 -b purpose
+"""
+import json
+import argparse
+import statistics
+from pathlib import Path
+from termcolor import colored
+from game_constants import DIRS_PREFIX, LLM_METRICS_FILE, GAME_ID_NUM_DIGITS
+from llm.telemetry import CALL_SUCCEEDED
+
+GROUP_BY_OPTIONS = ["purpose", "model", "player", "game"]
+REPORT_COLOR = "cyan"
+COLUMNS = ["calls", "latency_mean", "latency_p95", "ttft_mean", "prompt_tokens", "cached_%",
+           "completion_tokens", "reasoning_tokens", "cost_usd", "retries", "cache_hits",
+           "not_ok"]
+
+
+def read_metrics(game_ids):
+    records = []
+    for game_id in game_ids:
+        metrics_file = Path(DIRS_PREFIX) / game_id / LLM_METRICS_FILE
+        if not metrics_file.exists():
+            continue
+        with open(metrics_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(dict(json.loads(line), game=game_id))
+    return records
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def mean(values):
+    return statistics.fmean(values) if values else None
+
+
+def summarize(records):
+    latencies = [record["latency_seconds"] for record in records
+                 if record["latency_seconds"] is not None]
+    times_to_first_token = [record["time_to_first_token_seconds"] for record in records
+                            if record["time_to_first_token_seconds"] is not None]
+    prompt_tokens = sum(record["prompt_tokens"] or 0 for record in records)
+    cached_tokens = sum(record["cached_tokens"] or 0 for record in records)
+    return {
+        "calls": len(records),
+        "latency_mean": mean(latencies),
+        "latency_p95": percentile(latencies, 0.95),
+        "ttft_mean": mean(times_to_first_token),
+        "prompt_tokens": prompt_tokens,
+        "cached_%": 100 * cached_tokens / prompt_tokens if prompt_tokens else None,
+        "completion_tokens": sum(record["completion_tokens"] or 0 for record in records),
+        "reasoning_tokens": sum(record["reasoning_tokens"] or 0 for record in records),
+        "cost_usd": sum(record["estimated_cost_usd"] or 0 for record in records),
+        "retries": sum(max(0, record["attempts"] - 1) for record in records),
+        "cache_hits": sum(record["response_cache_hit"] for record in records),
+        "not_ok": sum(record["outcome"] != CALL_SUCCEEDED for record in records),
+    }
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4f}" if value < 1 else f"{value:.2f}"
+    return str(value)
+
+
+def print_table(title, rows):
+    # rows: (name, summary) pairs
+    table = [[title] + COLUMNS] + [[str(name)] + [format_value(summary[column])
+                                                  for column in COLUMNS]
+                                   for name, summary in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+    for i, row in enumerate(table):
+        line = "  ".join(cell.ljust(width) for cell, width in zip(row, widths))
+        print(colored(line, REPORT_COLOR) if i == 0 else line, flush=True)
+
+
+def report(game_ids, group_by):
+    records = read_metrics(game_ids)
+    if not records:
+        print(f"No {LLM_METRICS_FILE} was found in the games {game_ids[0]}-{game_ids[-1]}",
+              flush=True)
+        return
+    num_games = len({record["game"] for record in records})
+    print(f"LLM calls of {num_games} games ({game_ids[0]}-{game_ids[-1]}):\n", flush=True)
+    groups = {}
+    for record in records:
+        groups.setdefault(record.get(group_by), []).append(record)
+    rows = [(name, summarize(group_records)) for name, group_records
+            in sorted(groups.items(), key=lambda item: str(item[0]))]
+    print_table(group_by, rows + [("total", summarize(records))])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Report of the LLM calls' telemetry of games")
+    parser.add_argument("-i", "--initial_game_id", required=True,
+                        help="first game ID of the range (inclusive)")
+    parser.add_argument("-e", "--ending_game_id", default=None,
+                        help="last game ID of the range (inclusive, default: the initial one)")
+    parser.add_argument("-b", "--group_by", default=GROUP_BY_OPTIONS[0], choices=GROUP_BY_OPTIONS,
+                        help="what to break the calls down by")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    ending_game_id = args.ending_game_id or args.initial_game_id
+    game_ids = [str(game_id).zfill(GAME_ID_NUM_DIGITS)
+                for game_id in range(int(args.initial_game_id), int(ending_game_id) + 1)]
+    report(game_ids, args.group_by)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+A message history whose rendering in prompts is bounded by a token budget, so late-game prompts
+don't keep growing with every phase.
+
+While the whole history fits in the budget, it is rendered as it is. Once it doesn't, the last
+`context_recent_messages` messages are still rendered as they are, and so are all the game
+manager's lines (phase starts, votes, eliminations and other announcements), but the players'
+messages of earlier phases are replaced by a short summary per phase. A phase's summary is
+generated once, when it is first needed after the phase ended, and then cached for the rest of
+the game. If the summaries don't fit in the budget either, the oldest ones are dropped.
+"""
+from game_constants import MESSAGE_EVENT, PHASE_START_EVENT
+from llm.rate_limiter import CHARS_PER_TOKEN
+from llm_players.llm_constants import MessageHistory
+
+SUMMARY_LINE_FORMAT = "(A summary of the other messages of this {}: {})\n"
+
+
+def estimate_num_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ContextWindow(MessageHistory):
+    """
+    A `MessageHistory` that renders within a token budget (see the module's docstring).
+    Attributes:
+        token_budget (int): Estimated tokens the rendered history should fit in.
+        num_recent_messages (int): Number of last messages that are always rendered as they are.
+        summarize (callable): Returns a summary of a phase's messages, given the phase's name and
+            the messages, or None to drop the messages of earlier phases without summarizing them.
+    """
+
+    def __init__(self, token_budget, num_recent_messages, summarize=None):
+        super().__init__()
+        self.token_budget = token_budget
+        self.num_recent_messages = num_recent_messages
+        self.summarize = summarize
+        self.phases = [None]  # the phases' names, the lines before the first phase are in None
+        self.entries = []  # (phase index, whether it's kept as it is) of every message
+        self.tokens_ends = []  # per message, the estimated tokens of the history up to its end
+        self.summaries = {}  # phase index -> summary line
+        self._window = (None, None, "")  # (number of messages, number of summaries, rendering)
+
+    def add_events(self, events):
+        for event in events:
+            if event["type"] == PHASE_START_EVENT:
+                self.phases.append(event.get("phase", ""))
+            self.entries.append((len(self.phases) - 1, event["type"] != MESSAGE_EVENT))
+            num_tokens = self.tokens_ends[-1] if self.tokens_ends else 0
+            self.tokens_ends.append(num_tokens + estimate_num_tokens(event["line"]))
+        super().add_events(events)
+
+    def _render(self, num_messages):
+        if len(self.entries) < num_messages:  # it was extended with plain lines, without events
+            return super()._render(num_messages)
+        if num_messages == 0 or self.tokens_ends[num_messages - 1] <= self.token_budget:
+            return super()._render(num_messages)
+        window_num_messages, num_summaries, window = self._window
+        if window_num_messages == num_messages and num_summaries == len(self.summaries):
+            return window
+        window = self._render_window(num_messages)
+        self._window = (num_messages, len(self.summaries), window)
+        return window
+
+    def _render_window(self, num_messages):
+        num_older = max(0, num_messages - self.num_recent_messages)
+        current_phase = self.entries[num_messages - 1][0]
+        included = {i for i in range(num_older) if self.entries[i][1]}  # kept as they are
+        summaries = {}  # phase index -> summary line, of earlier phases
+        for i in range(num_older):
+            phase, is_kept = self.entries[i]
+            if not is_kept and phase < current_phase and self.phases[phase] \
+                    and phase not in summaries:
+                summaries[phase] = self.get_summary(phase)
+        recent = "".join(self[num_older:num_messages])
+        num_tokens = estimate_num_tokens(recent) \
+            + sum(estimate_num_tokens(self[i]) for i in included) \
+            + sum(estimate_num_tokens(summary) for summary in summaries.values() if summary)
+        for phase in sorted(summaries):  # the oldest summaries are dropped first
+            if num_tokens <= self.token_budget:
+                break
+            if summaries[phase]:
+                num_tokens -= estimate_num_tokens(summaries.pop(phase))
+        for i in range(num_older - 1, -1, -1):  # the rest of the budget goes to the current phase
+            phase, is_kept = self.entries[i]
+            if is_kept:
+                continue
+            if phase != current_phase or num_tokens + estimate_num_tokens(self[i]) > self.token_budget:
+                break
+            num_tokens += estimate_num_tokens(self[i])
+            included.add(i)
+        rendering = ""
+        for i in range(num_older):
+            if i in included:
+                rendering += self[i]
+                # the summary goes right after the phase's start announcement
+                rendering += summaries.pop(self.entries[i][0], None) or ""
+        return rendering + recent
+
+    def get_summary(self, phase):
+        if phase not in self.summaries and self.summarize is not None:
+            messages = [self[i] for i, (message_phase, is_kept) in enumerate(self.entries)
+                        if message_phase == phase and not is_kept]
+            summary = " ".join(self.summarize(self.phases[phase], messages).split())
+            if summary:  # otherwise (e.g. a cancelled or failed call) it's retried next time
+                self.summaries[phase] = SUMMARY_LINE_FORMAT.format(self.phases[phase], summary)
+        return self.summaries.get(phase)
@@ -1,7 +1,7 @@
 from game_constants import REMAINING_PLAYERS_FILE, GAME_MANAGER_NAME, MESSAGE_PARSING_PATTERN
 from game_status_checks import is_nighttime
 from llm_players.llm_constants import turn_task_into_prompt, EVERY_X_MESSAGES_TYPE, \
-    make_more_human_like
+    make_more_human_like, GENERATE_CALL
 from llm_players.llm_player import LLMPlayer
 
 
@@ -38,7 +38,8 @@ class EveryXMessagesPlayer(LLMPlayer):  # TODO implement this!
         if self.should_generate_message(message_history):
             prompt = self.create_generation_prompt(message_history)
             self.logger.log("prompt in generate_message", prompt)
-            message = self.llm.generate(prompt, self.get_system_info_message())
+            with self.llm.call_purpose(GENERATE_CALL):
+                message = self.llm.generate(prompt, self.get_system_info_message())
             message = make_more_human_like(message)
             return message
         else:
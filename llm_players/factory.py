@@ -3,6 +3,7 @@ from llm_players.schedule_then_generate_player import ScheduleThenGeneratePlayer
 from llm_players.generate_then_schedule_player import GenerateThenSchedulePlayer
 from llm_players.fine_tuned_player import FineTunedPlayer
 from llm_players.every_x_messages_player import EveryXMessagesPlayer
+from llm_players.structured_player import StructuredPlayer
 
 
 llm_players_classes = {
@@ -10,6 +11,7 @@ llm_players_classes = {
     GenerateThenSchedulePlayer.TYPE_NAME: GenerateThenSchedulePlayer,
     FineTunedPlayer.TYPE_NAME: FineTunedPlayer,
     EveryXMessagesPlayer.TYPE_NAME: EveryXMessagesPlayer,
+    StructuredPlayer.TYPE_NAME: StructuredPlayer,
 }
 
 
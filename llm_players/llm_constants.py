@@ -1,3 +1,4 @@
+import threading
 from game_constants import get_current_timestamp, RULES_OF_THE_GAME, strip_special_chars
 
 MODEL_NAMES = [
@@ -40,15 +41,34 @@ SCHEDULE_THEN_GENERATE_TYPE = "schedule_then_generate"
 GENERATE_THEN_SCHEDULE_TYPE = "generate_then_schedule"
 FINE_TUNED_TYPE = "fine_tuned"
 EVERY_X_MESSAGES_TYPE = "every_x_messages"
+STRUCTURED_TYPE = "structured"
 ASYNC_TYPES = [SCHEDULE_THEN_GENERATE_TYPE, GENERATE_THEN_SCHEDULE_TYPE,
-               FINE_TUNED_TYPE, EVERY_X_MESSAGES_TYPE]
+               FINE_TUNED_TYPE, EVERY_X_MESSAGES_TYPE, STRUCTURED_TYPE]
 DEFAULT_ASYNC_TYPE = ASYNC_TYPES[0]
+# speculative generation modes of schedule_then_generate players:
+SEQUENTIAL_GENERATION = "off"  # generates a message only after deciding to send one
+SPECULATIVE_GENERATION = "on"  # generates a message while deciding, discarded if deciding to wait
+ADAPTIVE_SPECULATIVE_GENERATION = "auto"  # speculative while the player's recent speak rate is high
+SPECULATIVE_GENERATION_MODES = [SEQUENTIAL_GENERATION, SPECULATIVE_GENERATION,
+                                ADAPTIVE_SPECULATIVE_GENERATION]
+DEFAULT_SPECULATIVE_GENERATION = SEQUENTIAL_GENERATION
+DEFAULT_SPECULATIVE_SPEAK_RATE_THRESHOLD = 0.4
+SPEAK_RATE_WINDOW = 10  # number of recent scheduling decisions the speak rate is computed over
+SPECULATION_MAX_THREADS = 64  # of the process' shared speculation threads, more than a game's players
+# warm-up modes of an LLM, a first generation when it's created:
+NO_WARM_UP = "off"  # no benefit for the APIs' models
+BACKGROUND_WARM_UP = "background"  # in a background thread, while the player joins the game
+ONCE_PER_PROCESS_WARM_UP = "once"  # in the background, only by the process' first LLM of the model
+BLOCKING_WARM_UP = "blocking"  # the player joins only after it
+WARM_UP_MODES = [NO_WARM_UP, BACKGROUND_WARM_UP, ONCE_PER_PROCESS_WARM_UP, BLOCKING_WARM_UP]
 
 # API keys and secrets
 SECRETS_DICT_FILE_PATH = ".secrets_dict.txt"
 TOGETHER_API_KEY_KEYWORD = "TOGETHER_API_KEY"
 OPENAI_API_KEY_KEYWORD = "OPENAI_API_KEY"
-SLEEPING_TIME_FOR_API_GENERATION_ERROR = 3
+SLEEPING_TIME_FOR_API_GENERATION_ERROR = 3  # used by llm_wrapper, `llm.py` uses its RetryPolicy
+OPENAI_PROVIDER = "openai"
+TOGETHER_PROVIDER = "together"
 
 # config keys:
 LLM_CONFIG_KEY = "llm_config"  # should match the key in PlayerConfig dataclass
@@ -57,11 +77,43 @@ MODEL_NAME_KEY = "model_name"
 USE_TOGETHER_KEY = "use_together"
 USE_PIPELINE_KEY = "use_pipeline"
 USE_OPENAI_KEY = "use_openai"
+USE_MOCK_KEY = "use_mock"
 PIPELINE_TASK_KEY = "pipeline_task"
 WORDS_PER_SECOND_WAITING_KEY = "num_words_per_second_to_wait"
 PASS_TURN_TOKEN_KEY = "pass_turn_token"
 USE_TURN_TOKEN_KEY = "use_turn_token"
 ASYNC_TYPE_KEY = "async_type"
+SPECULATIVE_GENERATION_KEY = "speculative_generation"
+SPECULATIVE_SPEAK_RATE_THRESHOLD_KEY = "speculative_speak_rate_threshold"
+MAX_IN_FLIGHT_REQUESTS_KEY = "max_in_flight_requests"
+RESPONSE_CACHE_MODE_KEY = "response_cache_mode"
+RESPONSE_CACHE_DIR_KEY = "response_cache_dir"
+RESPONSE_CACHE_MAX_MB_KEY = "response_cache_max_mb"
+RETRY_MAX_ATTEMPTS_KEY = "retry_max_attempts"
+RETRY_BASE_DELAY_KEY = "retry_base_delay_seconds"
+RETRY_MAX_DELAY_KEY = "retry_max_delay_seconds"
+CIRCUIT_BREAKER_FAILURES_KEY = "circuit_breaker_failures"
+CIRCUIT_BREAKER_COOLDOWN_KEY = "circuit_breaker_cooldown_seconds"
+RATE_LIMIT_REQUESTS_PER_MINUTE_KEY = "rate_limit_requests_per_minute"
+RATE_LIMIT_TOKENS_PER_MINUTE_KEY = "rate_limit_tokens_per_minute"
+RATE_LIMIT_DB_KEY = "rate_limit_db"
+CONTEXT_TOKEN_BUDGET_KEY = "context_token_budget"
+CONTEXT_RECENT_MESSAGES_KEY = "context_recent_messages"
+CONTEXT_SUMMARIES_KEY = "context_summaries"
+LOG_COMPRESSION_KEY = "log_compression"
+LOG_COMPRESSION_MIN_BYTES_KEY = "log_compression_min_bytes"
+LOG_FSYNC_KEY = "log_fsync"
+LOCAL_SERVER_ADDRESS_KEY = "local_server_address"
+LOCAL_SERVER_AUTOSTART_KEY = "local_server_autostart"
+WARM_UP_KEY = "warm_up"
+# mock LLM (offline load tests and benchmarks):
+MOCK_SEED_KEY = "mock_seed"
+MOCK_LATENCY_DISTRIBUTION_KEY = "mock_latency_distribution"
+MOCK_LATENCY_MEAN_KEY = "mock_latency_mean_seconds"
+MOCK_LATENCY_STD_KEY = "mock_latency_std_seconds"
+MOCK_SPEAK_PROBABILITY_KEY = "mock_speak_probability"
+MOCK_VOTE_POLICY_KEY = "mock_vote_policy"
+MOCK_MAX_MESSAGE_WORDS_KEY = "mock_max_message_words"
 # generation hyper parameters:
 MAX_NEW_TOKENS_KEY = "max_new_tokens"
 NUM_BEAMS_KEY = "num_beams"
@@ -78,9 +130,16 @@ OPENAI_GENERATION_PARAMETERS = [MAX_TOKENS_KEY, TEMPERATURE_KEY]
 GENERATION_PARAMETERS = TOGETHER_GENERATION_PARAMETERS
 
 INT_CONFIG_KEYS = [MAX_NEW_TOKENS_KEY, MAX_TOKENS_KEY, NUM_BEAMS_KEY, WORDS_PER_SECOND_WAITING_KEY,
-                   NO_REPEAT_NGRAM_KEY]
-FLOAT_CONFIG_KEYS = [REPETITION_PENALTY_KEY, TEMPERATURE_KEY]
-BOOL_CONFIG_KEYS = [USE_TOGETHER_KEY, USE_PIPELINE_KEY, DO_SAMPLE_KEY]
+                   NO_REPEAT_NGRAM_KEY, MOCK_SEED_KEY, MOCK_MAX_MESSAGE_WORDS_KEY,
+                   MAX_IN_FLIGHT_REQUESTS_KEY, RETRY_MAX_ATTEMPTS_KEY, CIRCUIT_BREAKER_FAILURES_KEY,
+                   CONTEXT_TOKEN_BUDGET_KEY, CONTEXT_RECENT_MESSAGES_KEY, LOG_COMPRESSION_MIN_BYTES_KEY]
+FLOAT_CONFIG_KEYS = [REPETITION_PENALTY_KEY, TEMPERATURE_KEY, MOCK_LATENCY_MEAN_KEY,
+                     MOCK_LATENCY_STD_KEY, MOCK_SPEAK_PROBABILITY_KEY, RESPONSE_CACHE_MAX_MB_KEY,
+                     RETRY_BASE_DELAY_KEY, RETRY_MAX_DELAY_KEY, CIRCUIT_BREAKER_COOLDOWN_KEY,
+                     RATE_LIMIT_REQUESTS_PER_MINUTE_KEY, RATE_LIMIT_TOKENS_PER_MINUTE_KEY,
+                     SPECULATIVE_SPEAK_RATE_THRESHOLD_KEY]
+BOOL_CONFIG_KEYS = [USE_TOGETHER_KEY, USE_PIPELINE_KEY, DO_SAMPLE_KEY, USE_MOCK_KEY,
+                    CONTEXT_SUMMARIES_KEY, LOCAL_SERVER_AUTOSTART_KEY]
 
 # default values
 DEFAULT_MAX_NEW_TOKENS = 25
@@ -90,6 +149,98 @@ DEFAULT_DO_SAMPLE = True
 DEFAULT_TEMPERATURE = 1.3 
 DEFAULT_NO_REPEAT_NGRAM = 8
 DEFAULT_NUM_WORDS_PER_SECOND_TO_WAIT = 2  # simulates number of words written normally per second (Currently 120 WPM)
+DEFAULT_MAX_IN_FLIGHT_REQUESTS = 0  # no limit, per provider and shared by all the players of a process
+IN_FLIGHT_WAIT_POLL_SECONDS = 0.1  # how often a call waiting for an in-flight slot checks its cancellation
+DEFAULT_RETRY_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 60.0
+DEFAULT_CIRCUIT_BREAKER_FAILURES = 5  # consecutive failures of any player of the process
+DEFAULT_CIRCUIT_BREAKER_COOLDOWN = 30.0
+DEFAULT_RATE_LIMIT_REQUESTS_PER_MINUTE = 0  # no limit
+DEFAULT_RATE_LIMIT_TOKENS_PER_MINUTE = 0  # no limit
+DEFAULT_RATE_LIMIT_DB = "llm_rate_limits.sqlite3"  # relative to the working dir, like the games dir
+DEFAULT_CONTEXT_TOKEN_BUDGET = 0  # no limit, prompts include the whole message history
+DEFAULT_CONTEXT_RECENT_MESSAGES = 30  # always included as they are, even over the budget
+DEFAULT_CONTEXT_SUMMARIES = True
+
+# purposes of LLM calls, recorded in their telemetry (see llm/telemetry.py)
+SCHEDULE_CALL = "schedule"
+GENERATE_CALL = "generate"
+VOTE_CALL = "vote"
+SUMMARY_CALL = "summary"
+WARM_UP_CALL = "warm-up"
+# estimated USD per 1M tokens: (input, cached input, output), for the telemetry's cost estimates
+MODEL_PRICES_PER_MILLION_TOKENS = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "o4-mini": (1.10, 0.275, 4.40),
+    "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free": (0.0, 0.0, 0.0),
+    "meta-llama/Llama-3.3-70B-Instruct-Turbo": (0.88, 0.88, 0.88),
+    "meta-llama/Llama-3.1-8B-Instruct": (0.18, 0.18, 0.18),
+    "mock": (0.0, 0.0, 0.0),
+}
+
+# response cache modes and default values
+NO_RESPONSE_CACHE = "off"
+RECORD_RESPONSE_CACHE = "record"  # serves hits, and stores the responses of misses
+REPLAY_RESPONSE_CACHE = "replay"  # read-only: serves hits, misses call the model but aren't stored
+RESPONSE_CACHE_MODES = [NO_RESPONSE_CACHE, RECORD_RESPONSE_CACHE, REPLAY_RESPONSE_CACHE]
+DEFAULT_RESPONSE_CACHE_MODE = NO_RESPONSE_CACHE
+DEFAULT_RESPONSE_CACHE_DIR = "llm_cache"
+DEFAULT_RESPONSE_CACHE_MAX_MB = 512
+
+# players' log options and default values
+NO_LOG_COMPRESSION = "off"
+GZIP_LOG_COMPRESSION = "gzip"
+ZSTD_LOG_COMPRESSION = "zstd"  # requires the zstandard package
+LOG_COMPRESSIONS = [NO_LOG_COMPRESSION, GZIP_LOG_COMPRESSION, ZSTD_LOG_COMPRESSION]
+NO_LOG_FSYNC = "off"  # the OS decides when the written logs reach the disk
+BATCH_LOG_FSYNC = "batch"  # after every batch of entries written to a file
+CLOSE_LOG_FSYNC = "close"  # when the log files are closed, at the end of a game
+LOG_FSYNC_POLICIES = [NO_LOG_FSYNC, BATCH_LOG_FSYNC, CLOSE_LOG_FSYNC]
+DEFAULT_LOG_COMPRESSION = NO_LOG_COMPRESSION
+DEFAULT_LOG_COMPRESSION_MIN_BYTES = 2048  # mostly prompts, short entries stay readable
+DEFAULT_LOG_FSYNC = NO_LOG_FSYNC
+LOG_QUEUE_SIZE = 10000  # entries, logging blocks while the writer is this far behind
+LOG_MAX_BATCH_SIZE = 1000  # entries
+LOG_BATCH_SECONDS = 0.2  # how long the writer waits for more entries before writing a batch
+
+# local inference server (llm/local_server.py) default values
+DEFAULT_LOCAL_SERVER_ADDRESS = "127.0.0.1:8765"
+DEFAULT_LOCAL_SERVER_AUTOSTART = True
+DEFAULT_LOCAL_SERVER_MAX_BATCH_SIZE = 8
+DEFAULT_LOCAL_SERVER_BATCH_WAIT_SECONDS = 0.05
+LOCAL_SERVER_START_TIMEOUT = 900  # seconds, loading a model on CPU may take a while
+LOCAL_SERVER_CONNECT_TIMEOUT = 5  # seconds, for checking whether it's up
+LOCAL_SERVER_LOG_FILE = "local_llm_server.log"  # output of an automatically started server
+LOCAL_PROVIDER = "local"  # for the circuit breaker
+
+# mock LLM options and default values
+MOCK_MODEL_NAME = "mock"
+CONSTANT_LATENCY = "constant"
+UNIFORM_LATENCY = "uniform"
+NORMAL_LATENCY = "normal"
+LOGNORMAL_LATENCY = "lognormal"
+EXPONENTIAL_LATENCY = "exponential"
+MOCK_LATENCY_DISTRIBUTIONS = [CONSTANT_LATENCY, UNIFORM_LATENCY, NORMAL_LATENCY, LOGNORMAL_LATENCY,
+                              EXPONENTIAL_LATENCY]
+RANDOM_VOTE_POLICY = "random"
+FIRST_CANDIDATE_VOTE_POLICY = "first"
+INVALID_VOTE_POLICY = "invalid"  # exercises the random fallback of `LLMPlayer.interpret_vote`
+MOCK_VOTE_POLICIES = [RANDOM_VOTE_POLICY, FIRST_CANDIDATE_VOTE_POLICY, INVALID_VOTE_POLICY]
+DEFAULT_MOCK_SEED = 0
+DEFAULT_MOCK_LATENCY_DISTRIBUTION = LOGNORMAL_LATENCY
+DEFAULT_MOCK_LATENCY_MEAN = 1.0
+DEFAULT_MOCK_LATENCY_STD = 0.5
+DEFAULT_MOCK_SPEAK_PROBABILITY = 0.5
+DEFAULT_MOCK_VOTE_POLICY = RANDOM_VOTE_POLICY
+DEFAULT_MOCK_MAX_MESSAGE_WORDS = 12
+MOCK_MESSAGE_WORDS = ["i", "think", "we", "should", "vote", "for", "someone", "quiet", "who",
+                      "is", "the", "mafia", "here", "not", "me", "trust", "them", "that", "was",
+                      "sus", "maybe", "why", "did", "you", "say", "nothing", "yet", "agree"]
+# keys of the structured player's JSON response
+STRUCTURED_SPEAK_KEY = "speak"
+STRUCTURED_MESSAGE_KEY = "message"
+VOTE_PROMPT_MARKER = "Reply with only one name from the list, and nothing but that name: "
 
 VOTING_WAITING_TIME = 5  # seconds
 MAX_TIME_TO_WAIT = 10
@@ -151,12 +302,35 @@ OPENAI_4o_CONFIG = {
     ASYNC_TYPE_KEY: DEFAULT_ASYNC_TYPE
 }
 
+MOCK_LLM_CONFIG = {
+    MODEL_NAME_KEY: MOCK_MODEL_NAME,
+    USE_TOGETHER_KEY: False,
+    USE_PIPELINE_KEY: False,
+    USE_OPENAI_KEY: False,
+    USE_MOCK_KEY: True,
+    WORDS_PER_SECOND_WAITING_KEY: DEFAULT_NUM_WORDS_PER_SECOND_TO_WAIT,
+    PASS_TURN_TOKEN_KEY: DEFAULT_PASS_TURN_TOKEN,
+    USE_TURN_TOKEN_KEY: DEFAULT_USE_TURN_TOKEN,
+    ASYNC_TYPE_KEY: DEFAULT_ASYNC_TYPE,
+    MOCK_SEED_KEY: DEFAULT_MOCK_SEED,
+    MOCK_LATENCY_DISTRIBUTION_KEY: DEFAULT_MOCK_LATENCY_DISTRIBUTION,
+    MOCK_LATENCY_MEAN_KEY: DEFAULT_MOCK_LATENCY_MEAN,
+    MOCK_LATENCY_STD_KEY: DEFAULT_MOCK_LATENCY_STD,
+    MOCK_SPEAK_PROBABILITY_KEY: DEFAULT_MOCK_SPEAK_PROBABILITY,
+    MOCK_VOTE_POLICY_KEY: DEFAULT_MOCK_VOTE_POLICY,
+    MOCK_MAX_MESSAGE_WORDS_KEY: DEFAULT_MOCK_MAX_MESSAGE_WORDS,
+}
+
 LLM_CONFIG_KEYS_OPTIONS = {
     MODEL_NAME_KEY: MODEL_NAMES,
     PIPELINE_TASK_KEY: [TEXT_GENERATION_TASK],
     PASS_TURN_TOKEN_KEY: PASS_TURN_TOKEN_OPTIONS,
     USE_TURN_TOKEN_KEY: USE_TURN_TOKEN_OPTIONS,
-    ASYNC_TYPE_KEY: ASYNC_TYPES
+    ASYNC_TYPE_KEY: ASYNC_TYPES,
+    MOCK_LATENCY_DISTRIBUTION_KEY: MOCK_LATENCY_DISTRIBUTIONS,
+    MOCK_VOTE_POLICY_KEY: MOCK_VOTE_POLICIES,
+    RESPONSE_CACHE_MODE_KEY: RESPONSE_CACHE_MODES,
+    SPECULATIVE_GENERATION_KEY: SPECULATIVE_GENERATION_MODES,
 }
 
 HUGGINGFACE_SCHEDULING_GENERATION_PARAMETERS = {
@@ -183,13 +357,77 @@ QUIETER_PROMPT = "Don't overflow the discussion with your messages! " \
                  "based on whether you talked too much. "
 
 
+class MessageHistory(list):
+    """
+    The messages a player has read so far (each ends with "\n"), which also keeps them rendered as
+    a single string. Messages are only appended, so rendering only joins the messages appended
+    since the previous rendering to it, instead of re-joining the whole history on every prompt.
+    Methods:
+        add_events(events):
+            Appends the lines of the game events (see game_events.py) the player has read.
+        render(num_messages=None):
+            Returns the first `num_messages` messages (by default, all of them) joined together.
+        snapshot():
+            Returns a copy of the messages so far, which is rendered by this history.
+    """
+
+    def __init__(self, messages=()):
+        super().__init__(messages)
+        self._rendered = ""
+        self._rendered_ends = []  # per rendered message, where it ends in the rendering
+        self._lock = threading.Lock()  # speculative generation renders from another thread
+
+    def add_events(self, events):
+        self.extend(event["line"] for event in events)
+
+    def render(self, num_messages=None):
+        with self._lock:
+            return self._render(len(self) if num_messages is None else num_messages)
+
+    def _render(self, num_messages):
+        if len(self._rendered_ends) > len(self):  # messages were removed, so it starts over
+            self._rendered, self._rendered_ends = "", []
+        new_messages = self[len(self._rendered_ends):num_messages]
+        if new_messages:
+            end = len(self._rendered)
+            for message in new_messages:
+                end += len(message)
+                self._rendered_ends.append(end)
+            self._rendered += "".join(new_messages)
+        if num_messages >= len(self._rendered_ends):
+            return self._rendered
+        return self._rendered[:self._rendered_ends[num_messages - 1]] if num_messages else ""
+
+    def snapshot(self):
+        return MessageHistorySnapshot(self)
+
+
+class MessageHistorySnapshot(list):
+    """
+    A copy of a `MessageHistory`, for a player that reads it while the game appends messages to
+    the history, which renders it through the history's rendering.
+    """
+
+    def __init__(self, history):
+        super().__init__(history)
+        self.history = history
+
+    def render(self):
+        return self.history.render(len(self))
+
+
 def turn_task_into_prompt(task, message_history):
-    prompt = f"The current time is [{get_current_timestamp()}].\n"
+    # the history comes first and the parts that change on every call (the time and the task) come
+    # after it, so consecutive prompts share a growing prefix that the provider can cache
     if not message_history:
-        prompt += "No player has sent a message yet.\n"
+        prompt = "No player has sent a message yet.\n"
     else:
-        prompt += "Here is the message history so far, including [timestamps]:\n"
-        prompt += "".join(message_history)  # each one already ends with "\n"
+        prompt = "Here is the message history so far, including [timestamps]:\n"
+        if isinstance(message_history, (MessageHistory, MessageHistorySnapshot)):
+            prompt += message_history.render()
+        else:
+            prompt += "".join(message_history)  # each one already ends with "\n"
+    prompt += f"The current time is [{get_current_timestamp()}].\n"
     prompt += task.strip() + "\n"
     # not necessarily needed with all models, seemed relevant to Llama3.1:
     prompt += "Don't add the time, the timestamp or the [timestamp] in your answer!\n"
@@ -1,11 +1,23 @@
+import os
 import json
 import re
+import random
+import threading
 from abc import ABC, abstractmethod
 from game_constants import GAME_CONFIG_FILE, PLAYERS_KEY_IN_CONFIG, get_role_string, GAME_START_TIME_FILE, PERSONAL_CHAT_FILE_FORMAT, \
-    MESSAGE_PARSING_PATTERN, SCHEDULING_DECISION_LOG, MODEL_CHOSE_TO_USE_TURN_LOG, MODEL_CHOSE_TO_PASS_TURN_LOG
+    MESSAGE_PARSING_PATTERN, SCHEDULING_DECISION_LOG, MODEL_CHOSE_TO_USE_TURN_LOG, MODEL_CHOSE_TO_PASS_TURN_LOG, \
+    MODEL_VOTED_INVALIDLY_LOG, MODEL_RANDOMLY_VOTED_LOG, PLAYER_NAMES_FILE, REMAINING_PLAYERS_FILE, \
+    VOTE_DECISION_LOG, USE_TURN_DECISION, PASS_TURN_DECISION
 from game_status_checks import is_nighttime
+from tail_reader import TailReader
 from llm_players.llm_constants import turn_task_into_prompt, GENERAL_SYSTEM_INFO, \
-    PASS_TURN_TOKEN_KEY, USE_TURN_TOKEN_KEY, WORDS_PER_SECOND_WAITING_KEY, PASS_TURN_TOKEN_OPTIONS
+    PASS_TURN_TOKEN_KEY, USE_TURN_TOKEN_KEY, WORDS_PER_SECOND_WAITING_KEY, PASS_TURN_TOKEN_OPTIONS, \
+    VOTE_PROMPT_MARKER, MessageHistory, CONTEXT_TOKEN_BUDGET_KEY, CONTEXT_RECENT_MESSAGES_KEY, \
+    CONTEXT_SUMMARIES_KEY, DEFAULT_CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_RECENT_MESSAGES, \
+    DEFAULT_CONTEXT_SUMMARIES, VOTE_CALL, SUMMARY_CALL, LOG_COMPRESSION_KEY, LOG_FSYNC_KEY, \
+    LOG_COMPRESSION_MIN_BYTES_KEY, DEFAULT_LOG_COMPRESSION, DEFAULT_LOG_FSYNC, \
+    DEFAULT_LOG_COMPRESSION_MIN_BYTES
+from llm_players.context_window import ContextWindow
 # from llm_players.llm_wrapper import LLMWrapper
 from llm_players.logger import Logger
 
@@ -21,76 +33,144 @@ class LLMPlayer(ABC):
         self.is_mafia = is_mafia
         self.role = get_role_string(is_mafia)
         self.game_dir = game_dir
-        self.logger = Logger(name, game_dir)
+        self.logger = Logger(name, game_dir,
+                             compression=llm_config.get(LOG_COMPRESSION_KEY,
+                                                        DEFAULT_LOG_COMPRESSION),
+                             compression_min_bytes=llm_config.get(
+                                 LOG_COMPRESSION_MIN_BYTES_KEY, DEFAULT_LOG_COMPRESSION_MIN_BYTES),
+                             fsync=llm_config.get(LOG_FSYNC_KEY, DEFAULT_LOG_FSYNC))
         self.pass_turn_token = llm_config[PASS_TURN_TOKEN_KEY]
         self.use_turn_token = llm_config[USE_TURN_TOKEN_KEY]
         self.num_words_per_second_to_wait = llm_config[WORDS_PER_SECOND_WAITING_KEY]
+        self.context_token_budget = llm_config.get(CONTEXT_TOKEN_BUDGET_KEY,
+                                                   DEFAULT_CONTEXT_TOKEN_BUDGET)
+        self.context_recent_messages = llm_config.get(CONTEXT_RECENT_MESSAGES_KEY,
+                                                      DEFAULT_CONTEXT_RECENT_MESSAGES)
+        self.context_summaries = llm_config.get(CONTEXT_SUMMARIES_KEY, DEFAULT_CONTEXT_SUMMARIES)
         # self.llm = LLMWrapper(self.logger, **llm_config)
         print("creating llm...", flush=True)
         self.llm = create_llm(self.logger, **llm_config)
+        # the system prompt's parts, cached by get_system_info_message:
+        self.system_info_lock = threading.Lock()  # speculative generation runs in another thread
+        self.system_info_prefix = f"Your name is {self.name}.{GENERAL_SYSTEM_INFO} \n" \
+                                  f"You were assigned the following role: {self.role}. \n"
+        self.chat_room_open_time = None
+        self.players_roles = None  # (name, role) pairs, by the order of player_names.txt
+        self.remaining_players_signature = None  # (mtime, size) of remaining_players.txt
+        self.remaining_players = None
+        self.players_info = ""
+        self.own_messages_reader = TailReader(game_dir / PERSONAL_CHAT_FILE_FORMAT.format(name))
+        self.previous_messages_info = ""
+        # First line to try and prevent conflict with o4-mini hidden scratchpad.
+        self.special_tokens_info = \
+            f"In your response to that is shown to the user (excluding your hidden scratchpad), " \
+            f"you can ONLY respond with one of two possible outputs:\n" \
+            f"{self.pass_turn_token} - indicating your character in the game " \
+            f"should wait and not send a message in the current timing;\n" \
+            f"{self.use_turn_token} - indicating your character in the game should " \
+            f"send a message to the public chat now.\n\n" \
+            f"You must NEVER output any other text, explanations, or variations " \
+            f"of these tokens. Only these exact tokens are allowed: " \
+            f"{self.pass_turn_token} or {self.use_turn_token}.\n"
 
     def get_system_info_message(self, attention_to_not_repeat=False, only_special_tokens=False):
-        system_info = f"Your name is {self.name}.{GENERAL_SYSTEM_INFO} \n" \
-                      f"You were assigned the following role: {self.role}. \n"
-        chat_room_open_time = (self.game_dir / GAME_START_TIME_FILE).read_text().strip()
-        if chat_room_open_time:  # if the game has started, the file isn't empty
-            system_info += f"The game's chat room was open at [{chat_room_open_time}].\n"
-            system_info += f"The other players in the game are:\n"
-            with open (self.game_dir / GAME_CONFIG_FILE, "r", encoding='utf-8') as f:
-                config = json.load(f)
-                players = (self.game_dir / "player_names.txt").read_text().splitlines()
-                remaining_players = (self.game_dir / "remaining_players.txt").read_text().splitlines()
-                i = -1
-                for player in players:
-                    i += 1
-                    if player != self.name:
-                        # reveal the role only if the self player is a mafia or the player is dead
-                        player_role = get_role_string(config[PLAYERS_KEY_IN_CONFIG][i]['is_mafia']) if self.is_mafia or player not in remaining_players else "unknown"
-                        system_info += f" {player} ( {player_role} ) \n"
-                system_info += f"The other players that have not been eliminated (lynched or killed) yet are:\n"
-                i = -1
-                for player in players:
-                    i += 1
-                    if player != self.name and player in remaining_players:
-                        player_role = get_role_string(config[PLAYERS_KEY_IN_CONFIG][i]['is_mafia']) if self.is_mafia else "unknown"
-                        system_info += f"{player} ( {player_role} ) \n"
-        if attention_to_not_repeat:
-            # system_info += "Note: Do not repeat any messages already present in the message history below!\n"
-            """ system_info += "IMPORTANT RULES FOR RESPONSES:\n" \
-                           "1. Never repeat the exact messages you've said before! " \
-                           "(as detailed bellow)\n" \
-                           "2. Your response must be different in both wording and meaning " \
-                           "from your previous messages.\n" \
-                           "3. Keep your message short and casual, " \
-                           "matching the style of recent messages.\n" \
-                           "4. Don't use comma or other punctuation marks.\n" \
-                           "5. Focus on adding new information or reactions " \
-                           "to the current situation.\n" \
-                           "6. Don't start messages with common phrases you've used before.\n" """
-            previous_messages = (self.game_dir / PERSONAL_CHAT_FILE_FORMAT.format(self.name)
-                                 ).read_text().splitlines()
-            if previous_messages:
-                system_info += "The following message are the previous messages that you've " \
-                               "sent and you should never repeat:\n"
-                for message in previous_messages:
-                    matcher = re.match(MESSAGE_PARSING_PATTERN, message)
-                    if not matcher:
-                        continue
-                    message_content = matcher.group(5)  # depends on MESSAGE_PARSING_PATTERN
-                    system_info += f"* \"{message_content}\"\n"
+        """
+        Returns the system prompt, built from parts that are cached between calls: the static
+        prefix never changes (so providers can reuse their cached prefix), the players' info is
+        rebuilt only when remaining_players.txt changes, and the previous messages are parsed
+        incrementally, only from the lines appended to the player's chat file since the last call.
+        """
+        with self.system_info_lock:
+            system_info = self.system_info_prefix + self.get_players_info()
+            if attention_to_not_repeat:
+                system_info += self.get_previous_messages_info()
         if only_special_tokens:
-                            # First line to try and prevent conflict with o4-mini hidden scratchpad.
-            system_info += f"In your response to that is shown to the user (excluding your hidden scratchpad), " \
-                           f"you can ONLY respond with one of two possible outputs:\n" \
-                           f"{self.pass_turn_token} - indicating your character in the game " \
-                           f"should wait and not send a message in the current timing;\n" \
-                           f"{self.use_turn_token} - indicating your character in the game should " \
-                           f"send a message to the public chat now.\n\n" \
-                           f"You must NEVER output any other text, explanations, or variations " \
-                           f"of these tokens. Only these exact tokens are allowed: " \
-                           f"{self.pass_turn_token} or {self.use_turn_token}.\n"
+            system_info += self.special_tokens_info
         return system_info
 
+    def get_players_info(self):
+        if self.players_roles is None:
+            chat_room_open_time = (self.game_dir / GAME_START_TIME_FILE).read_text().strip()
+            if not chat_room_open_time:  # if the game has started, the file isn't empty
+                return ""
+            self.chat_room_open_time = chat_room_open_time
+            with open(self.game_dir / GAME_CONFIG_FILE, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            players = (self.game_dir / PLAYER_NAMES_FILE).read_text().splitlines()
+            self.players_roles = [(player, get_role_string(player_config["is_mafia"]))
+                                  for player, player_config
+                                  in zip(players, config[PLAYERS_KEY_IN_CONFIG])]
+        stat = os.stat(self.game_dir / REMAINING_PLAYERS_FILE)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self.remaining_players_signature:
+            self.remaining_players_signature = signature
+            remaining_players = (self.game_dir / REMAINING_PLAYERS_FILE).read_text().splitlines()
+            if remaining_players != self.remaining_players:
+                self.remaining_players = remaining_players
+                self.players_info = self.build_players_info()
+        return self.players_info
+
+    def build_players_info(self):
+        players_info = f"The game's chat room was open at [{self.chat_room_open_time}].\n"
+        players_info += f"The other players in the game are:\n"
+        for player, role in self.players_roles:
+            if player != self.name:
+                # reveal the role only if the self player is a mafia or the player is dead
+                player_role = role if self.is_mafia or player not in self.remaining_players else "unknown"
+                players_info += f" {player} ( {player_role} ) \n"
+        players_info += f"The other players that have not been eliminated (lynched or killed) yet are:\n"
+        for player, role in self.players_roles:
+            if player != self.name and player in self.remaining_players:
+                player_role = role if self.is_mafia else "unknown"
+                players_info += f"{player} ( {player_role} ) \n"
+        return players_info
+
+    def get_previous_messages_info(self):
+        # system_info += "Note: Do not repeat any messages already present in the message history below!\n"
+        """ system_info += "IMPORTANT RULES FOR RESPONSES:\n" \
+                       "1. Never repeat the exact messages you've said before! " \
+                       "(as detailed bellow)\n" \
+                       "2. Your response must be different in both wording and meaning " \
+                       "from your previous messages.\n" \
+                       "3. Keep your message short and casual, " \
+                       "matching the style of recent messages.\n" \
+                       "4. Don't use comma or other punctuation marks.\n" \
+                       "5. Focus on adding new information or reactions " \
+                       "to the current situation.\n" \
+                       "6. Don't start messages with common phrases you've used before.\n" """
+        for message in self.own_messages_reader.read_new_lines():
+            matcher = re.match(MESSAGE_PARSING_PATTERN, message.rstrip("\n"))
+            if not matcher:
+                continue
+            message_content = matcher.group(5)  # depends on MESSAGE_PARSING_PATTERN
+            if not self.previous_messages_info:
+                self.previous_messages_info = "The following message are the previous messages " \
+                                              "that you've sent and you should never repeat:\n"
+            self.previous_messages_info += f"* \"{message_content}\"\n"
+        return self.previous_messages_info
+
+    def create_message_history(self):
+        """
+        Returns the history of the messages the player reads, which bounds the size of its prompts
+        if it has a context token budget.
+        """
+        if not self.context_token_budget:
+            return MessageHistory()
+        return ContextWindow(self.context_token_budget, self.context_recent_messages,
+                             self.summarize_phase if self.context_summaries else None)
+
+    def summarize_phase(self, phase, messages):
+        task = f"Summarize the messages above of the game's {phase} in two sentences or less, " \
+               f"mentioning who suspected, accused or defended whom, and any claims about roles. " \
+               f"Reply only with the summary."
+        prompt = f"Here are the messages of the game's {phase}, including [timestamps]:\n" \
+                 f"{''.join(messages)}{task}\n"
+        self.logger.log("prompt in summarize_phase", prompt)
+        with self.llm.call_purpose(SUMMARY_CALL):
+            summary = self.llm.generate(prompt, self.get_system_info_message())
+        self.logger.log("summary in summarize_phase", summary)
+        return summary
+
     @abstractmethod
     def should_generate_message(self, context):
         raise NotImplementedError()
@@ -112,23 +192,36 @@ class LLMPlayer(ABC):
         else:
             generate = True
         if generate:
-            self.logger.log(SCHEDULING_DECISION_LOG, MODEL_CHOSE_TO_USE_TURN_LOG)
+            self.logger.log(SCHEDULING_DECISION_LOG, MODEL_CHOSE_TO_USE_TURN_LOG,
+                            decision=USE_TURN_DECISION)
         else:
-            self.logger.log(SCHEDULING_DECISION_LOG, MODEL_CHOSE_TO_PASS_TURN_LOG)
+            self.logger.log(SCHEDULING_DECISION_LOG, MODEL_CHOSE_TO_PASS_TURN_LOG,
+                            decision=PASS_TURN_DECISION)
         return generate
 
+    def interpret_vote(self, voting_message, candidate_vote_names):
+        for name in candidate_vote_names:
+            if name in voting_message:
+                self.logger.log(VOTE_DECISION_LOG, name, decision=name)
+                return name
+        # if didn't return: no name was in voting_message
+        self.logger.log(MODEL_VOTED_INVALIDLY_LOG, voting_message)
+        vote = random.choice(candidate_vote_names)
+        self.logger.log(MODEL_RANDOMLY_VOTED_LOG, vote, decision=vote)
+        return vote
+
     def get_vote(self, message_history, candidate_vote_names):
         task_nighttime = f"Since you are a mafia, it is now time for you to determine who you want to kill. " \
                f"From the following remaining players, which player you want " \
                f"to kill? Base your answer on the conversation as seen in the message " \
                f"history, and especially on what you ({self.name}) said. " \
                f"Think through your choice carefully, as it will affect the game outcome. " \
-               f"Reply with only one name from the list, and nothing but that name: "
+               f"{VOTE_PROMPT_MARKER}"
         task_daytime = f"From the following remaining players, which player you want to vote for " \
                f"to lynch? Base your answer on the conversation as seen in the message " \
                f"history, and especially on what you ({self.name}) said. " \
                f"Think through your choice carefully, as it will affect the game outcome. " \
-               f"Reply with only one name from the list, and nothing but that name: "
+               f"{VOTE_PROMPT_MARKER}"
         task = ""
         if is_nighttime(self.game_dir):
             task = task_nighttime
@@ -139,6 +232,7 @@ class LLMPlayer(ABC):
         system_info = self.get_system_info_message()
         self.logger.log("prompt for get_vote", prompt)
         self.logger.log("system_info for get_vote", system_info)
-        vote = self.llm.generate(prompt, system_info)
+        with self.llm.call_purpose(VOTE_CALL):
+            vote = self.llm.generate(prompt, system_info)
         self.logger.log("generated vote in get_vote", vote)
         return vote
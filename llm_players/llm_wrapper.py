@@ -3,7 +3,6 @@ import time
 from functools import cache
 from pathlib import Path
 
-from game_constants import get_current_timestamp
 from llm_players.llm_constants import TASK2OUTPUT_FORMAT, INITIAL_GENERATION_PROMPT, \
     INSTRUCTION_INPUT_RESPONSE_PATTERN, LLAMA3_PATTERN, DEFAULT_PROMPT_PATTERN, NUM_BEAMS_KEY, \
     MODEL_NAME_KEY, USE_PIPELINE_KEY, PIPELINE_TASK_KEY, MAX_NEW_TOKENS_KEY, GENERAL_SYSTEM_INFO, \
@@ -11,18 +10,8 @@ from llm_players.llm_constants import TASK2OUTPUT_FORMAT, INITIAL_GENERATION_PRO
     SECRETS_DICT_FILE_PATH, SLEEPING_TIME_FOR_API_GENERATION_ERROR, HUGGINGFACE_GENERATION_PARAMETERS, \
     OPENAI_GENERATION_PARAMETERS, OPENAI_API_KEY_KEYWORD, DEFAULT_PIPELINE_PROMPT_PATTERN, MAX_TOKENS_KEY
 
-print("Trying to import torch...", get_current_timestamp())
-import torch
-print("Finished importing torch!", get_current_timestamp())
-print("Trying to import from transformers...", get_current_timestamp())
-from transformers import AutoTokenizer, AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoConfig, \
-    pipeline
-print("Finished importing from transformers!", get_current_timestamp())
-
-from together import Together
-from together.error import TogetherException
-
-import openai
+# torch, transformers and the APIs' SDKs take seconds to import, so each is imported where it is
+# first used, and a process only imports those of its configured backend
 
 CACHE_DIR = os.path.expanduser("~/.cache/huggingface/hub")
 
@@ -33,6 +22,7 @@ def is_local_path(model_name):
 
 @cache
 def cached_model(model_name):
+    from transformers import AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoConfig
     if is_local_path(model_name):
         config = AutoConfig.from_pretrained(model_name)
         return AutoModelForSeq2SeqLM.from_pretrained(model_name, config=config)
@@ -41,11 +31,13 @@ def cached_model(model_name):
 
 @cache
 def cached_tokenizer(model_name):
+    from transformers import AutoTokenizer
     return AutoTokenizer.from_pretrained(model_name, cache_dir=CACHE_DIR)
 
 
 @cache
 def cached_pipeline(model_name, task):
+    from transformers import pipeline
     return pipeline(task, model_name, device_map="auto")
 
 
@@ -110,12 +102,15 @@ class LLMWrapper:
         if (NUM_BEAMS_KEY in self.generation_parameters
             and self.generation_parameters[NUM_BEAMS_KEY] < 2):
             del self.generation_parameters[NUM_BEAMS_KEY]
+        import torch
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.prompt_template = self._get_prompt_template()
         if self.use_together:
+            from together import Together
             self.client = Together(api_key=get_together_api_key())
             self.pipeline = self.tokenizer = self.model = None
         elif self.use_openai:
+            import openai
             self.client = openai.OpenAI(api_key=get_openai_api_key())
             self.pipeline = self.tokenizer = self.model = None
         elif self.use_pipeline:
@@ -188,6 +183,7 @@ class LLMWrapper:
             raise NotImplementedError("Missing output template for used model")
 
     def generate(self, input_text, system_info="", generation_parameters=None):
+        import torch
         if generation_parameters is None:
             generation_parameters = self.generation_parameters
         with torch.inference_mode():
@@ -219,6 +215,7 @@ class LLMWrapper:
         return final_output.replace("\n", "   ").strip()
 
     def generate_with_together_safely(self, messages, generation_parameters):
+        from together.error import TogetherException
         output = None
         while not output:
             try:
@@ -235,6 +232,7 @@ class LLMWrapper:
         return output
 
     def generate_with_openai_safely(self, messages, generation_parameters):
+        import openai
         output = None
         while not output:
             try:
@@ -1,15 +1,313 @@
+"""
+The LLM players' logs (`{name}_log.jsonl` in the game dir), a JSON record per logged operation:
+- "time" and "operation" (e.g. "prompt in generate_message", or `LLM_CALL_LOG` once per LLM call);
+- "content": the logged text, possibly compressed (see below);
+- typed fields, where they apply: "prompt_hash" (of the messages sent to the model, linking a
+  prompt to its call), "output", "decision" (`USE_TURN_DECISION`, `PASS_TURN_DECISION` or a vote),
+  "latency_seconds", "purpose" and "outcome" (of an LLM call, as in llm/telemetry.py).
+`iter_llm_log` reads them back lazily, as well as the markdown `{name}_log.txt` of older games.
+
+`Logger.log` doesn't write the record itself: it hands it to a background writer thread, shared by
+all the loggers of the process, through a bounded queue (so a slow disk slows the players down
+instead of filling the memory). The writer serializes and compresses the records, and appends them
+in batches to the log files, which it keeps open until `flush_logs` is called (at the end of a
+game, and when the process exits).
+
+Large contents, such as complete prompts, can be compressed (`log_compression`), in which case the
+content is `<<gzip+base64>>...` or `<<zstd+base64>>...`, that `decode_log_content` turns back into
+the original text.
+"""
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import base64
+import hashlib
+import threading
 from pathlib import Path
-from game_constants import LLM_LOG_FILE_FORMAT, get_current_timestamp
+from termcolor import colored
+from game_constants import LLM_LOG_FILE_FORMAT, LLM_TEXT_LOG_FILE_FORMAT, SCHEDULING_DECISION_LOG, \
+    MODEL_CHOSE_TO_USE_TURN_LOG, MODEL_CHOSE_TO_PASS_TURN_LOG, USE_TURN_DECISION, \
+    PASS_TURN_DECISION, get_current_timestamp
+from llm_players.llm_constants import NO_LOG_COMPRESSION, GZIP_LOG_COMPRESSION, \
+    ZSTD_LOG_COMPRESSION, LOG_COMPRESSIONS, BATCH_LOG_FSYNC, CLOSE_LOG_FSYNC, \
+    LOG_FSYNC_POLICIES, DEFAULT_LOG_COMPRESSION, DEFAULT_LOG_COMPRESSION_MIN_BYTES, \
+    DEFAULT_LOG_FSYNC, LOG_QUEUE_SIZE, LOG_MAX_BATCH_SIZE, LOG_BATCH_SECONDS
+
+try:
+    import zstandard  # optional, only needed for zstd compressed logs
+except ImportError:
+    zstandard = None
+
+# the markdown format of older games' logs, see `iter_text_log`
+TEXT_LOG_START_LINE = "# NEW LOG\n"
+TEXT_LOG_TIME_PREFIX = "## TIME: "
+TEXT_LOG_OPERATION_PREFIX = "## OPERATION: "
+TEXT_LOG_CONTENT_PREFIX = "## CONTENT: "
+TEXT_LOG_DECISIONS = {MODEL_CHOSE_TO_USE_TURN_LOG: USE_TURN_DECISION,
+                      MODEL_CHOSE_TO_PASS_TURN_LOG: PASS_TURN_DECISION}
+PROMPT_HASH_LENGTH = 16
+COMPRESSED_CONTENT_PREFIX_FORMAT = "<<{}+base64>>"
+LOG_WRITER_ERROR_COLOR = "red"
+
+
+def compress_log_content(content, compression):
+    data = content.encode("utf-8")
+    if compression == GZIP_LOG_COMPRESSION:
+        data = gzip.compress(data, compresslevel=6)
+    else:
+        data = zstandard.ZstdCompressor().compress(data)
+    return COMPRESSED_CONTENT_PREFIX_FORMAT.format(compression) + base64.b64encode(data).decode()
+
+
+def decode_log_content(content):
+    """Returns the original text of a log record's content, whether it was compressed or not."""
+    for compression in [GZIP_LOG_COMPRESSION, ZSTD_LOG_COMPRESSION]:
+        prefix = COMPRESSED_CONTENT_PREFIX_FORMAT.format(compression)
+        if content.startswith(prefix):
+            data = base64.b64decode(content[len(prefix):].strip())
+            if compression == GZIP_LOG_COMPRESSION:
+                data = gzip.decompress(data)
+            else:
+                if zstandard is None:
+                    raise ImportError("Reading zstd compressed logs requires the zstandard package")
+                data = zstandard.ZstdDecompressor().decompress(data)
+            return data.decode("utf-8")
+    return content
+
+
+def get_prompt_hash(messages):
+    serialized = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:PROMPT_HASH_LENGTH]
+
+
+def get_llm_log_file(game_dir, player_name):
+    """Returns the player's log file, in the format of the game's time, or None without one."""
+    for file_format in [LLM_LOG_FILE_FORMAT, LLM_TEXT_LOG_FILE_FORMAT]:
+        log_file = game_dir / file_format.format(player_name)
+        if log_file.exists():
+            return log_file
+    return None
+
+
+def iter_llm_log(game_dir, player_name, decode=True):
+    """
+    Yields the records of the player's log one by one, without reading the whole file, as dicts
+    of the module's docstring, in the order they were logged. Logs of older games, in the markdown
+    format, are read into the same records (with "decision" filled for scheduling decisions).
+    Yields nothing if the player has no log (e.g. a human player).
+
+    Args:
+        game_dir (Path): The game's directory.
+        player_name (str): The player's name.
+        decode (bool): Whether to decompress compressed contents, skip it when only the other
+            fields are needed.
+    """
+    log_file = get_llm_log_file(game_dir, player_name)
+    if log_file is None:
+        return
+    records = iter_text_log(log_file) if log_file.suffix == ".txt" else iter_jsonl_log(log_file)
+    for record in records:
+        if decode:
+            record["content"] = decode_log_content(record["content"])
+        yield record
+
+
+def iter_jsonl_log(log_file):
+    with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_text_log(log_file):
+    record, content_lines = None, None
+    with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line == TEXT_LOG_START_LINE:
+                if record is not None:
+                    yield finish_text_log_record(record, content_lines)
+                record, content_lines = {"time": None, "operation": None}, None
+            elif record is None:
+                continue
+            elif content_lines is not None:  # the content may span several lines
+                content_lines.append(line)
+            elif line.startswith(TEXT_LOG_TIME_PREFIX):
+                record["time"] = line[len(TEXT_LOG_TIME_PREFIX):].rstrip("\n")
+            elif line.startswith(TEXT_LOG_OPERATION_PREFIX):
+                record["operation"] = line[len(TEXT_LOG_OPERATION_PREFIX):].rstrip("\n")
+            elif line.startswith(TEXT_LOG_CONTENT_PREFIX):
+                content_lines = [line[len(TEXT_LOG_CONTENT_PREFIX):]]
+    if record is not None:
+        yield finish_text_log_record(record, content_lines)
 
-NEW_LOG_FORMAT = "# NEW LOG\n## TIME: {time}\n## OPERATION: {operation}\n## CONTENT: {content}\n\n"
+
+def finish_text_log_record(record, content_lines):
+    record["content"] = "".join(content_lines or []).removesuffix("\n\n")
+    if record["operation"] == SCHEDULING_DECISION_LOG \
+            and record["content"] in TEXT_LOG_DECISIONS:
+        record["decision"] = TEXT_LOG_DECISIONS[record["content"]]
+    return record
 
 
 class Logger:
+    """
+    Logs a player's operations to its log file, through the process' `LogWriter`.
+    Attributes:
+        name (str): The player's name.
+        game_dir (Path): The game's directory.
+        log_file (Path): The player's log file.
+        compression (str): One of `LOG_COMPRESSIONS`, for contents of at least
+            `compression_min_bytes` characters.
+        fsync (str): One of `LOG_FSYNC_POLICIES`.
+    Methods:
+        log(operation, content="", **fields): Queues a record to the log file, with the typed fields
+            of the module's docstring.
+        flush(): Blocks until the queued records of all the loggers are written.
+    """
 
-    def __init__(self, name: str, game_dir: Path):
+    def __init__(self, name: str, game_dir: Path, compression=DEFAULT_LOG_COMPRESSION,
+                 compression_min_bytes=DEFAULT_LOG_COMPRESSION_MIN_BYTES, fsync=DEFAULT_LOG_FSYNC):
+        if compression not in LOG_COMPRESSIONS:
+            raise ValueError(f"Unknown log compression {compression}, "
+                             f"should be one of: {LOG_COMPRESSIONS}")
+        if compression == ZSTD_LOG_COMPRESSION and zstandard is None:
+            raise ImportError("zstd log compression requires the zstandard package "
+                              "(pip install zstandard)")
+        if fsync not in LOG_FSYNC_POLICIES:
+            raise ValueError(f"Unknown log fsync policy {fsync}, "
+                             f"should be one of: {LOG_FSYNC_POLICIES}")
+        self.name = name
+        self.game_dir = game_dir
         self.log_file = game_dir / LLM_LOG_FILE_FORMAT.format(name)
+        self.compression = compression
+        self.compression_min_bytes = compression_min_bytes
+        self.fsync = fsync
+        self.writer = get_log_writer()
+
+    def log(self, operation, content="", **fields):
+        # the content is turned into text now, since it may be changed after the call
+        self.writer.write(self, dict(time=get_current_timestamp(), operation=operation,
+                                     content=str(content), **fields))
+
+    def format_record(self, record):
+        content = record["content"]
+        if self.compression != NO_LOG_COMPRESSION and len(content) >= self.compression_min_bytes:
+            record["content"] = compress_log_content(content, self.compression)
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    def flush(self):
+        self.writer.flush()
+
+
+class LogWriter:
+    """
+    The background thread that writes the log records of all the loggers in the process (and the
+    LLM calls' records of llm/telemetry.py, whose `MetricsWriter` has a logger's `log_file`,
+    `fsync` and `format_record`).
+    Attributes:
+        queue (queue.Queue): Bounded queue of (logger, record) pairs, and of `threading.Event`s to
+            set once everything before them is written.
+        files (dict): The open log files, by path.
+    Methods:
+        write(logger, record): Queues a record, waiting while the queue is full.
+        flush(): Blocks until the queued records are written, and closes the log files.
+    """
+
+    def __init__(self, max_queue_size=LOG_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.files = {}
+        self.fsync_policies = {}  # path -> the fsync policy of its logger
+        self.thread = threading.Thread(target=self.run, name="LogWriter", daemon=True)
+        self.thread.start()
+
+    def write(self, logger, record):
+        self.queue.put((logger, record))
+
+    def flush(self):
+        if not self.thread.is_alive():
+            return
+        flushed = threading.Event()
+        self.queue.put(flushed)
+        flushed.wait()
+
+    def run(self):
+        while True:
+            batch = self.get_batch()
+            try:
+                self.write_batch(batch)
+            except Exception as e:  # e.g. the game dir was removed, the next records may still fit
+                print(colored(f"Failed to write logs: {e!r}", LOG_WRITER_ERROR_COLOR), flush=True)
+            finally:
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+
+    def get_batch(self):
+        batch = [self.queue.get()]
+        if isinstance(batch[0], threading.Event):
+            return batch
+        # the records that arrive shortly after the first one are written together
+        deadline = time.monotonic() + LOG_BATCH_SECONDS
+        while len(batch) < LOG_MAX_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if isinstance(item, threading.Event):
+                break
+        return batch
+
+    def write_batch(self, batch):
+        texts = {}  # path -> lines, in the order they were logged
+        for item in batch:
+            if isinstance(item, threading.Event):
+                continue
+            logger, record = item
+            texts.setdefault(logger.log_file, []).append(logger.format_record(record))
+            self.fsync_policies[logger.log_file] = logger.fsync
+        for path, lines in texts.items():
+            if path not in self.files:
+                self.files[path] = open(path, "a", encoding="utf-8")
+            f = self.files[path]
+            f.write("".join(lines))
+            f.flush()
+            if self.fsync_policies[path] == BATCH_LOG_FSYNC:
+                os.fsync(f.fileno())
+        if isinstance(batch[-1], threading.Event):
+            self.close_files()
+
+    def close_files(self):
+        # the files are closed on every flush, so a long running process (e.g. a batch runner's
+        # worker) doesn't keep the files of all its past games open
+        for path, f in self.files.items():
+            if self.fsync_policies[path] == CLOSE_LOG_FSYNC:
+                os.fsync(f.fileno())
+            f.close()
+        self.files.clear()
+        self.fsync_policies.clear()
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = LogWriter()
+            atexit.register(_log_writer.flush)
+        return _log_writer
+
 
-    def log(self, operation, content):
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(NEW_LOG_FORMAT.format(time=get_current_timestamp(),
-                                          operation=operation, content=content))
+def flush_logs():
+    """Blocks until all the logs of the process are written to their files, and closes them."""
+    with _log_writer_lock:
+        log_writer = _log_writer
+    if log_writer is not None:
+        log_writer.flush()
@@ -1,11 +1,35 @@
 import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from game_constants import REMAINING_PLAYERS_FILE, GAME_MANAGER_NAME, MESSAGE_PARSING_PATTERN
 from game_status_checks import is_nighttime
 from llm_players.llm_constants import turn_task_into_prompt, SCHEDULE_THEN_GENERATE_TYPE, \
-    make_more_human_like, SCHEDULING_GENERATION_PARAMETERS, TALKATIVE_PROMPT, ALT_TALKATIVE_PROMPT, QUIETER_PROMPT
+    make_more_human_like, SCHEDULING_GENERATION_PARAMETERS, TALKATIVE_PROMPT, ALT_TALKATIVE_PROMPT, QUIETER_PROMPT, \
+    SPECULATIVE_GENERATION_KEY, SPECULATIVE_SPEAK_RATE_THRESHOLD_KEY, SPECULATIVE_GENERATION_MODES, \
+    SEQUENTIAL_GENERATION, SPECULATIVE_GENERATION, DEFAULT_SPECULATIVE_GENERATION, \
+    DEFAULT_SPECULATIVE_SPEAK_RATE_THRESHOLD, SPEAK_RATE_WINDOW, SPECULATION_MAX_THREADS, \
+    SCHEDULE_CALL, GENERATE_CALL
 from llm_players.llm_player import LLMPlayer
+from llm.cancellation import CancellationToken
 # from llm_players.llm_wrapper import LLMWrapper
 
+_speculation_executor = None
+_speculation_executor_lock = threading.Lock()
+
+
+def get_speculation_executor():
+    """
+    Returns the process' executor of speculative generations, shared by all its players (and the
+    games a batch worker runs one after another), so their idle threads are reused.
+    """
+    global _speculation_executor
+    with _speculation_executor_lock:
+        if _speculation_executor is None:
+            _speculation_executor = ThreadPoolExecutor(max_workers=SPECULATION_MAX_THREADS,
+                                                       thread_name_prefix="speculation")
+        return _speculation_executor
+
 
 def no_one_has_talked_yet_in_current_phase(message_history):
     if not message_history:
@@ -26,6 +50,15 @@ class ScheduleThenGeneratePlayer(LLMPlayer):
         # scheduler_kwargs = kwargs.get("scheduler_kwargs", kwargs)
         # self.scheduler = LLMWrapper(**scheduler_kwargs)
         self.scheduler = self.llm  # using the same one for generation...
+        llm_config = kwargs["llm_config"]
+        self.speculative_generation = llm_config.get(SPECULATIVE_GENERATION_KEY,
+                                                     DEFAULT_SPECULATIVE_GENERATION)
+        if self.speculative_generation not in SPECULATIVE_GENERATION_MODES:
+            raise ValueError(f"Unknown speculative generation mode {self.speculative_generation}, "
+                             f"should be one of: {SPECULATIVE_GENERATION_MODES}")
+        self.speak_rate_threshold = llm_config.get(SPECULATIVE_SPEAK_RATE_THRESHOLD_KEY,
+                                                   DEFAULT_SPECULATIVE_SPEAK_RATE_THRESHOLD)
+        self.recent_decisions = deque(maxlen=SPEAK_RATE_WINDOW)  # True for choosing to speak
 
     def should_generate_message(self, message_history):
         # Make sure that this AI has the capability to be the first one to contribute to a conversation!
@@ -33,23 +66,59 @@ class ScheduleThenGeneratePlayer(LLMPlayer):
             # return False
         prompt = self.create_scheduling_prompt(message_history)
         # self.logger.log("prompt in should_generate_message", prompt)
-        decision = self.scheduler.generate(
-            prompt, self.get_system_info_message(only_special_tokens=True),)
+        with self.scheduler.call_purpose(SCHEDULE_CALL):
+            decision = self.scheduler.generate(
+                prompt, self.get_system_info_message(only_special_tokens=True),)
             # SCHEDULING_GENERATION_PARAMETERS if self.llm.use_together else None) # TODO: Change the None to model specific parameters
         self.logger.log("decision in should_generate_message", decision)
-        return self.interpret_scheduling_decision(decision)
+        generate = self.interpret_scheduling_decision(decision)
+        self.recent_decisions.append(generate)
+        return generate
 
-    def generate_message(self, message_history):
-        if self.should_generate_message(message_history):
-            prompt = self.create_generation_prompt(message_history)
-            self.logger.log("prompt in generate_message", prompt)
+    def create_message(self, message_history):
+        prompt = self.create_generation_prompt(message_history)
+        self.logger.log("prompt in generate_message", prompt)
+        with self.llm.call_purpose(GENERATE_CALL):
             message = self.llm.generate(
                 prompt, self.get_system_info_message(attention_to_not_repeat=False))
-            message = make_more_human_like(message)
-            return message
+        return make_more_human_like(message)
+
+    def create_message_speculatively(self, message_history, cancellation_token):
+        with self.llm.using_cancellation_token(cancellation_token):
+            return self.create_message(message_history)
+
+    def should_speculate(self):
+        if self.speculative_generation == SEQUENTIAL_GENERATION:
+            return False
+        if self.speculative_generation == SPECULATIVE_GENERATION or not self.recent_decisions:
+            return True
+        # adaptive: a speculative message is only worth its cost if the player usually speaks
+        speak_rate = sum(self.recent_decisions) / len(self.recent_decisions)
+        return speak_rate >= self.speak_rate_threshold
+
+    def generate_message(self, message_history):
+        if self.should_speculate():
+            return self.generate_message_speculatively(message_history)
+        if self.should_generate_message(message_history):
+            return self.create_message(message_history)
         else:
             return ""
 
+    def generate_message_speculatively(self, message_history):
+        """
+        Generates the message while deciding whether to send one, instead of after, so sending a
+        message takes one round-trip instead of two. The generation is cancelled when deciding
+        to wait, or when the phase ends.
+        """
+        generation_token = CancellationToken(parent=self.llm.cancellation_token)
+        speculative_message = get_speculation_executor().submit(
+            self.create_message_speculatively, message_history, generation_token)
+        if not self.should_generate_message(message_history):
+            generation_token.cancel("the player chose to wait")
+            self.logger.log("speculative generation", "discarded, the player chose to wait")
+            return ""
+        return speculative_message.result()
+
     def talkative_scheduling_prompt_modifier(self, message_history):
         if not message_history or is_nighttime(self.game_dir):
             return TALKATIVE_PROMPT
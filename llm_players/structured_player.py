@@ -0,0 +1,76 @@
+import json
+from game_constants import SCHEDULING_DECISION_LOG, MODEL_CHOSE_TO_USE_TURN_LOG, MODEL_CHOSE_TO_PASS_TURN_LOG, \
+    USE_TURN_DECISION, PASS_TURN_DECISION
+from llm_players.llm_constants import turn_task_into_prompt, make_more_human_like, STRUCTURED_TYPE, \
+    STRUCTURED_SPEAK_KEY, STRUCTURED_MESSAGE_KEY, GENERATE_CALL
+from llm_players.schedule_then_generate_player import ScheduleThenGeneratePlayer
+
+
+class StructuredPlayer(ScheduleThenGeneratePlayer):
+    """
+    Decides whether to speak and generates the message in a single LLM call, which answers with a
+    JSON object `{"speak": bool, "message": str}` (in the provider's JSON mode where supported),
+    instead of a scheduling call followed by a generation call. Its prompts are those of
+    `ScheduleThenGeneratePlayer`, merged.
+    """
+
+    TYPE_NAME = STRUCTURED_TYPE
+
+    def generate_message(self, message_history):
+        prompt = self.create_structured_prompt(message_history)
+        self.logger.log("prompt in generate_message", prompt)
+        with self.llm.call_purpose(GENERATE_CALL):
+            response = self.llm.generate_json(prompt, self.get_system_info_message())
+        self.logger.log("structured response in generate_message", response)
+        speak, message = self.interpret_structured_response(response)
+        self.recent_decisions.append(speak)
+        return make_more_human_like(message) if speak else ""
+
+    def interpret_structured_response(self, response):
+        """
+        Returns whether the player chose to speak and its message, falling back to reading the
+        response as a scheduling decision (and the rest of it as the message) if it isn't valid.
+        """
+        if not response:  # the call was cancelled or gave up, which is a pass
+            return self.interpret_scheduling_decision(response), ""
+        parsed = parse_json_object(response)
+        if parsed is not None and isinstance(parsed.get(STRUCTURED_SPEAK_KEY), bool):
+            message = parsed.get(STRUCTURED_MESSAGE_KEY)
+            message = message.strip() if isinstance(message, str) else ""
+            speak = parsed[STRUCTURED_SPEAK_KEY] and bool(message)
+            self.logger.log(SCHEDULING_DECISION_LOG,
+                            MODEL_CHOSE_TO_USE_TURN_LOG if speak else MODEL_CHOSE_TO_PASS_TURN_LOG,
+                            decision=USE_TURN_DECISION if speak else PASS_TURN_DECISION)
+            return speak, message
+        self.logger.log("malformed structured response", response)
+        speak = self.interpret_scheduling_decision(response)
+        message = response.replace(self.use_turn_token, "").replace(self.pass_turn_token, "").strip()
+        return speak and bool(message), message
+
+    def create_structured_prompt(self, message_history):
+        task = f"Do you want to send a message to the group chat now, or do you prefer to wait " \
+               f"for now and see what messages others will send? " \
+               f"Remember to choose to send a message only if your contribution to the " \
+               f"discussion in the current time will be meaningful enough. " \
+               f"{self.talkative_scheduling_prompt_modifier(message_history).strip()} " \
+               f"If you send a message, be specific and keep it relevant to the current " \
+               f"situation, according to the previous messages and the game's status. " \
+               f"Your message should only be conversational and concise! Two sentences maximum. " \
+               f"Reply only with a JSON object, with a boolean \"{STRUCTURED_SPEAK_KEY}\" that " \
+               f"is true if you want to send a message now, and a string " \
+               f"\"{STRUCTURED_MESSAGE_KEY}\" with your message (empty if you wait), " \
+               f"like {{\"{STRUCTURED_SPEAK_KEY}\": false, \"{STRUCTURED_MESSAGE_KEY}\": \"\"}}. "
+        return turn_task_into_prompt(task, message_history)
+
+
+def parse_json_object(response):
+    if not response:
+        return None
+    start, end = response.find("{"), response.rfind("}")  # e.g. inside a ```json block
+    if start == -1 or end < start:
+        return None
+    try:
+        parsed = json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
@@ -0,0 +1,422 @@
+"""
+Runs a whole all-LLM game in a single process: the game manager's phase logic from
+`mafia_main.py` and every LLM player are coroutines on one asyncio event loop.
+
+Players' messages and votes are passed to the manager through in-memory queues, and everything
+the manager publishes is pushed directly into the players' message histories, so nothing polls
+files. The game dir files are still written exactly like in the multi-process mode, so the
+spectator, the analysis scripts and the logs keep working.
+
+With `"clock_mode": "simulated"` in the game config, phases are not bound by wall-clock timers:
+a phase ends once all of its active players passed their turn without any new message, when
+`max_messages_per_phase` is reached, or when the simulated time (advanced by the typing time of
+every message) reaches the phase's duration.
+
+usage: python mafia_engine.py -i <game_id>    (after `prepare_game.py` created the game dir)
+"""
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import mafia_main  # incl. the UTF-8 wrapping of stdout
+from game_constants import *  # incl. argparse, time, Path (from pathlib), colored (from termcolor)
+from game_clock import SimulatedClock, WallClock, set_clock
+from game_events import GameEventLog
+from llm.cancellation import CancellationToken
+from llm_players.factory import llm_player_factory
+from llm_players.logger import flush_logs
+from llm_players.llm_constants import GAME_DIR_KEY, VOTING_WAITING_TIME, MAX_TIME_TO_WAIT
+
+# a player that passed its turn asks again after a new message arrives, or after this long
+IDLE_PLAYER_RESCHEDULING_SECONDS = 5
+ENGINE_COLOR = "yellow"
+
+
+class InProcessGame:
+    """
+    A single game whose manager and LLM players all run on the current event loop.
+    Attributes:
+        game_dir (Path): The prepared game dir.
+        config (dict): The game configuration.
+        phase (str): The current phase status, as written to the phase status file.
+        phase_number (int): Increases on every phase status change.
+        is_over (bool): Whether the game has ended.
+        is_simulated (bool): Whether the game runs with a simulated clock.
+        remaining_names (list[str]): Names of players that weren't voted out, in the order of
+            the config (like remaining_players.txt), so the vote prompts are reproducible.
+        message_histories (dict[str, MessageHistory]): Per player, all public lines it can see.
+        player_tasks (list[asyncio.Task]): The players' loops, a failed one fails the game.
+    Methods:
+        run():
+            Creates the LLM players, plays the game until someone wins and returns the winner.
+    """
+
+    def __init__(self, game_dir, config):
+        if not all(player_config["is_llm"] for player_config in config[PLAYERS_KEY_IN_CONFIG]):
+            raise ValueError("The in-process engine can only run games where all players are LLMs")
+        self.game_dir = game_dir
+        self.config = config
+        self.phase = DAYTIME
+        self.phase_number = 0
+        self.is_over = False
+        self.remaining_names = [player_config["name"]
+                                for player_config in config[PLAYERS_KEY_IN_CONFIG]]
+        self.mafia_names = {player_config["name"] for player_config in config[PLAYERS_KEY_IN_CONFIG]
+                            if player_config["is_mafia"]}
+        self.message_histories = {}  # created by the players, once they are
+        self.llm_players = []
+        self.chat_queue = None  # (phase_number, name, line) of messages players want to publish
+        self.vote_queue = None  # (name, voted_for)
+        self.phase_changed = None  # replaced by a new event on every phase change
+        self.history_updated = {}
+        self.is_simulated = config.get(CLOCK_MODE_KEY, DEFAULT_CLOCK_MODE) == SIMULATED_CLOCK_MODE
+        self.max_messages_per_phase = config.get(MAX_MESSAGES_PER_PHASE_KEY)
+        self.num_published_messages = 0
+        self.active_talkers = set()  # players that can talk in the current phase
+        self.passed_talkers = set()  # active players that passed since the last published message
+        self.phase_quiet = None  # set once all active players passed
+        self.cancellation_tokens = set()  # of the in-flight generations, cancelled on phase change
+        self.player_tasks = []
+
+    # ---------- in-memory hooks into mafia_main's file writes ----------
+
+    def on_chat_room_write(self, chat_room, events):
+        self.num_published_messages += len(events)
+        self.passed_talkers.clear()
+        self.phase_quiet.clear()
+        if Path(chat_room).name == PUBLIC_NIGHTTIME_CHAT_FILE:
+            readers = self.mafia_names  # only mafia can see what happens during nighttime
+        else:
+            readers = self.message_histories.keys()
+        for name in readers:
+            self.message_histories[name].add_events(events)
+            self.history_updated[name].set()
+
+    def on_phase_status_change(self, phase_status):
+        self.phase = phase_status
+        self.phase_number += 1
+        self.passed_talkers.clear()
+        self.phase_quiet.clear()
+        self.phase_changed.set()
+        self.phase_changed = asyncio.Event()
+        for token in self.cancellation_tokens:
+            token.cancel(f"the phase has changed to {phase_status}")
+        self.cancellation_tokens.clear()
+
+    def on_player_passed(self, name, num_published_messages_seen):
+        if num_published_messages_seen != self.num_published_messages:
+            return  # the decision was made without the latest messages, so it doesn't count
+        self.passed_talkers.add(name)
+        if self.active_talkers <= self.passed_talkers:
+            self.phase_quiet.set()
+
+    # ---------- game manager ----------
+
+    def raise_if_a_player_failed(self):
+        for task in self.player_tasks:
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+    async def wait_for_players(self, *waiters):
+        """
+        Waits until one of the waiters is done, or raises the exception of a player's task that
+        failed meanwhile (e.g. in an LLM call), since its messages and votes would never come.
+        """
+        running_tasks = [task for task in self.player_tasks if not task.done()]
+        await asyncio.wait([*waiters, *running_tasks], return_when=asyncio.FIRST_COMPLETED)
+        self.raise_if_a_player_failed()
+
+    async def get_vote(self):
+        get_vote = asyncio.ensure_future(self.vote_queue.get())
+        try:
+            while not get_vote.done():  # a player's task may also end without failing
+                await self.wait_for_players(get_vote)
+        finally:
+            get_vote.cancel()
+        return get_vote.result()
+
+    async def collect_votes(self, optional_votes_players, public_chat_file, voting_players):
+        votes = {player.name: 0 for player in optional_votes_players}
+        waiting_for = {player.name for player in voting_players}
+        while waiting_for:
+            name, voted_for = await self.get_vote()
+            if name not in waiting_for:
+                continue  # a late vote from a previous voting phase
+            waiting_for.remove(name)
+            if voted_for in votes:
+                mafia_main.announce_vote(name, voted_for, public_chat_file)
+                votes[voted_for] += 1
+        # if there were invalid votes or if there was a tie, decision will be made "randomly"
+        return max(votes, key=votes.get)
+
+    def should_publish(self, phase_number, name, voting_names):
+        # messages left in the queue when their phase ended would leak into the next phase's room
+        # (e.g. a mafia player's daytime message into the nighttime chat)
+        return phase_number == self.phase_number and name in voting_names
+
+    async def run_wall_clock_discussion(self, voting_names, public_chat_file, time_limit_seconds):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_limit_seconds
+        while (remaining_seconds := deadline - loop.time()) > 0:
+            try:
+                phase_number, name, line = await asyncio.wait_for(self.chat_queue.get(),
+                                                                  remaining_seconds)
+            except asyncio.TimeoutError:
+                break
+            if self.should_publish(phase_number, name, voting_names):
+                mafia_main.write_to_chat_room(public_chat_file, [line])
+
+    async def run_simulated_discussion(self, voting_names, public_chat_file, time_limit_seconds):
+        clock = get_clock()
+        phase_end_time = clock.time() + time_limit_seconds
+        num_phase_messages = 0
+        while clock.time() < phase_end_time:
+            if self.max_messages_per_phase is not None \
+                    and num_phase_messages >= self.max_messages_per_phase:
+                break
+            if self.chat_queue.empty():  # pending messages are published before checking quietness
+                if self.phase_quiet.is_set():
+                    break
+                get_message = asyncio.ensure_future(self.chat_queue.get())
+                quiet = asyncio.ensure_future(self.phase_quiet.wait())
+                try:
+                    await self.wait_for_players(get_message, quiet)
+                finally:
+                    quiet.cancel()
+                if not get_message.done():
+                    get_message.cancel()
+                    continue
+                phase_number, name, line = get_message.result()
+            else:
+                phase_number, name, line = self.chat_queue.get_nowait()
+            if self.should_publish(phase_number, name, voting_names):
+                mafia_main.write_to_chat_room(public_chat_file, [line])
+                num_phase_messages += 1
+        # the phase officially lasted its full duration, so the transcript's timestamps make sense
+        clock.advance_to(phase_end_time)
+
+    async def run_phase(self, players, voting_players, optional_votes_players, public_chat_file,
+                        time_limit_seconds, phase_name):
+        if len(voting_players) > 1:
+            voting_names = {player.name for player in voting_players}
+            self.active_talkers = set(voting_names)
+            # a simulated phase has no wall clock deadline, its calls are only bounded by attempts
+            self.set_retry_deadlines(None if self.is_simulated else time.time() + time_limit_seconds)
+            if self.is_simulated:
+                await self.run_simulated_discussion(voting_names, public_chat_file,
+                                                    time_limit_seconds)
+            else:
+                await self.run_wall_clock_discussion(voting_names, public_chat_file,
+                                                     time_limit_seconds)
+        else:
+            mafia_main.game_manager_announcement(CUTTING_TO_VOTE_MESSAGE)
+        print("Now voting starts...", flush=True)
+        self.set_retry_deadlines(None)  # votes are waited for
+        mafia_main.notify_players_about_voting_time(phase_name, public_chat_file)
+        voted_out_name = await self.collect_votes(optional_votes_players, public_chat_file,
+                                                  voting_players)
+        if voted_out_name in self.remaining_names:
+            self.remaining_names.remove(voted_out_name)
+        mafia_main.eliminate_voted_out_player(voted_out_name, optional_votes_players, players)
+
+    async def run_daytime(self, players):
+        daytime_minutes = self.config[DAYTIME_MINUTES_KEY]
+        mafia_main.set_phase_status(DAYTIME)
+        print(colored(DAYTIME_START_MESSAGE_FORMAT.format(daytime_minutes), DAYTIME_COLOR))
+        mafia_main.game_manager_announcement(DAYTIME_START_MESSAGE_FORMAT.format(daytime_minutes),
+                                             PHASE_START_EVENT, phase=DAYTIME,
+                                             minutes=daytime_minutes)
+        await self.run_phase(players, players, players, self.game_dir / PUBLIC_DAYTIME_CHAT_FILE,
+                             minutes_to_seconds(daytime_minutes), DAYTIME)
+
+    async def run_nighttime(self, players):
+        nighttime_minutes = self.config[NIGHTTIME_MINUTES_KEY]
+        mafia_main.set_phase_status(NIGHTTIME)
+        mafia_players = [player for player in players if player.is_mafia]
+        bystanders = [player for player in players if not player.is_mafia]
+        print(colored(NIGHTTIME_START_MESSAGE_FORMAT.format(nighttime_minutes), NIGHTTIME_COLOR))
+        mafia_main.game_manager_announcement(NIGHTTIME_START_MESSAGE_FORMAT.format(nighttime_minutes),
+                                             PHASE_START_EVENT, phase=NIGHTTIME,
+                                             minutes=nighttime_minutes)
+        await self.run_phase(players, mafia_players, bystanders,
+                             self.game_dir / PUBLIC_NIGHTTIME_CHAT_FILE,
+                             minutes_to_seconds(nighttime_minutes), NIGHTTIME)
+
+    async def run_manager(self):
+        players = mafia_main.get_players(self.config)
+        (self.game_dir / GAME_START_TIME_FILE).write_text(get_current_timestamp())
+        print("Game is now running! Its content is displayed to players.", flush=True)
+        while not mafia_main.is_game_over(players):
+            await self.run_daytime(players)
+            if mafia_main.is_game_over(players):
+                break
+            await self.run_nighttime(players)
+        self.is_over = True
+        mafia_main.announce_game_over()
+        mafia_main.get_all_player_out_of_voting_time()  # also wakes up all waiting players
+        print("Game has finished.", flush=True)
+
+    # ---------- LLM players ----------
+
+    def set_retry_deadlines(self, deadline):
+        for llm_player in self.llm_players:
+            llm_player.llm.set_retry_deadline(deadline)
+
+    def can_talk(self, llm_player):
+        return self.phase == DAYTIME or (self.phase == NIGHTTIME and llm_player.is_mafia)
+
+    def can_vote(self, llm_player):
+        return self.phase == DAYTIME_VOTING_TIME or \
+            (self.phase == NIGHTTIME_VOTING_TIME and llm_player.is_mafia)
+
+    async def vote(self, llm_player, message_history):
+        candidate_vote_names = [name for name in self.remaining_names if name != llm_player.name]
+        voting_message = await asyncio.to_thread(llm_player.get_vote, message_history,
+                                                 candidate_vote_names)
+        vote = llm_player.interpret_vote(voting_message, candidate_vote_names)
+        if vote not in voting_message:  # no name was in voting_message, so the vote was random
+            print(colored(f"{llm_player.name}: {MODEL_VOTED_INVALIDLY_LOG}: {voting_message}",
+                          ENGINE_COLOR), flush=True)
+        if self.is_simulated:
+            get_clock().advance(VOTING_WAITING_TIME)  # the multi-process players wait before voting
+        # still written to the personal vote file, for compatibility with all files readers
+        with open(self.game_dir / PERSONAL_VOTE_FILE_FORMAT.format(llm_player.name), "a",
+                  encoding="utf-8") as f:
+            f.write(vote + "\n")
+        await self.vote_queue.put((llm_player.name, vote))
+
+    def get_typing_seconds(self, llm_player, message):
+        typing_seconds = 0
+        if llm_player.num_words_per_second_to_wait > 0:
+            typing_seconds = min(len(message.split()) / llm_player.num_words_per_second_to_wait,
+                                 MAX_TIME_TO_WAIT)
+        return SIMULATED_REACTION_SECONDS + typing_seconds
+
+    async def talk(self, llm_player, message_history):
+        phase_number = self.phase_number
+        num_published_messages = self.num_published_messages
+        token = CancellationToken()
+        self.cancellation_tokens.add(token)
+        llm_player.llm.set_cancellation_token(token)
+        try:
+            message = await asyncio.to_thread(llm_player.generate_message, message_history)
+        finally:
+            llm_player.llm.set_cancellation_token(None)
+            self.cancellation_tokens.discard(token)
+        message = message.strip()
+        if phase_number != self.phase_number:
+            return False  # sometimes the message is generated when it's already too late
+        if not message:
+            self.on_player_passed(llm_player.name, num_published_messages)
+            return False
+        if self.is_simulated:
+            get_clock().advance(self.get_typing_seconds(llm_player, message))
+        line = format_message(llm_player.name, message)
+        with open(self.game_dir / PERSONAL_CHAT_FILE_FORMAT.format(llm_player.name), "a",
+                  encoding="utf-8") as f:
+            f.write(line)
+        await self.chat_queue.put((phase_number, llm_player.name, line))
+        return True
+
+    async def wait_for_new_messages_or_phase_change(self, name, timeout=None):
+        waiters = [asyncio.ensure_future(self.history_updated[name].wait()),
+                   asyncio.ensure_future(self.phase_changed.wait())]
+        await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+
+    async def run_llm_player(self, llm_player):
+        name = llm_player.name
+        message_history = self.message_histories[name]
+        voted_in_phase_number = None
+        while not self.is_over and name in self.remaining_names:
+            if self.can_vote(llm_player):
+                if voted_in_phase_number != self.phase_number:
+                    voted_in_phase_number = self.phase_number
+                    await self.vote(llm_player, message_history.snapshot())
+                    continue
+                await self.phase_changed.wait()  # wait for voting time to end
+            elif self.can_talk(llm_player):
+                self.history_updated[name].clear()
+                if not await self.talk(llm_player, message_history.snapshot()):
+                    # asking again before anything has changed would give the same answer,
+                    # and with a simulated clock nothing changes until someone talks
+                    await self.wait_for_new_messages_or_phase_change(
+                        name, None if self.is_simulated else IDLE_PLAYER_RESCHEDULING_SECONDS)
+            else:
+                await self.phase_changed.wait()  # e.g. bystanders during nighttime
+
+    async def create_llm_player(self, player_config):
+        player_config = dict(player_config)
+        player_config[GAME_DIR_KEY] = self.game_dir
+        # construction may include a blocking LLM warm-up, so all players are created concurrently
+        llm_player = await asyncio.to_thread(llm_player_factory, player_config)
+        (self.game_dir / PERSONAL_STATUS_FILE_FORMAT.format(llm_player.name)).write_text(JOINED)
+        print(f"{llm_player.name} has joined!", flush=True)
+        return llm_player
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        num_players = len(self.config[PLAYERS_KEY_IN_CONFIG])
+        # every player has at most one blocking LLM call in flight, so none of them should queue
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=num_players + 1))
+        self.chat_queue = asyncio.Queue()
+        self.vote_queue = asyncio.Queue()
+        self.phase_changed = asyncio.Event()
+        self.phase_quiet = asyncio.Event()
+        mafia_main.game_dir = self.game_dir
+        mafia_main.event_log = GameEventLog(self.game_dir)
+        mafia_main.chat_room_listeners.append(self.on_chat_room_write)
+        mafia_main.phase_status_listeners.append(self.on_phase_status_change)
+        if self.is_simulated:
+            set_clock(SimulatedClock())
+        try:
+            self.llm_players = await asyncio.gather(*[
+                self.create_llm_player(player_config)
+                for player_config in self.config[PLAYERS_KEY_IN_CONFIG]])
+            self.message_histories = {llm_player.name: llm_player.create_message_history()
+                                      for llm_player in self.llm_players}
+            self.history_updated = {name: asyncio.Event() for name in self.message_histories}
+            self.player_tasks = [asyncio.create_task(self.run_llm_player(llm_player))
+                                 for llm_player in self.llm_players]
+            await self.run_manager()
+            await asyncio.gather(*self.player_tasks)
+        finally:
+            for task in self.player_tasks:  # still running if the game failed
+                task.cancel()
+            for token in self.cancellation_tokens:
+                token.cancel("the game has ended")
+            mafia_main.chat_room_listeners.remove(self.on_chat_room_write)
+            mafia_main.phase_status_listeners.remove(self.on_phase_status_change)
+            if self.is_simulated:
+                set_clock(WallClock())
+            # the players' logs are complete once the game returns (e.g. for the batch runner)
+            await loop.run_in_executor(None, flush_logs)
+        return (self.game_dir / WHO_WINS_FILE).read_text().strip()
+
+
+def run_game(game_dir):
+    """
+    Plays a prepared all-LLM game to its end in the current process.
+
+    Args:
+        game_dir (Path): The game dir, as created by `prepare_game.init_game`.
+
+    Returns:
+        str: The winning message written to the who-wins file.
+
+    Raises:
+        ValueError: If some of the game's players are humans.
+    """
+    with open(game_dir / GAME_CONFIG_FILE, "r", encoding='utf-8') as f:
+        config = json.load(f)
+    return asyncio.run(InProcessGame(game_dir, config).run())
+
+
+def main():
+    game_dir = get_game_dir_from_argv()
+    who_wins = run_game(game_dir)
+    print(colored(who_wins, ENGINE_COLOR), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 import json
 import os
 from game_constants import *  # incl. argparse, time, Path (from pathlib), colored (from termcolor)
+from file_watcher import create_file_watcher
+from tail_reader import TailReader
+from game_events import GameEventLog
 
 # Wrap outpt from CP-1252 default to UTF-8
 import sys
@@ -9,6 +12,11 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 # global variable for the game dir
 game_dir = Path()  # will be updated only if __name__ == __main__ (prevents new ones in imports)
+file_watcher = None  # wakes the host when a personal file changes, created in main()
+event_log = None  # everything published is appended to it first, created in main()
+# callbacks for in-process consumers (like mafia_engine.py) of what the host writes to files
+chat_room_listeners = []  # called with (chat_room, events) after lines are added to a public chat
+phase_status_listeners = []  # called with (phase_status) after the phase status file is updated
 
 
 class Player:
@@ -18,9 +26,9 @@ class Player:
         name (str): The player's name.
         is_mafia (bool): Whether the player is a mafia member.
         personal_chat_file (Path): Path to the player's personal chat file.
-        personal_chat_file_lines_read (int): Number of chat lines already read.
+        personal_chat_reader (TailReader): Incremental reader of the personal chat file.
         personal_vote_file (Path): Path to the player's personal vote file.
-        personal_vote_file_lines_read (int): Number of vote lines already read.
+        personal_vote_reader (TailReader): Incremental reader of the personal vote file.
         personal_status_file (Path): Path to the player's personal status file.
     Methods:
         get_new_messages():
@@ -35,24 +43,18 @@ class Player:
         self.name = name
         self.is_mafia = is_mafia
         self.personal_chat_file = game_dir / PERSONAL_CHAT_FILE_FORMAT.format(self.name)
-        self.personal_chat_file_lines_read = 0
+        self.personal_chat_reader = TailReader(self.personal_chat_file)
         self.personal_vote_file = game_dir / PERSONAL_VOTE_FILE_FORMAT.format(self.name)
-        self.personal_vote_file_lines_read = 0
+        self.personal_vote_reader = TailReader(self.personal_vote_file)
         # status is whether the player has joined and then whether was voted out
         self.personal_status_file = game_dir / PERSONAL_STATUS_FILE_FORMAT.format(self.name)
 
     def get_new_messages(self):
-        with open(self.personal_chat_file, "r", encoding='utf-8') as f:
-            # the readlines method includes the "\n"
-            lines = f.readlines()[self.personal_chat_file_lines_read:]
-        self.personal_chat_file_lines_read += len(lines)
-        return lines
+        return self.personal_chat_reader.read_new_lines()  # each line includes the "\n"
 
     def get_voted_player(self):
-        all_votes = self.personal_vote_file.read_text().splitlines()
-        new_votes = all_votes[self.personal_vote_file_lines_read:]
+        new_votes = self.personal_vote_reader.read_new_lines()  # should be 1 if works correctly
         if new_votes:
-            self.personal_vote_file_lines_read += len(new_votes)  # should be 1 if works correctly
             return new_votes[-1].strip()
         else:
             return None
@@ -139,19 +141,52 @@ def is_game_over(players):
     return is_win_by_bystanders(mafia_players) or is_win_by_mafia(mafia_players, bystanders)
 
 
+def write_to_chat_room(chat_room, lines, event_type=MESSAGE_EVENT, **event_data):
+    # lines already include "\n", and are written to the chat room by the event log
+    events = event_log.append(event_type, chat_room, lines, **event_data)
+    for listener in chat_room_listeners:
+        listener(chat_room, events)
+
+
+def set_phase_status(phase_status):
+    (game_dir / PHASE_STATUS_FILE).write_text(phase_status, encoding='utf-8')
+    for listener in phase_status_listeners:
+        listener(phase_status)
+
+
 def run_chat_round_between_players(players, chat_room):
     for player in players:
         lines = player.get_new_messages()
-        with open(chat_room, "a", encoding='utf-8') as f:
-            f.writelines(lines)  # lines already include "\n"
+        if not lines:
+            continue  # no need to reopen the chat room for nothing
+        write_to_chat_room(chat_room, lines)
 
 
 def notify_players_about_voting_time(phase_name, public_chat_file):
     phase_end_message = DAYTIME_VOTING_TIME_MESSAGE if phase_name == DAYTIME else NIGHTTIME_VOTING_TIME_MESSAGE
-    with open(public_chat_file, "a", encoding='utf-8') as f:  # only to the current phase's active players chat room
-        f.write(format_message(GAME_MANAGER_NAME, phase_end_message))
+    # only to the current phase's active players chat room
+    write_to_chat_room(public_chat_file, [format_message(GAME_MANAGER_NAME, phase_end_message)],
+                       VOTING_START_EVENT, phase=phase_name)
     voting_phase_name = DAYTIME_VOTING_TIME if phase_name == DAYTIME else NIGHTTIME_VOTING_TIME
-    (game_dir / PHASE_STATUS_FILE).write_text(voting_phase_name, encoding='utf-8')
+    set_phase_status(voting_phase_name)
+
+
+def create_players_file_watcher(config, players):
+    """
+    Creates the watcher that wakes the host whenever a player writes a personal file.
+
+    Args:
+        config (dict): The game configuration, which may set the notification mode and interval.
+        players (list[Player]): All players of the game.
+
+    Returns:
+        FileChangeWatcher: A watcher over every player's chat, vote and status files.
+    """
+    personal_files = []
+    for player in players:
+        personal_files += [player.personal_chat_file, player.personal_vote_file,
+                           player.personal_status_file]
+    return create_file_watcher(personal_files, config)
 
 
 def get_voted_out_name(optional_votes_players, public_chat_file, voting_players):
@@ -164,20 +199,30 @@ def get_voted_out_name(optional_votes_players, public_chat_file, voting_players)
                 continue
             voted_players.append(player)
             if voted_for in votes:
-                with open(public_chat_file, "a", encoding='utf-8') as f:
-                    voting_message = VOTING_MESSAGE_FORMAT.format(player.name, voted_for)
-                    f.write(format_message(GAME_MANAGER_NAME, voting_message))
+                announce_vote(player.name, voted_for, public_chat_file)
                 votes[voted_for] += 1
         for player in voted_players:
             voting_players.remove(player)
+        if voting_players:
+            file_watcher.wait()  # sleeps until one of the players writes a vote
     # if there were invalid votes or if there was a tie, decision will be made "randomly"
     voted_out_name = max(votes, key=votes.get)
     return voted_out_name
 
 
+def announce_vote(voter_name, voted_for, public_chat_file):
+    voting_message = VOTING_MESSAGE_FORMAT.format(voter_name, voted_for)
+    write_to_chat_room(public_chat_file, [format_message(GAME_MANAGER_NAME, voting_message)],
+                       VOTE_EVENT, voter=voter_name, voted_for=voted_for)
+
+
 def voting_sub_phase(phase_name, voting_players, optional_votes_players, public_chat_file, players):
     notify_players_about_voting_time(phase_name, public_chat_file)
     voted_out_name = get_voted_out_name(optional_votes_players, public_chat_file, voting_players[:])
+    eliminate_voted_out_player(voted_out_name, optional_votes_players, players)
+
+
+def eliminate_voted_out_player(voted_out_name, optional_votes_players, players):
     # update info file of remaining players
     remaining_players = (game_dir / REMAINING_PLAYERS_FILE).read_text().splitlines()
     remaining_players.remove(voted_out_name)
@@ -189,9 +234,9 @@ def voting_sub_phase(phase_name, voting_players, optional_votes_players, public_
     announce_voted_out_player(voted_out_player)
 
 
-def game_manager_announcement(message):
-    with open(game_dir / PUBLIC_MANAGER_CHAT_FILE, "a", encoding='utf-8') as f:
-        f.write(format_message(GAME_MANAGER_NAME, message))
+def game_manager_announcement(message, event_type=ANNOUNCEMENT_EVENT, **event_data):
+    write_to_chat_room(game_dir / PUBLIC_MANAGER_CHAT_FILE, [format_message(GAME_MANAGER_NAME, message)],
+                       event_type, **event_data)
 
 
 def announce_voted_out_player(voted_out_player):
@@ -199,15 +244,20 @@ def announce_voted_out_player(voted_out_player):
     # find the number of mafia players remaining
     mafia_players = [player for player in (game_dir / REMAINING_PLAYERS_FILE).read_text().splitlines() if player in (game_dir / MAFIA_NAMES_FILE).read_text()]
     voted_out_message = VOTED_OUT_MESSAGE_FORMAT.format(voted_out_player.name, role, len(mafia_players))
-    game_manager_announcement(voted_out_message)
+    game_manager_announcement(voted_out_message, ELIMINATION_EVENT, eliminated=voted_out_player.name,
+                              role=role, num_mafia_left=len(mafia_players))
 
 
 def run_phase(players, voting_players, optional_votes_players, public_chat_file,
               time_limit_seconds, phase_name):
     if len(voting_players) > 1:
-        start_time = time.time()
-        while time.time() - start_time < time_limit_seconds:
+        start_time = get_clock().time()
+        while True:
             run_chat_round_between_players(voting_players, public_chat_file)
+            remaining_seconds = time_limit_seconds - (get_clock().time() - start_time)
+            if remaining_seconds <= 0:
+                break
+            file_watcher.wait(timeout=remaining_seconds)  # sleeps until a player writes something
     else:
         game_manager_announcement(CUTTING_TO_VOTE_MESSAGE)
     print("Now voting starts...", flush=True)
@@ -215,19 +265,21 @@ def run_phase(players, voting_players, optional_votes_players, public_chat_file,
 
 
 def run_nighttime(players, nighttime_minutes):
-    (game_dir / PHASE_STATUS_FILE).write_text(NIGHTTIME)
+    set_phase_status(NIGHTTIME)
     mafia_players = [player for player in players if player.is_mafia]
     bystanders = [player for player in players if not player.is_mafia]
     print(colored(NIGHTTIME_START_MESSAGE_FORMAT.format(nighttime_minutes), NIGHTTIME_COLOR))
-    game_manager_announcement(NIGHTTIME_START_MESSAGE_FORMAT.format(nighttime_minutes))
+    game_manager_announcement(NIGHTTIME_START_MESSAGE_FORMAT.format(nighttime_minutes),
+                              PHASE_START_EVENT, phase=NIGHTTIME, minutes=nighttime_minutes)
     run_phase(players, mafia_players, bystanders, game_dir / PUBLIC_NIGHTTIME_CHAT_FILE,
               minutes_to_seconds(nighttime_minutes), NIGHTTIME)
 
 
 def run_daytime(players, daytime_minutes):
-    (game_dir / PHASE_STATUS_FILE).write_text(DAYTIME)
+    set_phase_status(DAYTIME)
     print(colored(DAYTIME_START_MESSAGE_FORMAT.format(daytime_minutes), DAYTIME_COLOR))
-    game_manager_announcement(DAYTIME_START_MESSAGE_FORMAT.format(daytime_minutes))
+    game_manager_announcement(DAYTIME_START_MESSAGE_FORMAT.format(daytime_minutes),
+                              PHASE_START_EVENT, phase=DAYTIME, minutes=daytime_minutes)
     run_phase(players, players, players, game_dir / PUBLIC_DAYTIME_CHAT_FILE,
               minutes_to_seconds(daytime_minutes), DAYTIME)
 
@@ -244,25 +296,38 @@ def wait_for_players(players):
                 print(f"{player.name} has joined!", flush=True)
         for player in joined:
             havent_joined_yet.remove(player)
+        if havent_joined_yet:
+            file_watcher.wait()
     (game_dir / GAME_START_TIME_FILE).write_text(get_current_timestamp())
     print("Game is now running! Its content is displayed to players.", flush=True)
 
 
 def get_all_player_out_of_voting_time():
     current_phase = (game_dir / PHASE_STATUS_FILE).read_text()
-    (game_dir / PHASE_STATUS_FILE).write_text(current_phase.replace(VOTING_TIME, ""))
+    set_phase_status(current_phase.replace(VOTING_TIME, ""))
+
+
+def announce_game_over():
+    event_log.append(GAME_OVER_EVENT, winner=(game_dir / WHO_WINS_FILE).read_text().strip())
 
 
 def end_game():
+    announce_game_over()
     get_all_player_out_of_voting_time()
+    file_watcher.close()
     print("Game has finished.", flush=True)
 
 
 def main():
-    global game_dir
+    global game_dir, file_watcher, event_log
     game_dir = get_game_dir_from_argv()
     config = get_config()
+    if config.get(CLOCK_MODE_KEY, DEFAULT_CLOCK_MODE) != WALL_CLOCK_MODE:
+        raise ValueError("Players in separate processes can't share a simulated clock, "
+                         "run this game with mafia_engine.py instead")
     players = get_players(config)
+    event_log = GameEventLog(game_dir)
+    file_watcher = create_players_file_watcher(config, players)
     wait_for_players(players)
     while not is_game_over(players):
         run_daytime(players, config[DAYTIME_MINUTES_KEY])
@@ -1,6 +1,5 @@
 from game_constants import *  # incl. random, Path (from pathlib), colored (from termcolor)
-from game_status_checks import is_nighttime, is_game_over, is_voted_out, is_time_to_vote, \
-    all_players_joined, get_is_mafia
+from game_status_checks import GameStatusView, get_is_mafia
 from player_survey import run_survey_about_llm_player
 
 
@@ -11,8 +10,9 @@ def get_name_and_role(game_dir):
     name = get_player_name_from_user(player_names, GET_CODE_NAME_FROM_USER_MESSAGE)
     is_mafia = get_is_mafia(name, game_dir)
     print(colored(WAITING_FOR_ALL_PLAYERS_TO_JOIN_MESSAGE, MANAGER_COLOR))
-    while not all_players_joined(game_dir):
-        continue
+    game_status = GameStatusView(game_dir)
+    game_status.wait_for_all_players_joined()
+    game_status.close()
     print(colored(YOU_CAN_START_WRITING_MESSAGE, MANAGER_COLOR))
     return name, is_mafia
 
@@ -35,25 +35,30 @@ def collect_vote(name, game_dir):
 
 def write_text_to_game_loop(name, is_mafia, game_dir):
     already_notified = False
-    while not is_game_over(game_dir):
-        if is_voted_out(name, game_dir):
+    game_status = GameStatusView(game_dir, name)
+    while not game_status.is_game_over():
+        if game_status.is_voted_out():
             already_notified = notify_only_once_about_finish_writing(already_notified)
+            game_status.wait_for_change()
             continue  # can't write or vote anymore, waiting for final survey
-        if not is_mafia and is_nighttime(game_dir):
+        if not is_mafia and game_status.is_nighttime():
+            game_status.wait_for_phase_change()
             continue  # only mafia can communicate during nighttime
         user_input = input(colored(GET_CHAT_INPUT_MESSAGE, MANAGER_COLOR)).strip()
         if not user_input:
             continue
         elif user_input == VOTE_FLAG:
-            if not is_time_to_vote(game_dir):
+            voting_phase = game_status.get_phase()
+            if VOTING_TIME not in voting_phase:
                 print(colored(NOT_TIME_TO_VOTE_MESSAGE, MANAGER_COLOR))
                 continue
             collect_vote(name, game_dir)
-            while is_time_to_vote(game_dir):
-                continue  # wait for voting time to end when all players have voted
-        elif not is_time_to_vote(game_dir):  # if it's time to vote then players can't chat
+            # wait for voting time to end when all players have voted
+            game_status.wait_for_phase_change(voting_phase)
+        elif not game_status.is_time_to_vote():  # if it's time to vote then players can't chat
             with open(game_dir / PERSONAL_CHAT_FILE_FORMAT.format(name), "a", encoding='utf-8') as f:
                 f.write(format_message(name, user_input))
+    game_status.close()
 
 
 def main():
@@ -4,14 +4,15 @@ from game_constants import get_game_dir_from_argv, METRICS_TO_SCORE, DEFAULT_SCO
     PERSONAL_SURVEY_FILE_FORMAT, get_player_name_and_real_name_from_user, MANAGER_COLOR, \
     NUMERIC_SURVEY_QUESTION_FORMAT, LLM_REVELATION_MESSAGE, NO_LLM_IN_GAME_MESSAGE, \
     ASK_USER_FOR_COMMENTS_MESSAGE, SURVEY_COMMENTS_TITLE, THANK_YOU_GOODBYE_MESSAGE, \
-    PLAYER_NAMES_FILE, LLM_LOG_FILE_FORMAT, get_player_name_from_user, \
+    PLAYER_NAMES_FILE, get_player_name_from_user, \
     LLM_IDENTIFICATION_SURVEY_MESSAGE, CORRECT_GUESS_MESSAGE, WRONG_GUESS_MESSAGE, \
     LLM_IDENTIFICATION
+from llm_players.logger import get_llm_log_file
 
 
 def get_llm_player_name(game_dir):
     for player_name in (game_dir / PLAYER_NAMES_FILE).read_text().splitlines():
-        if (game_dir / LLM_LOG_FILE_FORMAT.format(player_name)).exists():
+        if get_llm_log_file(game_dir, player_name) is not None:
             return player_name
     return None
 
@@ -7,7 +7,7 @@ from game_constants import DIRS_PREFIX, DEFAULT_GAME_CONFIG, GAME_ID_NUM_DIGITS,
     PUBLIC_MANAGER_CHAT_FILE, PUBLIC_DAYTIME_CHAT_FILE, PUBLIC_NIGHTTIME_CHAT_FILE, WHO_WINS_FILE, \
     GAME_START_TIME_FILE, NOTES_FILE, REAL_NAME_CODENAME_DELIMITER, REAL_NAMES_FILE, \
     PLAYERS_KEY_IN_CONFIG, PERSONAL_STATUS_FILE_FORMAT, PERSONAL_CHAT_FILE_FORMAT, \
-    PERSONAL_VOTE_FILE_FORMAT, LLM_LOG_FILE_FORMAT, PERSONAL_SURVEY_FILE_FORMAT
+    PERSONAL_VOTE_FILE_FORMAT, LLM_LOG_FILE_FORMAT, PERSONAL_SURVEY_FILE_FORMAT, GAME_EVENTS_FILE
 from prepare_config import PlayerConfig
 
 
@@ -64,6 +64,7 @@ def init_game(game_id, config_path):
     (game_dir / PUBLIC_MANAGER_CHAT_FILE).touch()
     (game_dir / PUBLIC_DAYTIME_CHAT_FILE).touch()
     (game_dir / PUBLIC_NIGHTTIME_CHAT_FILE).touch()
+    (game_dir / GAME_EVENTS_FILE).touch()
     (game_dir / WHO_WINS_FILE).touch()
     (game_dir / GAME_START_TIME_FILE).touch()
     (game_dir / NOTES_FILE).touch()
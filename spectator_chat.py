@@ -1,6 +1,6 @@
 from game_constants import *  # incl. argparse, time, Path (from pathlib), colored (from termcolor)
-from game_status_checks import is_game_over, is_time_to_vote, all_players_joined, get_is_mafia, \
-    is_nighttime
+from game_status_checks import GameStatusView, get_is_mafia
+from tail_reader import TailReader
 
 
 def introducing_mafia_members(game_dir, is_mafia):
@@ -43,15 +43,15 @@ def welcome_player(game_dir):
     # (game_dir / PERSONAL_STATUS_FILE_FORMAT.format(name)).write_text(JOINED)
     introducing_mafia_members(game_dir, is_mafia)
     print(colored(WAITING_FOR_ALL_PLAYERS_TO_JOIN_MESSAGE, MANAGER_COLOR))
-    while not all_players_joined(game_dir):
-        continue
+    game_status = GameStatusView(game_dir)
+    game_status.wait_for_all_players_joined()
+    game_status.close()
     # The game manager automatically posts a message that will be printed when the game starts
     return is_mafia  # name is used only in the joint read-and-write interface (with threads)
 
 
-def display_lines_from_file(game_dir, file_name, num_read_lines, display_color):
-    with open(game_dir / file_name, "r", encoding='utf-8') as f:
-        lines = f.readlines()[num_read_lines:]
+def display_lines_from_file(reader, display_color):
+    lines = reader.read_new_lines()
     if len(lines) > 0:  # this `if` in needed because of `print()` that is used for multithreading
         print()  # prevents the messages from being printed in the same line as the middle of input
         for line in lines:
@@ -63,10 +63,9 @@ def ask_player_to_vote():
     print(colored("We are now voting, waiting for the players to vote...", MANAGER_COLOR))
 
 
-def ask_player_to_vote_only_once(already_asked, game_dir, is_mafia):
-    if is_time_to_vote(game_dir):
-        # leaving the is_nighttime check to the end because it's expensive and might not be needed
-        if not already_asked and (is_mafia or not is_nighttime(game_dir)):
+def ask_player_to_vote_only_once(already_asked, game_status, is_mafia):
+    if game_status.is_time_to_vote():
+        if not already_asked and (is_mafia or not game_status.is_nighttime()):
             ask_player_to_vote()
             already_asked = True
     else:
@@ -75,18 +74,24 @@ def ask_player_to_vote_only_once(already_asked, game_dir, is_mafia):
 
 
 def read_game_text_loop(is_mafia, game_dir):
-    num_read_lines_manager = num_read_lines_daytime = num_read_lines_nighttime = 0
+    manager_reader = TailReader(game_dir / PUBLIC_MANAGER_CHAT_FILE)
+    daytime_reader = TailReader(game_dir / PUBLIC_DAYTIME_CHAT_FILE)
+    nighttime_reader = TailReader(game_dir / PUBLIC_NIGHTTIME_CHAT_FILE)
+    chat_files = [reader.path for reader in [manager_reader, daytime_reader, nighttime_reader]]
+    game_status = GameStatusView(game_dir, extra_paths=chat_files)  # also wakes up on new lines
     already_asked = False
-    while not is_game_over(game_dir):
-        num_read_lines_manager += display_lines_from_file(
-            game_dir, PUBLIC_MANAGER_CHAT_FILE, num_read_lines_manager, MANAGER_COLOR)
+    while True:
+        is_game_over = game_status.is_game_over()  # checked first, to display the last lines too
+        display_lines_from_file(manager_reader, MANAGER_COLOR)
         # only current phase file will have new messages, so no need to run expensive is_nighttime()
-        num_read_lines_daytime += display_lines_from_file(
-            game_dir, PUBLIC_DAYTIME_CHAT_FILE, num_read_lines_daytime, DAYTIME_COLOR)
+        display_lines_from_file(daytime_reader, DAYTIME_COLOR)
         if is_mafia:  # only mafia can see what happens during nighttime
-            num_read_lines_nighttime += display_lines_from_file(
-                game_dir, PUBLIC_NIGHTTIME_CHAT_FILE, num_read_lines_nighttime, NIGHTTIME_COLOR)
-        already_asked = ask_player_to_vote_only_once(already_asked, game_dir, is_mafia)
+            display_lines_from_file(nighttime_reader, NIGHTTIME_COLOR)
+        if is_game_over:
+            break
+        already_asked = ask_player_to_vote_only_once(already_asked, game_status, is_mafia)
+        game_status.wait_for_change()
+    game_status.close()
 
 
 def game_over_message(game_dir):
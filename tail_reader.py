@@ -0,0 +1,73 @@
+import os
+from pathlib import Path
+
+
+class TailReader:
+    """
+    Incrementally reads the lines appended to a single game file, like `tail -f`.
+
+    Keeps an open handle and the byte offset of the first unread byte, so every call only reads
+    the bytes written since the previous call instead of the whole file. A trailing line that
+    was not terminated by "\\n" yet is held back until the writer finishes it.
+    Attributes:
+        path (Path): The followed file.
+        offset (int): Number of bytes consumed from the file so far.
+        lines_offset (int): Number of bytes of the complete lines returned so far.
+    Methods:
+        read_new_lines():
+            Returns the new complete lines (each ending with "\\n"), or an empty list.
+        close():
+            Closes the underlying file handle.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.offset = 0
+        self._file = None
+        self._partial_line = b""
+
+    def _open(self):
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            self._file = None
+        return self._file is not None
+
+    def _rewind_if_truncated(self):
+        # files like the phase status are rewritten with `write_text`, which truncates them
+        if os.fstat(self._file.fileno()).st_size < self.offset:
+            self.offset = 0
+            self._partial_line = b""
+
+    @property
+    def lines_offset(self):
+        return self.offset - len(self._partial_line)
+
+    def read_new_bytes(self):
+        if self._file is None and not self._open():
+            return b""
+        self._rewind_if_truncated()
+        self._file.seek(self.offset)
+        data = self._file.read()
+        self.offset += len(data)
+        return data
+
+    def read_new_lines(self):
+        data = self._partial_line + self.read_new_bytes()
+        complete_data, separator, self._partial_line = data.rpartition(b"\n")
+        if not separator:
+            return []
+        # same as text mode `readlines()`: "\r\n" written on Windows is read as "\n"
+        text = (complete_data + separator).decode("utf-8").replace("\r\n", "\n")
+        return [line + "\n" for line in text.split("\n")[:-1]]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()